@@ -47,6 +47,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'submissions.metrics.RequestMetricsMiddleware',  # أولاً ليشمل التوقيت باقي الـ middleware
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # CORS middleware - يجب أن يكون في البداية
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -95,6 +96,32 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# LocMemCache is per-process: fine for the development server only. With
+# several server processes, cache invalidations, ETag markers and
+# Idempotency-Key locks must be shared, e.g. (pip install redis):
+#     'default': {
+#         'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+#         'LOCATION': 'redis://127.0.0.1:6379/1',
+#     }
+# A process-local cache is reported by the system checks (submissions.W001)
+# unless SUBMISSIONS_ALLOW_LOCAL_CACHE is set.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sm-platform',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    }
+}
+
+# A single server process may use the per-process cache above (silences submissions.W001)
+SUBMISSIONS_ALLOW_LOCAL_CACHE = DEBUG
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -158,6 +185,94 @@ REST_FRAMEWORK = {
     ),
 }
 
+# Submissions list pagination (cursor-based, see submissions/pagination.py)
+SUBMISSIONS_PAGE_SIZE = 50
+SUBMISSIONS_MAX_PAGE_SIZE = 500
+
+# Rows fetched per query by the streaming export endpoint
+SUBMISSIONS_EXPORT_CHUNK_SIZE = 1000
+
+# Nearby submissions endpoint (grid-cell index, submissions/geo.py)
+SUBMISSIONS_NEARBY_MAX_RADIUS = 10000  # metres
+SUBMISSIONS_NEARBY_MAX_RESULTS = 200
+
+# Map tile aggregates (web-mercator zoom levels kept up to date on every write;
+# changing this list requires `python manage.py rebuild_aggregates`)
+SUBMISSIONS_TILE_ZOOMS = (3, 6, 9, 12, 15)
+SUBMISSIONS_TILE_MAX_TILES = 4096  # per request
+
+# Longest range accepted by the daily statistics endpoint
+SUBMISSIONS_STATS_MAX_DAYS = 366
+
+# Admin changelists of large tables count rows exactly only up to this limit;
+# beyond it they show the database's row estimate (submissions/admin.py)
+SUBMISSIONS_ADMIN_EXACT_COUNT_LIMIT = 10000
+
+# export_submissions --incremental leaves rows changed in the last N seconds
+# to the next run, so writes still being committed are not missed
+SUBMISSIONS_EXPORT_COMMIT_LAG = 300
+
+# Maximum number of items accepted by the batch create endpoint
+# (each item can carry two files, keep DATA_UPLOAD_MAX_NUMBER_FILES in mind)
+SUBMISSIONS_BATCH_MAX_ITEMS = 50
+
+# Background image derivatives (thumbnails / recompressed web versions)
+# Number of Pillow worker processes; 0 generates derivatives synchronously
+SUBMISSIONS_IMAGE_WORKERS = 2
+SUBMISSIONS_IMAGE_DERIVATIVES = {
+    'thumbnail': {'size': (320, 320), 'quality': 70},
+    'web': {'size': (1600, 1600), 'quality': 82},
+}
+
+# Resumable chunked uploads (partial files are kept outside MEDIA_ROOT)
+SUBMISSIONS_UPLOAD_DIR = BASE_DIR / 'upload_chunks'
+SUBMISSIONS_UPLOAD_CHUNK_SIZE = 1024 * 1024  # maximum bytes per PATCH
+SUBMISSIONS_UPLOAD_MAX_SIZE = 20 * 1024 * 1024
+SUBMISSIONS_UPLOAD_TTL = 60 * 60 * 24  # unfinished uploads expire after a day
+
+# Content-addressed media: submission images are stored once per unique
+# content under a sharded tree (submissions/storage.py)
+SUBMISSIONS_CONTENT_ADDRESSED_MEDIA = True
+SUBMISSIONS_MEDIA_PURGE_GRACE = 60 * 60  # seconds an unreferenced file is kept
+
+# Near-duplicate image detection (perceptual hash, submissions/phash.py)
+SUBMISSIONS_DUPLICATE_MAX_DISTANCE = 8  # differing bits out of 64
+SUBMISSIONS_DUPLICATE_MAX_CANDIDATES = 10000  # candidates per hash above which a lookup logs a warning (e.g. blank photos)
+
+# Idempotency-Key support on submission creation (stored in CACHES)
+SUBMISSIONS_IDEMPOTENCY_TTL = 60 * 60 * 24  # how long a response can be replayed
+SUBMISSIONS_IDEMPOTENCY_LOCK_TIMEOUT = 60  # in-flight lock lifetime
+SUBMISSIONS_IDEMPOTENCY_WAIT = 10  # how long a concurrent duplicate waits
+
+# Per-request instrumentation (submissions/metrics.py): per-view latency
+# histograms served on /metrics, and a Server-Timing header with the
+# time spent in the database, authentication, serializers and rendering
+SUBMISSIONS_METRICS_ENABLED = True
+SUBMISSIONS_SERVER_TIMING = DEBUG
+SUBMISSIONS_METRICS_ALLOWED_IPS = ('127.0.0.1/32', '::1/128')  # networks allowed to scrape /metrics
+
+# JWT authentication user cache (submissions/caching.py): a per-process LRU
+# and, if SUBMISSIONS_USER_CACHE_SHARED, a second tier in CACHES.
+# A size of 0 and no shared tier queries Users on every request
+SUBMISSIONS_USER_CACHE_SIZE = 10000
+SUBMISSIONS_USER_CACHE_TTL = 300  # seconds
+SUBMISSIONS_USER_CACHE_SHARED = False
+
+# Slow-query sampler (submissions/slowqueries.py): queries slower than
+# SUBMISSIONS_SLOW_QUERY_MS are logged with their EXPLAIN plan and kept in
+# a ring buffer in CACHES (`python manage.py slow_queries`); None disables it
+SUBMISSIONS_SLOW_QUERY_MS = 200
+SUBMISSIONS_SLOW_QUERY_SAMPLE_RATE = 1.0  # share of slow queries recorded
+SUBMISSIONS_SLOW_QUERY_EXPLAIN_INTERVAL = 300  # seconds between two EXPLAINs of the same query
+SUBMISSIONS_SLOW_QUERY_BUFFER = 500  # records kept
+
+# One-time login codes (submissions/otp.py): 'database' keeps them in
+# OtpCodes (purge with `python manage.py purge_expired_otps`), 'cache'
+# in CACHES with native expiry and no SQL, once CACHES is shared
+SUBMISSIONS_OTP_STORE = 'database'
+SUBMISSIONS_OTP_TTL = 300  # seconds
+SUBMISSIONS_OTP_MAX_ATTEMPTS = 5  # wrong codes before a new one must be sent
+
 # JWT Settings
 from datetime import timedelta
 
@@ -207,6 +322,8 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'idempotency-key',
+    'upload-offset',
 ]
 
 # Methods المسموح بها
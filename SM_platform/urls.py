@@ -19,9 +19,12 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from submissions.metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('submissions.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 # Serve media files during development
@@ -1,6 +1,141 @@
+from django.conf import settings
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import PAGE_VAR, ChangeList
+from django.core.exceptions import ValidationError
+from django.db import connections
+
 from .models import Category, Submission, User, OtpCode
 
+# keyset navigation: the page starts after / ends before this primary key
+AFTER_VAR = 'after'
+BEFORE_VAR = 'before'
+
+
+def estimated_row_count(queryset):
+    """Row count from the table statistics (MySQL/PostgreSQL), or None"""
+    connection = connections[queryset.db]
+    table = queryset.model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT TABLE_ROWS FROM information_schema.TABLES '
+                'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s',
+                [table],
+            )
+        elif connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [connection.ops.quote_name(table)])
+        else:
+            return None
+        row = cursor.fetchone()
+    # PostgreSQL returns -1 for tables that were never analyzed
+    return int(row[0]) if row and row[0] is not None and row[0] >= 0 else None
+
+
+class LargeTableChangeList(ChangeList):
+    """
+    Changelist that never scans the whole table: pages are fetched with
+    WHERE pk < last_seen instead of OFFSET, and the row count is exact
+    only up to SUBMISSIONS_ADMIN_EXACT_COUNT_LIMIT (the table statistics
+    estimate is shown for larger unfiltered tables).
+    """
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        for name in (AFTER_VAR, BEFORE_VAR):
+            lookup_params.pop(name, None)
+        return lookup_params
+
+    def get_result_count(self):
+        """(count, display text) for the filtered queryset"""
+        limit = getattr(settings, 'SUBMISSIONS_ADMIN_EXACT_COUNT_LIMIT', 10000)
+        if not self.queryset.query.has_filters():
+            estimate = estimated_row_count(self.queryset)
+            if estimate is not None and estimate > limit:
+                return estimate, f'~{estimate:,}'
+        # COUNT(*) over a LIMITed subquery stops after limit + 1 rows
+        count = self.queryset.order_by()[:limit + 1].count()
+        if count > limit:
+            return limit, f'+{limit:,}'
+        return count, f'{count:,}'
+
+    def get_keyset_ordering(self):
+        """True/False for pk descending/ascending, None if not ordered by pk"""
+        ordering = self.queryset.query.order_by
+        first = ordering[0] if ordering else None
+        if not isinstance(first, str):
+            return None
+        if first.lstrip('-') not in ('pk', self.lookup_opts.pk.attname):
+            return None
+        return first.startswith('-')
+
+    def get_cursor(self, name):
+        value = self.params.get(name)
+        if value in (None, ''):
+            return None
+        try:
+            return self.lookup_opts.pk.to_python(value)
+        except ValidationError:
+            raise IncorrectLookupParameters
+
+    def get_results(self, request):
+        descending = self.get_keyset_ordering()
+        if descending is None:
+            # ترتيب غير المفتاح الأساسي: الصفحات العادية
+            return super().get_results(request)
+
+        after, before = self.get_cursor(AFTER_VAR), self.get_cursor(BEFORE_VAR)
+        forward, backward = ('lt', 'gt') if descending else ('gt', 'lt')
+        queryset = self.queryset
+        if before is not None:
+            queryset = queryset.filter(**{f'pk__{backward}': before}).reverse()
+        elif after is not None:
+            queryset = queryset.filter(**{f'pk__{forward}': after})
+
+        # نجلب صفاً إضافياً لمعرفة إن كانت هناك صفحة أخرى
+        results = list(queryset[:self.list_per_page + 1])
+        has_more = len(results) > self.list_per_page
+        results = results[:self.list_per_page]
+        if before is not None:
+            results.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, after is not None
+
+        self.result_count, self.result_count_display = self.get_result_count()
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.result_list = results
+        self.can_show_all = False
+        self.multi_page = has_next or has_previous
+        self.paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+
+        cursors = [AFTER_VAR, BEFORE_VAR, PAGE_VAR]
+        self.next_url = self.previous_url = None
+        if has_next and results:
+            self.next_url = self.get_query_string({AFTER_VAR: results[-1].pk}, cursors)
+        if has_previous:
+            self.previous_url = (
+                self.get_query_string({BEFORE_VAR: results[0].pk}, cursors) if results
+                else self.get_query_string(remove=cursors)
+            )
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Admin for tables with millions of rows: keyset navigation on the
+    primary key, bounded counts, and no per-column sorting, facets or
+    date_hierarchy (all of which scan the table).
+    """
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    sortable_by = ()
+    change_list_template = 'admin/submissions/keyset_change_list.html'
+
+    def get_changelist(self, request, **kwargs):
+        return LargeTableChangeList
+
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -11,29 +146,58 @@ class CategoryAdmin(admin.ModelAdmin):
     ordering = ['category_id']
 
 
+class NearDuplicateFilter(admin.SimpleListFilter):
+    """Filter submissions whose image looks like an earlier one"""
+    title = 'صورة مكررة'
+    parameter_name = 'near_duplicate'
+
+    def lookups(self, request, model_admin):
+        return [('yes', 'نعم'), ('no', 'لا')]
+
+    def queryset(self, request, queryset):
+        if self.value() == 'yes':
+            return queryset.filter(duplicate_of__isnull=False)
+        if self.value() == 'no':
+            return queryset.filter(duplicate_of__isnull=True)
+        return queryset
+
+
 @admin.register(Submission)
-class SubmissionAdmin(admin.ModelAdmin):
+class SubmissionAdmin(LargeTableAdmin):
     """Admin interface for Submission model"""
-    list_display = ['submission_id', 'user', 'category', 'created_at']
-    list_filter = ['category', 'created_at']
-    search_fields = ['user__phone_number', 'notes']
-    readonly_fields = ['submission_id', 'created_at']
-    date_hierarchy = 'created_at'
+    list_display = ['submission_id', 'user', 'category', 'near_duplicate', 'created_at']
+    list_select_related = ['user', 'category']
+    list_filter = [NearDuplicateFilter, 'category', 'created_at']
+    # بحث ببداية رقم الهاتف فقط: ^ تعني istartswith، أي LIKE '...%' الذي يستخدم فهرس الأرقام
+    # (startswith يصبح LIKE BINARY في MySQL ولا يستخدم الفهرس مع ترتيب المقارنة غير الحساس لحالة الأحرف)
+    search_fields = ['^user__phone_number']
+    search_help_text = 'ابحث ببداية رقم الهاتف'
+    readonly_fields = ['submission_id', 'created_at', 'duplicate_of', 'duplicate_distance']
+    raw_id_fields = ['user']
+    ordering = ['-submission_id']
+
+    @admin.display(description='مكرر محتمل لـ', ordering='duplicate_of')
+    def near_duplicate(self, obj):
+        # المعرف فقط، لتجنب استعلام إضافي لكل صف
+        if obj.duplicate_of_id is None:
+            return '-'
+        return f'#{obj.duplicate_of_id} ({obj.duplicate_distance})'
 
 
 @admin.register(User)
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(LargeTableAdmin):
     """Admin interface for User model"""
     list_display = ['user_id', 'phone_number', 'created_at']
-    search_fields = ['phone_number']
+    search_fields = ['^phone_number']
+    search_help_text = 'ابحث ببداية رقم الهاتف'
     readonly_fields = ['user_id', 'created_at']
-    date_hierarchy = 'created_at'
+    ordering = ['-user_id']
 
 
 @admin.register(OtpCode)
 class OtpCodeAdmin(admin.ModelAdmin):
     """Admin interface for OtpCode model"""
-    list_display = ['id', 'phone_number', 'expires_at']
+    list_display = ['id', 'phone_number', 'expires_at', 'attempts']
     search_fields = ['phone_number']
     list_filter = ['expires_at']
-    readonly_fields = ['id']
+    readonly_fields = ['id', 'attempts']
@@ -0,0 +1,195 @@
+"""
+Incrementally maintained aggregates of the Submissions table.
+
+Map tiles (SubmissionTile) and daily rollups (DailySubmissionStats,
+DailyUserActivity) follow every write to a submission. Each write is
+turned into counter deltas: the submission as it was loaded from the
+database is removed and the submission as saved is added. Deltas are
+applied with a few queries per write, so reads never scan Submissions. The Submission signals
+call `track_submission` (post_save) / `release_submission` (pre_delete, so
+a cascade from a deleted User or Category still finds the parent's rows);
+bulk paths (bulk_create, queryset.update) call `apply_changes` themselves.
+
+`rebuild_aggregates` recomputes everything from scratch.
+"""
+import math
+from collections import defaultdict, namedtuple
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.utils import timezone
+
+SubmissionPoint = namedtuple('SubmissionPoint', ['category_id', 'latitude', 'longitude', 'created_at', 'user_id'])
+
+MAX_MERCATOR_LATITUDE = 85.05112878
+
+
+def get_tile_zooms():
+    return getattr(settings, 'SUBMISSIONS_TILE_ZOOMS', (3, 6, 9, 12, 15))
+
+
+def submission_point(instance):
+    """The aggregated fields of a submission as it is now"""
+    return SubmissionPoint(*(getattr(instance, field) for field in SubmissionPoint._fields))
+
+
+def loaded_point(instance):
+    """The aggregated fields as last loaded/saved (deferred fields count as unchanged)"""
+    loaded = getattr(instance, '_loaded_values', None) or {}
+    return SubmissionPoint(*(
+        loaded[field] if field in loaded else getattr(instance, field)
+        for field in SubmissionPoint._fields
+    ))
+
+
+def track_submission(instance, created):
+    """Move the instance's contribution from its loaded values to its saved values"""
+    new = submission_point(instance)
+    old = None if created else loaded_point(instance)
+    if old != new:
+        apply_changes(added=[new], removed=[old] if old else [])
+    instance._loaded_values = dict(getattr(instance, '_loaded_values', None) or {}, **new._asdict())
+
+
+def release_submission(instance):
+    """Remove a deleted submission's contribution"""
+    apply_changes(removed=[loaded_point(instance)])
+
+
+# Tiles
+
+def point_tiles(latitude, longitude, zooms):
+    """Web-mercator (zoom, x, y) of the tiles containing a point, projected once for all zooms"""
+    latitude = max(-MAX_MERCATOR_LATITUDE, min(MAX_MERCATOR_LATITUDE, float(latitude)))
+    radians = math.radians(latitude)
+    fraction_x = (float(longitude) + 180) / 360
+    fraction_y = (1 - math.log(math.tan(radians) + 1 / math.cos(radians)) / math.pi) / 2
+    tiles = []
+    for zoom in zooms:
+        scale = 1 << zoom
+        x, y = int(fraction_x * scale), int(fraction_y * scale)
+        tiles.append((zoom, min(max(x, 0), scale - 1), min(max(y, 0), scale - 1)))
+    return tiles
+
+
+def tile_for(latitude, longitude, zoom):
+    """Web-mercator (x, y) of the tile containing a point at `zoom`"""
+    return point_tiles(latitude, longitude, (zoom,))[0][1:]
+
+
+def tile_deltas(added, removed):
+    """{(zoom, x, y, category_id): {count, latitude_sum, longitude_sum}}"""
+    deltas = defaultdict(lambda: {'count': 0, 'latitude_sum': 0.0, 'longitude_sum': 0.0})
+    zooms = get_tile_zooms()
+    for points, sign in ((added, 1), (removed, -1)):
+        for point in points:
+            latitude, longitude = float(point.latitude), float(point.longitude)
+            for tile in point_tiles(latitude, longitude, zooms):
+                delta = deltas[(*tile, point.category_id)]
+                delta['count'] += sign
+                delta['latitude_sum'] += sign * latitude
+                delta['longitude_sum'] += sign * longitude
+    return deltas
+
+
+# Daily rollups
+
+def rollup_day(created_at):
+    """Calendar day (in TIME_ZONE) a submission is counted on"""
+    return timezone.localdate(created_at, timezone.get_default_timezone())
+
+
+def activity_deltas(added, removed):
+    """{(day, category_id, user_id): {'submissions': delta}}"""
+    deltas = defaultdict(lambda: {'submissions': 0})
+    for points, sign in ((added, 1), (removed, -1)):
+        for point in points:
+            deltas[(rollup_day(point.created_at), point.category_id, point.user_id)]['submissions'] += sign
+    return deltas
+
+
+def daily_deltas(activity, previous):
+    """
+    {(day, category_id): {'submissions', 'users'}} from the activity deltas.
+
+    A user is counted on a day/category when their activity row goes from
+    zero to positive, and uncounted when it drops back to zero.
+    """
+    deltas = defaultdict(lambda: {'submissions': 0, 'users': 0})
+    for key, change in activity.items():
+        if not change['submissions']:
+            continue
+        before = previous.get(key, {}).get('submissions', 0)
+        after = before + change['submissions']
+        delta = deltas[key[:2]]
+        delta['submissions'] += change['submissions']
+        delta['users'] += (after > 0) - (before > 0)
+    return deltas
+
+
+# Applying deltas
+
+def increment_rows(model, key_fields, deltas, lock=False):
+    """
+    Add `deltas` ({key tuple: {field: delta}}) to the matching rows of
+    `model`, creating missing rows. One SELECT, one UPDATE (CASE per row)
+    and one INSERT at most, whatever the number of keys. The first field
+    is the row's count: missing rows are only created when it grows (a
+    removal whose row is gone, e.g. deleted with its category, has
+    nothing to subtract from).
+
+    Returns {key: {field: value before the update}} for the rows that
+    already existed. With lock=True they are read with SELECT ... FOR
+    UPDATE, so the previous values stay exact under concurrent writes.
+    """
+    deltas = {key: values for key, values in deltas.items() if any(values.values())}
+    if not deltas:
+        return {}
+    fields = list(next(iter(deltas.values())))
+
+    query = Q()
+    for key in deltas:
+        query |= Q(**dict(zip(key_fields, key)))
+    queryset = model.objects.filter(query)
+    if lock:
+        queryset = queryset.select_for_update()
+    existing, previous = {}, {}
+    for row in queryset.values('pk', *key_fields, *fields):
+        key = tuple(row[field] for field in key_fields)
+        existing[key] = row['pk']
+        previous[key] = {field: row[field] for field in fields}
+
+    if existing:
+        model.objects.filter(pk__in=existing.values()).update(**{
+            field: F(field) + Case(
+                *[When(pk=pk, then=Value(deltas[key][field])) for key, pk in existing.items()],
+                default=Value(0),
+                output_field=model._meta.get_field(field),
+            )
+            for field in fields
+        })
+
+    missing = [key for key in deltas if key not in existing and deltas[key][fields[0]] > 0]
+    if missing:
+        try:
+            with transaction.atomic():
+                model.objects.bulk_create([
+                    model(**dict(zip(key_fields, key)), **deltas[key]) for key in missing
+                ])
+        except IntegrityError:
+            # طلب آخر أنشأ بعض الصفوف في نفس الوقت
+            for key in missing:
+                previous.update(increment_rows(model, key_fields, {key: deltas[key]}, lock))
+    return previous
+
+
+def apply_changes(added=(), removed=()):
+    """Apply the aggregate deltas for added/removed SubmissionPoints"""
+    from .models import DailySubmissionStats, DailyUserActivity, SubmissionTile
+
+    with transaction.atomic():
+        increment_rows(SubmissionTile, ('zoom', 'x', 'y', 'category_id'), tile_deltas(added, removed))
+        activity = activity_deltas(added, removed)
+        previous = increment_rows(DailyUserActivity, ('day', 'category_id', 'user_id'), activity, lock=True)
+        increment_rows(DailySubmissionStats, ('day', 'category_id'), daily_deltas(activity, previous))
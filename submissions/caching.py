@@ -0,0 +1,272 @@
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils.http import quote_etag
+
+from .metrics import registry
+
+
+def new_version():
+    """Return a fresh, unique version stamp"""
+    return uuid.uuid4().hex
+
+
+def make_etag(*parts):
+    """Build a strong ETag from the given parts"""
+    value = ':'.join(str(part) for part in parts)
+    return quote_etag(hashlib.sha256(value.encode()).hexdigest())
+
+
+CategorySnapshot = namedtuple('CategorySnapshot', ['version', 'data', 'by_id', 'etag'])
+ChangeMarker = namedtuple('ChangeMarker', ['version', 'modified_at'])
+
+
+class CategoryCache:
+    """
+    Per-process cache of the Categories table.
+
+    The snapshot is reused while the version stamp stored in Django's cache
+    framework is unchanged. Category saves/deletes and the add_categories
+    command bump the stamp, so every process reloads on its next request.
+    With more than one server process, CACHES must point to a shared
+    backend for the stamp to be seen by all of them.
+    """
+    version_key = 'submissions:categories:version'
+    modified_key = 'submissions:categories:modified'
+
+    def __init__(self):
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def get_version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, new_version(), None)
+            version = cache.get(self.version_key)
+        return version
+
+    def get_marker(self):
+        """
+        ChangeMarker of the Categories table, for the responses that embed
+        category names (modified_at is 0 until a change has been seen)
+        """
+        values = cache.get_many([self.version_key, self.modified_key])
+        version = values.get(self.version_key) or self.get_version()
+        return ChangeMarker(version, values.get(self.modified_key, 0))
+
+    def get(self):
+        """Return the current CategorySnapshot, reloading it if the stamp moved"""
+        version = self.get_version()
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.version != version:
+                snapshot = self._load(version)
+                self._snapshot = snapshot
+        return snapshot
+
+    def _load(self, version):
+        from .models import Category
+        from .serializers import CategorySerializer
+
+        categories = Category.objects.order_by('category_id')
+        data = CategorySerializer(categories, many=True).data
+        body = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+        etag = make_etag(body)
+        return CategorySnapshot(
+            version=version,
+            data=data,
+            by_id={item['category_id']: item for item in data},
+            etag=etag,
+        )
+
+    def invalidate(self):
+        """Bump the version stamp now and again once the transaction commits"""
+        self._bump()
+        # البصمة الثانية تمنع عملية أخرى من تخزين بيانات ما قبل الـ commit
+        transaction.on_commit(self._bump)
+
+    def _bump(self):
+        # Last-Modified has one second resolution; keep it strictly increasing
+        modified_at = max(int(time.time()), cache.get(self.modified_key, 0) + 1)
+        cache.set_many({self.version_key: new_version(), self.modified_key: modified_at}, None)
+        self._snapshot = None
+
+    def exists(self, category_id):
+        return category_id in self.get().by_id
+
+
+category_cache = CategoryCache()
+
+
+
+class SubmissionVersionCache:
+    """
+    Per-user change marker for the submission endpoints.
+
+    The marker (version stamp + unix time of the last change) is read
+    before any query runs, so conditional GETs can be answered without
+    touching the Submissions table. Every create/update/delete of a
+    user's submission replaces the marker. A missing marker (evicted or
+    cache restarted) is recreated with the current time, which only
+    turns would-be 304s into 200s.
+    """
+    key_template = 'submissions:user:{}:version'
+
+    def key(self, user_id):
+        return self.key_template.format(user_id)
+
+    def get(self, user_id):
+        key = self.key(user_id)
+        marker = cache.get(key)
+        if marker is None:
+            cache.add(key, ChangeMarker(new_version(), int(time.time())), None)
+            marker = cache.get(key)
+        return ChangeMarker(*marker)
+
+    def invalidate(self, user_id):
+        """Replace the marker now and again once the transaction commits"""
+        self._bump(user_id)
+        transaction.on_commit(lambda: self._bump(user_id))
+
+    def _bump(self, user_id):
+        key = self.key(user_id)
+        previous = cache.get(key)
+        modified_at = int(time.time())
+        if previous is not None:
+            # Last-Modified has one second resolution; keep it strictly increasing
+            modified_at = max(modified_at, ChangeMarker(*previous).modified_at + 1)
+        cache.set(key, ChangeMarker(new_version(), modified_at), None)
+
+
+submission_versions = SubmissionVersionCache()
+
+
+class UserCache:
+    """
+    Cache of User rows for JWT authentication, in two tiers.
+
+    A per-process LRU of SUBMISSIONS_USER_CACHE_SIZE entries, each kept
+    SUBMISSIONS_USER_CACHE_TTL seconds, and optionally
+    (SUBMISSIONS_USER_CACHE_SHARED) Django's cache, shared between the
+    server processes. Entries are tagged with a version stamp kept in
+    Django's cache: updating or deleting a user bumps it, so every
+    process drops its entries on its next lookup (like CategoryCache,
+    this needs a shared CACHES backend with more than one process).
+    queryset.update() and raw SQL bypass the signals; the TTL bounds how
+    long such changes stay unseen.
+
+    Lookups return a fresh User instance, never an object shared between
+    requests.
+    """
+    version_key = 'submissions:users:version'
+    key_template = 'submissions:users:{}:{}'
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'local_hit': 0, 'shared_hit': 0, 'miss': 0}
+        self._fields = None
+
+    def get_version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, new_version(), None)
+            version = cache.get(self.version_key)
+        return version
+
+    def get(self, user_id):
+        """Return the User with this id, or None if it does not exist"""
+        size = getattr(settings, 'SUBMISSIONS_USER_CACHE_SIZE', 10000)
+        shared = getattr(settings, 'SUBMISSIONS_USER_CACHE_SHARED', False)
+        ttl = getattr(settings, 'SUBMISSIONS_USER_CACHE_TTL', 300)
+        if not size and not shared:
+            values = self._load(user_id)
+            return self._build(values) if values is not None else None
+
+        version = self.get_version()
+        if size:
+            with self._lock:
+                entry = self._entries.get(user_id)
+                if entry is not None and entry[0] == version and entry[1] > time.monotonic():
+                    self._entries.move_to_end(user_id)
+                    self.stats['local_hit'] += 1
+                    return self._build(entry[2])
+
+        values = cache.get(self.key_template.format(version, user_id)) if shared else None
+        if values is not None:
+            result = 'shared_hit'
+        else:
+            result = 'miss'
+            values = self._load(user_id)
+            if values is None:
+                # لا يُخزَّن غياب المستخدم: المعرّفات المحذوفة لا تعود
+                with self._lock:
+                    self.stats[result] += 1
+                return None
+            if shared:
+                cache.set(self.key_template.format(version, user_id), values, ttl)
+
+        with self._lock:
+            self.stats[result] += 1
+            if size:
+                self._entries[user_id] = (version, time.monotonic() + ttl, values)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > size:
+                    self._entries.popitem(last=False)
+        return self._build(values)
+
+    def fields(self):
+        if self._fields is None:
+            from .models import User
+            self._fields = [field.attname for field in User._meta.concrete_fields]
+        return self._fields
+
+    def _load(self, user_id):
+        from .models import User
+        return User.objects.filter(user_id=user_id).values_list(*self.fields()).first()
+
+    def _build(self, values):
+        from .models import User
+        return User.from_db(DEFAULT_DB_ALIAS, self.fields(), values)
+
+    def invalidate(self):
+        """Bump the version stamp now and again once the transaction commits"""
+        self._bump()
+        transaction.on_commit(self._bump)
+
+    def _bump(self):
+        cache.set(self.version_key, new_version(), None)
+        with self._lock:
+            self._entries.clear()
+
+    def metrics(self):
+        """Prometheus lines for /metrics"""
+        with self._lock:
+            stats = dict(self.stats)
+            size = len(self._entries)
+        lines = [
+            '# HELP sm_user_cache_lookups_total Authentication user lookups per result',
+            '# TYPE sm_user_cache_lookups_total counter',
+        ]
+        lines += [f'sm_user_cache_lookups_total{{result="{result}"}} {count}' for result, count in stats.items()]
+        lines += [
+            '# HELP sm_user_cache_entries Users in the per-process cache',
+            '# TYPE sm_user_cache_entries gauge',
+            f'sm_user_cache_entries {size}',
+        ]
+        return lines
+
+
+user_cache = UserCache()
+registry.add_collector(user_cache.metrics)
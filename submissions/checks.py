@@ -0,0 +1,38 @@
+"""
+System checks of the submissions app.
+
+The category cache version, ETag markers, idempotency locks, the user
+cache version stamp, OTP codes (store 'cache') and the slow-query buffer
+live in Django's default cache. They are only correct when every server
+process sees the same cache, so a process-local backend is reported
+(a warning, so existing deployments keep starting) unless
+SUBMISSIONS_ALLOW_LOCAL_CACHE says there is a single process (the
+development server).
+"""
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS
+from django.core.checks import Tags, Warning, register
+
+PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs=None, **kwargs):
+    if getattr(settings, 'SUBMISSIONS_ALLOW_LOCAL_CACHE', False):
+        return []
+    backend = settings.CACHES.get(DEFAULT_CACHE_ALIAS, {}).get('BACKEND')
+    if backend not in PROCESS_LOCAL_CACHES:
+        return []
+    return [Warning(
+        f'The default cache ({backend}) is not shared between server processes.',
+        hint=(
+            'Cache invalidations, ETag markers, Idempotency-Key locks and the user cache version '
+            'would only reach the process that wrote them. Configure a shared CACHES backend '
+            '(Redis, Memcached) or, with a single server process, set SUBMISSIONS_ALLOW_LOCAL_CACHE = True.'
+        ),
+        id='submissions.W001',
+    )]
+
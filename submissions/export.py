@@ -0,0 +1,113 @@
+"""
+Helpers for exporting submissions as NDJSON or CSV.
+
+Rows are read in primary-key order in fixed-size keyset batches
+(WHERE submission_id > last ORDER BY submission_id LIMIT n). Memory stays
+flat on every backend, including MySQL where mysqlclient buffers a
+whole result set on the client.
+"""
+import csv
+import json
+
+from django.db.models import Q
+
+from .fastpath import SUBMISSION_VALUE_FIELDS, serialize_submission_rows, orjson
+
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+CSV_COLUMNS = [
+    'submission_id', 'created_at', 'user_id', 'phone_number',
+    'category_id', 'category_name_ar', 'category_name_en',
+    'image_url', 'invoice_image', 'notes', 'latitude', 'longitude',
+    'counter_number', 'consumption_number',
+]
+
+
+def iter_submission_chunks(queryset, chunk_size, after=0):
+    """Yield lists of serialized submissions in submission_id order"""
+    queryset = queryset.order_by('submission_id').values(*SUBMISSION_VALUE_FIELDS)
+    while True:
+        rows = list(queryset.filter(submission_id__gt=after)[:chunk_size])
+        if not rows:
+            return
+        yield serialize_submission_rows(rows)
+        if len(rows) < chunk_size:
+            return
+        after = rows[-1]['submission_id']
+
+
+def iter_changed_submission_chunks(queryset, chunk_size, until, after):
+    """
+    Yield (position, serialized chunk) for rows changed after `after` and
+    up to `until`, in (updated_at, submission_id) order. `after` and
+    `position` are (updated_at, submission_id) keys, so a run can resume
+    after any chunk; a None submission_id starts strictly after updated_at.
+    """
+    queryset = (
+        queryset.filter(updated_at__lte=until)
+        .order_by('updated_at', 'submission_id')
+        .values(*SUBMISSION_VALUE_FIELDS, 'updated_at')
+    )
+    while True:
+        updated_at, submission_id = after
+        condition = Q(updated_at__gt=updated_at)
+        if submission_id is not None:
+            condition |= Q(updated_at=updated_at, submission_id__gt=submission_id)
+        rows = list(queryset.filter(condition)[:chunk_size])
+        if not rows:
+            return
+        after = (rows[-1]['updated_at'], rows[-1]['submission_id'])
+        yield after, serialize_submission_rows(rows)
+        if len(rows) < chunk_size:
+            return
+
+
+def flatten_submission(item):
+    """Flatten the nested user/category objects for CSV output"""
+    return [
+        item['submission_id'], item['created_at'],
+        item['user']['user_id'], item['user']['phone_number'],
+        item['category']['category_id'], item['category']['name_ar'], item['category']['name_en'],
+        item['image_url'], item['invoice_image'], item['notes'],
+        item['latitude'], item['longitude'],
+        item['counter_number'], item['consumption_number'],
+    ]
+
+
+def _dumps(item):
+    if orjson is not None:
+        return orjson.dumps(item)
+    return json.dumps(item, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+class _Echo:
+    """File-like object whose write() returns the value, for csv.writer"""
+
+    def write(self, value):
+        return value
+
+
+def encode_ndjson(chunk):
+    return b''.join(_dumps(item) + b'\n' for item in chunk)
+
+
+def encode_csv(chunk, header=False):
+    writer = csv.writer(_Echo())
+    lines = [writer.writerow(CSV_COLUMNS)] if header else []
+    lines.extend(writer.writerow(flatten_submission(item)) for item in chunk)
+    return ''.join(lines).encode()
+
+
+def stream_export(queryset, export_format, chunk_size):
+    """Yield encoded byte chunks of the export in the given format"""
+    if export_format == 'csv':
+        yield encode_csv([], header=True)
+        for chunk in iter_submission_chunks(queryset, chunk_size):
+            yield encode_csv(chunk)
+    else:
+        for chunk in iter_submission_chunks(queryset, chunk_size):
+            yield encode_ndjson(chunk)
@@ -0,0 +1,90 @@
+from datetime import datetime, time
+from decimal import Decimal, InvalidOperation
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+
+class InvalidFilter(ValueError):
+    """Raised when a query parameter cannot be parsed"""
+
+
+def _parse_int_list(value):
+    try:
+        return [int(part) for part in value.split(',') if part.strip()]
+    except (ValueError, TypeError):
+        raise InvalidFilter(value)
+
+
+def _parse_datetime(value):
+    """Accept an ISO datetime or a plain date (interpreted as midnight)"""
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            date = parse_date(value)
+            if date is None:
+                raise InvalidFilter(value)
+            parsed = datetime.combine(date, time.min)
+    except ValueError:
+        raise InvalidFilter(value)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _parse_bbox(value):
+    """Parse `min_lat,min_lng,max_lat,max_lng`"""
+    try:
+        min_lat, min_lng, max_lat, max_lng = bbox = [Decimal(part) for part in value.split(',')]
+        # nan و inf تُقرأ دون خطأ لكن المقارنة بها ترفع InvalidOperation
+        if not all(part.is_finite() for part in bbox):
+            raise InvalidFilter(value)
+    except (ValueError, InvalidOperation):
+        raise InvalidFilter(value)
+    if min_lat > max_lat or min_lng > max_lng:
+        raise InvalidFilter(value)
+    return min_lat, min_lng, max_lat, max_lng
+
+
+def filter_submissions(queryset, params):
+    """
+    Apply the list filters shared by the submission endpoints.
+
+    Supported query params (each one is backed by an index in Submission.Meta):
+        category_id     single category
+        category_ids    comma separated list of categories
+        created_after   ISO datetime/date, inclusive
+        created_before  ISO datetime/date, exclusive
+        bbox            min_lat,min_lng,max_lat,max_lng
+
+    Invalid values return an empty queryset, matching the original
+    category_id behaviour.
+    """
+    try:
+        category_ids = []
+        if params.get('category_id'):
+            category_ids += _parse_int_list(params['category_id'])
+        if params.get('category_ids'):
+            category_ids += _parse_int_list(params['category_ids'])
+        if category_ids:
+            if len(category_ids) == 1:
+                queryset = queryset.filter(category_id=category_ids[0])
+            else:
+                queryset = queryset.filter(category_id__in=category_ids)
+
+        if params.get('created_after'):
+            queryset = queryset.filter(created_at__gte=_parse_datetime(params['created_after']))
+        if params.get('created_before'):
+            queryset = queryset.filter(created_at__lt=_parse_datetime(params['created_before']))
+
+        if params.get('bbox'):
+            min_lat, min_lng, max_lat, max_lng = _parse_bbox(params['bbox'])
+            queryset = queryset.filter(
+                latitude__range=(min_lat, max_lat),
+                longitude__range=(min_lng, max_lng),
+            )
+    except InvalidFilter:
+        # إذا كانت قيمة التصفية غير صالحة نعيد نتيجة فارغة
+        return queryset.none()
+
+    return queryset
@@ -0,0 +1,137 @@
+"""
+Grid cells for indexed location queries without a spatial database.
+
+The globe is cut into GEO_CELL_SIZE degree cells numbered row by row
+(row = latitude band, column = longitude band), and every submission
+stores the number of its cell in the indexed `geo_cell` column. A circle
+around a point is covered by one contiguous range of cell numbers per
+latitude row, so a radius query becomes a handful of index range scans
+followed by an exact distance check on the rows inside them.
+"""
+import math
+from decimal import Decimal
+
+from django.db.models import ExpressionWrapper, F, FloatField, Q, Value
+
+GEO_CELL_SIZE = Decimal('0.01')  # ~1.1 km of latitude
+GEO_ROWS = int(180 / GEO_CELL_SIZE)
+GEO_COLUMNS = int(360 / GEO_CELL_SIZE)
+
+EARTH_RADIUS = 6371008.8  # metres
+METRES_PER_DEGREE = math.pi * EARTH_RADIUS / 180
+
+
+def _to_decimal(value):
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+def cell_row(latitude):
+    return min(int((_to_decimal(latitude) + 90) // GEO_CELL_SIZE), GEO_ROWS - 1)
+
+
+def cell_column(longitude):
+    return min(int((_to_decimal(longitude) + 180) // GEO_CELL_SIZE), GEO_COLUMNS - 1)
+
+
+def geo_cell(latitude, longitude):
+    """Cell number of a point"""
+    return cell_row(latitude) * GEO_COLUMNS + cell_column(longitude)
+
+
+def assign_geo_cell(instance):
+    """Set instance.geo_cell from its coordinates (bulk paths call this explicitly)"""
+    if instance.latitude is None or instance.longitude is None:
+        instance.geo_cell = None
+    else:
+        instance.geo_cell = geo_cell(instance.latitude, instance.longitude)
+
+
+def bounding_box(latitude, longitude, radius):
+    """(min_lat, min_lng, max_lat, max_lng) around a point, in float degrees"""
+    latitude, longitude = float(latitude), float(longitude)
+    delta_lat = radius / METRES_PER_DEGREE
+    cos_lat = math.cos(math.radians(latitude))
+    # قرب القطبين يغطي الدائرة جميع خطوط الطول
+    delta_lng = 180 if cos_lat < 1e-6 else min(180, delta_lat / cos_lat)
+    # ranges are clamped rather than wrapped across the antimeridian
+    return (
+        max(-90, latitude - delta_lat), max(-180, longitude - delta_lng),
+        min(90, latitude + delta_lat), min(180, longitude + delta_lng),
+    )
+
+
+def cell_ranges(min_lat, min_lng, max_lat, max_lng):
+    """[(first_cell, last_cell), ...] covering a bounding box, one range per row"""
+    first_column, last_column = cell_column(min_lng), cell_column(max_lng)
+    return [
+        (row * GEO_COLUMNS + first_column, row * GEO_COLUMNS + last_column)
+        for row in range(cell_row(min_lat), cell_row(max_lat) + 1)
+    ]
+
+
+def cells_query(ranges):
+    """Q matching geo_cell in any of `ranges`"""
+    query = Q()
+    for first, last in ranges:
+        query |= Q(geo_cell=first) if first == last else Q(geo_cell__range=(first, last))
+    return query
+
+
+def haversine(lat1, lng1, lat2, lng2):
+    """Great-circle distance in metres"""
+    lat1, lng1, lat2, lng2 = map(math.radians, (float(lat1), float(lng1), float(lat2), float(lng2)))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(math.sqrt(a))
+
+
+def nearby(queryset, latitude, longitude, radius):
+    """
+    Submissions within `radius` metres of a point, nearest first.
+
+    The SQL keeps rows in the covering cells whose equirectangular
+    distance (plain arithmetic, so it runs on MySQL and SQLite alike) is
+    within the radius, annotated as `distance_sq` (squared degrees).
+    """
+    ranges = cell_ranges(*bounding_box(latitude, longitude, radius))
+    latitude, longitude = _to_decimal(latitude), _to_decimal(longitude)
+    cos_lat = Decimal(str(round(math.cos(math.radians(float(latitude))), 12)))
+    delta_lat = F('latitude') - Value(latitude)
+    delta_lng = (F('longitude') - Value(longitude)) * Value(cos_lat)
+    max_distance_sq = (radius / METRES_PER_DEGREE) ** 2
+
+    return (
+        queryset.filter(cells_query(ranges))
+        .annotate(distance_sq=ExpressionWrapper(
+            delta_lat * delta_lat + delta_lng * delta_lng, output_field=FloatField()
+        ))
+        .filter(distance_sq__lte=max_distance_sq)
+        .order_by('distance_sq', 'submission_id')
+    )
+
+
+def nearest(queryset, latitude, longitude, radius, limit, fields):
+    """
+    Up to `limit` rows (dicts of `fields`) within `radius` metres, nearest
+    first, as (row, distance in metres) pairs.
+
+    nearby()'s planar distance differs slightly from the great-circle one,
+    so slicing it to `limit` could return rows that the exact check then
+    drops. Rows are fetched in windows a little larger than `limit` (the
+    database keeps only the window's nearest rows while sorting) until
+    enough pass the exact check.
+    """
+    rows = nearby(queryset, latitude, longitude, radius).values('latitude', 'longitude', *fields)
+    window = limit + max(8, limit // 4)
+    kept = []
+    start = 0
+    while len(kept) < limit:
+        batch = list(rows[start:start + window])
+        for row in batch:
+            distance = haversine(latitude, longitude, row['latitude'], row['longitude'])
+            if distance <= radius:
+                kept.append((row, distance))
+        if len(batch) < window:
+            break
+        start += window
+    kept.sort(key=lambda item: item[1])
+    return kept[:limit]
@@ -0,0 +1,128 @@
+import functools
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+
+def request_fingerprint(request):
+    """Hash of the request body, so a key can't be reused for a different request"""
+    digest = hashlib.sha256(request.path.encode())
+    for key in sorted(request.data.keys()):
+        if key in request.FILES:
+            continue
+        for value in request.data.getlist(key) if hasattr(request.data, 'getlist') else [request.data[key]]:
+            digest.update(f'{key}={value}\0'.encode())
+    for key in sorted(request.FILES.keys()):
+        for upload in request.FILES.getlist(key):
+            digest.update(f'{key}:{upload.name}:{upload.size}\0'.encode())
+    return digest.hexdigest()
+
+
+class IdempotencyStore:
+    """
+    Stores the first response for an Idempotency-Key in the Django cache.
+
+    While the first request is running, an in-flight lock is held so
+    concurrent duplicates wait for its response instead of racing it.
+    """
+    key_prefix = 'submissions:idempotency'
+
+    def response_key(self, user_id, path, key):
+        digest = hashlib.sha256(f'{user_id}:{path}:{key}'.encode()).hexdigest()
+        return f'{self.key_prefix}:response:{digest}'
+
+    def lock_key(self, response_key):
+        return f'{response_key}:lock'
+
+    def acquire(self, response_key):
+        timeout = getattr(settings, 'SUBMISSIONS_IDEMPOTENCY_LOCK_TIMEOUT', 60)
+        return cache.add(self.lock_key(response_key), True, timeout)
+
+    def release(self, response_key):
+        cache.delete(self.lock_key(response_key))
+
+    def get(self, response_key):
+        return cache.get(response_key)
+
+    def save(self, response_key, fingerprint, response):
+        ttl = getattr(settings, 'SUBMISSIONS_IDEMPOTENCY_TTL', 60 * 60 * 24)
+        cache.set(response_key, {
+            'fingerprint': fingerprint,
+            'status': response.status_code,
+            'data': response.data,
+        }, ttl)
+
+    def wait(self, response_key):
+        """Wait for an in-flight request with the same key and return its stored response"""
+        deadline = time.monotonic() + getattr(settings, 'SUBMISSIONS_IDEMPOTENCY_WAIT', 10)
+        lock_key = self.lock_key(response_key)
+        while time.monotonic() < deadline:
+            stored = cache.get(response_key)
+            if stored is not None:
+                return stored
+            if cache.get(lock_key) is None:
+                # انتهى الطلب الأول دون تخزين استجابة (خطأ 5xx)
+                return None
+            time.sleep(0.05)
+        return None
+
+
+idempotency_store = IdempotencyStore()
+
+
+def idempotent(method):
+    """
+    Make a DRF view handler honour the Idempotency-Key header.
+
+    The first response (unless it is a 5xx) is stored for
+    SUBMISSIONS_IDEMPOTENCY_TTL seconds and replayed for later requests with
+    the same key, without running the handler again.
+    """
+    @functools.wraps(method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return method(self, request, *args, **kwargs)
+        if len(key) > 255:
+            return Response({
+                'error': f'{IDEMPOTENCY_HEADER} طويل جداً'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        fingerprint = request_fingerprint(request)
+        response_key = idempotency_store.response_key(request.user.pk, request.path, key)
+
+        stored = idempotency_store.get(response_key)
+        if stored is None:
+            if idempotency_store.acquire(response_key):
+                try:
+                    response = method(self, request, *args, **kwargs)
+                    if response.status_code < 500:
+                        idempotency_store.save(response_key, fingerprint, response)
+                finally:
+                    idempotency_store.release(response_key)
+                return response
+
+            stored = idempotency_store.wait(response_key)
+            if stored is None:
+                return Response({
+                    'error': 'طلب بنفس مفتاح Idempotency-Key قيد المعالجة، يرجى المحاولة لاحقاً'
+                }, status=status.HTTP_409_CONFLICT)
+
+        if stored['fingerprint'] != fingerprint:
+            return Response({
+                'error': f'{IDEMPOTENCY_HEADER} مستخدم مسبقاً لطلب مختلف'
+            }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+        response = Response(stored['data'], status=stored['status'])
+        response[REPLAYED_HEADER] = 'true'
+        return response
+
+    return wrapper
@@ -0,0 +1,156 @@
+"""
+Background pipeline producing resized derivatives of submission images.
+
+Resizing/recompression runs with Pillow in a process pool so request
+threads only schedule the work. Results are saved to storage and written
+to the derivative columns from a single background thread. Rows are
+matched by the source file name, so rows created by bulk_create without
+returned ids are covered as well.
+
+A job that fails or is lost (e.g. the process restarts) only leaves the
+derivative columns empty; `manage.py regenerate_derivatives` fills them in.
+"""
+import io
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+
+# Source image field -> {derivative name: target field}
+DERIVATIVE_FIELDS = {
+    'image_url': {'thumbnail': 'image_thumbnail', 'web': 'image_web'},
+    'invoice_image': {'thumbnail': 'invoice_thumbnail', 'web': 'invoice_web'},
+}
+
+DEFAULT_DERIVATIVES = {
+    'thumbnail': {'size': (320, 320), 'quality': 70},
+    'web': {'size': (1600, 1600), 'quality': 82},
+}
+
+
+def get_derivative_specs():
+    return getattr(settings, 'SUBMISSIONS_IMAGE_DERIVATIVES', DEFAULT_DERIVATIVES)
+
+
+def render_derivatives(path, specs):
+    """
+    Return {derivative name: JPEG bytes} for the image at `path`.
+
+    Runs inside a worker process; must not touch Django models or settings.
+    """
+    largest = max(max(spec['size']) for spec in specs.values())
+    with Image.open(path) as image:
+        # JPEG decoder can downscale while decoding, much faster for large photos
+        image.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(image).convert('RGB')
+
+        results = {}
+        for name, spec in specs.items():
+            derivative = image.copy()
+            derivative.thumbnail(spec['size'], Image.Resampling.LANCZOS)
+            buffer = io.BytesIO()
+            derivative.save(buffer, format='JPEG', quality=spec['quality'], optimize=True, progressive=True)
+            results[name] = buffer.getvalue()
+        return results
+
+
+class DerivativePipeline:
+    """Schedules derivative generation outside the request thread"""
+
+    def __init__(self):
+        self._process_pool = None
+        self._store_thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def workers(self):
+        return getattr(settings, 'SUBMISSIONS_IMAGE_WORKERS', 2)
+
+    def _get_pools(self):
+        with self._lock:
+            if self._process_pool is None:
+                # spawn: worker processes must not inherit DB connections or threads
+                self._process_pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+                self._store_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix='image-derivatives')
+            return self._process_pool, self._store_thread
+
+    def schedule(self, instance, fields=None):
+        """Generate derivatives for the instance's images once the transaction commits"""
+        for source_field in fields or DERIVATIVE_FIELDS:
+            name = getattr(instance, source_field).name
+            if name:
+                transaction.on_commit(lambda field=source_field, name=name: self.submit(field, name))
+
+    def submit(self, source_field, source_name):
+        from .models import Submission
+
+        path = Submission._meta.get_field(source_field).storage.path(source_name)
+        specs = get_derivative_specs()
+
+        if self.workers == 0:
+            # وضع متزامن (للتطوير والاختبارات)
+            self.store(source_field, source_name, render_derivatives(path, specs))
+            return
+
+        process_pool, store_thread = self._get_pools()
+        future = process_pool.submit(render_derivatives, path, specs)
+        future.add_done_callback(
+            lambda future: store_thread.submit(self._store_result, source_field, source_name, future)
+        )
+
+    def _store_result(self, source_field, source_name, future):
+        try:
+            self.store(source_field, source_name, future.result())
+        except Exception:
+            logger.exception('Failed to generate derivatives for %s', source_name)
+        finally:
+            close_old_connections()
+
+    def store(self, source_field, source_name, derivatives):
+        """Save derivative files and point every row using `source_name` at them"""
+        from .caching import submission_versions
+        from .models import Submission
+        from .storage import discard_files, reassign_files
+
+        rows = Submission.objects.filter(**{source_field: source_name})
+        instance = rows.first()
+        if instance is None:
+            # الصورة استُبدلت أو حُذف التقديم قبل انتهاء المعالجة
+            return
+
+        base = os.path.splitext(os.path.basename(source_name))[0]
+        updates = {}
+        for derivative, target_field in DERIVATIVE_FIELDS[source_field].items():
+            if derivative not in derivatives:
+                continue
+            target = getattr(instance, target_field)
+            target.save(f'{base}_{derivative}.jpg', ContentFile(derivatives[derivative]), save=False)
+            updates[target_field] = target.name
+
+        with transaction.atomic():
+            current = list(rows.select_for_update().values_list('user_id', *updates))
+            if not current:
+                # الصورة استُبدلت أثناء حفظ المشتقات: لا يشير إليها أي صف
+                discard_files(updates.values())
+                return
+            rows.update(**updates, updated_at=timezone.now())
+            for index, target_field in enumerate(updates, start=1):
+                reassign_files([row[index] for row in current], updates[target_field])
+        for user_id in {row[0] for row in current}:
+            submission_versions.invalidate(user_id)
+
+
+derivative_pipeline = DerivativePipeline()
@@ -0,0 +1,286 @@
+"""
+Load-testing harness replaying the client flows of SM_Platform_Postman_Collection.json.
+
+Each virtual user runs the full scenario in a loop:
+send-otp -> verify-otp -> categories -> create submission (multipart,
+photo and invoice) -> list -> detail -> refresh-token.
+
+Requests go either through django.test.Client in this process (database
+queries are counted per request) or over HTTP to a running server (query
+counts come from its Server-Timing header, when it sends one). Every
+request is recorded as a Sample; `build_report` turns them into
+per-endpoint throughput, latency percentiles and queries per request,
+as a JSON-serializable dict that `compare_reports` can diff between runs.
+"""
+import http.client
+import io
+import json
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+# Query count in the db entry of Server-Timing (submissions/metrics.py)
+SERVER_TIMING_QUERIES = re.compile(r'\bdb;[^,]*desc="(\d+) queries"')
+
+# status is None when no response was received (timeout, refused or dropped connection)
+Sample = namedtuple('Sample', ['endpoint', 'status', 'seconds', 'queries'])
+
+# Report fields compared between runs: (name, True if higher is better)
+COMPARED_METRICS = [
+    ('throughput_rps', True), ('p50_ms', False), ('p95_ms', False), ('p99_ms', False), ('queries_per_request', False),
+]
+
+
+class ScenarioError(Exception):
+    """A request of the scenario failed, the rest of the iteration is skipped"""
+
+
+def make_photo(seed, size=(1600, 1200), quality=85):
+    """JPEG bytes with a random block pattern (compresses like a phone photo, unlike a flat image)"""
+    rng = random.Random(seed)
+    pattern = Image.new('L', (16, 12))
+    pattern.putdata([rng.randrange(256) for _ in range(16 * 12)])
+    buffer = io.BytesIO()
+    pattern.resize(size, Image.Resampling.BILINEAR).convert('RGB').save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+# Transports
+
+class TestClientTransport:
+    """Requests through django.test.Client in this process, with the queries of each request counted"""
+
+    def __init__(self):
+        self.client = Client(raise_request_exception=False)
+
+    def request(self, method, path, data=None, token=None):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            if method == 'GET':
+                response = self.client.get(path, data, headers=headers)
+            else:
+                response = self.client.post(path, data or {}, headers=headers)
+            seconds = time.perf_counter() - started
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        return response.status_code, body, seconds, len(queries)
+
+    def close(self):
+        # كل مستخدم افتراضي يعمل في خيط باتصال قاعدة بيانات خاص به
+        connection.close()
+
+
+class HTTPTransport:
+    """
+    Requests over HTTP to a running server. Queries per request are read
+    from the Server-Timing header when the server sends it
+    (SUBMISSIONS_SERVER_TIMING).
+    """
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def request(self, method, path, data=None, token=None):
+        url, body, headers = self.base_url + path, None, {}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        if method == 'GET':
+            if data:
+                url += '?' + urllib.parse.urlencode(data)
+        else:
+            body = encode_multipart(BOUNDARY, data or {})
+            headers['Content-Type'] = MULTIPART_CONTENT
+        request = urllib.request.Request(url, data=body, headers=headers, method=method)
+
+        started = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                status, content, timing = response.status, response.read(), response.headers.get('Server-Timing')
+        except urllib.error.HTTPError as error:
+            status, content, timing = error.code, error.read(), error.headers.get('Server-Timing')
+        except (OSError, http.client.HTTPException) as error:
+            # مهلة أو اتصال مرفوض/مقطوع: تُسجَّل كخطأ ولا توقف التشغيل
+            return None, f'{type(error).__name__}: {error}', time.perf_counter() - started, None
+        seconds = time.perf_counter() - started
+        try:
+            payload = json.loads(content)
+        except ValueError:
+            payload = None
+        match = SERVER_TIMING_QUERIES.search(timing or '')
+        return status, payload, seconds, int(match.group(1)) if match else None
+
+    def close(self):
+        pass
+
+
+# Scenario
+
+class Scenario:
+    """The mobile client flow for one virtual user (one phone number)"""
+
+    def __init__(self, transport, phone_number, photo, invoice, record):
+        self.transport = transport
+        self.phone_number = phone_number
+        self.photo = photo
+        self.invoice = invoice
+        self.record = record
+
+    def call(self, name, method, data=None, token=None, **kwargs):
+        status, body, seconds, queries = self.transport.request(
+            method, reverse(f'submissions:{name}', kwargs=kwargs or None), data, token,
+        )
+        self.record(Sample(f'{method} {name}', status, seconds, queries))
+        if status is None:
+            raise ScenarioError(f'{method} {name}: {body}')
+        if status >= 400:
+            raise ScenarioError(f'{method} {name}: HTTP {status} {body}')
+        return body
+
+    def run(self):
+        otp = self.call('send_otp', 'POST', {'phone_number': self.phone_number})
+        tokens = self.call('verify_otp', 'POST', {
+            'phone_number': self.phone_number, 'otp_code': otp['otp_code'],
+        })['tokens']
+        access = tokens['access']
+
+        categories = self.call('category_list', 'GET')
+        if isinstance(categories, dict):
+            categories = categories['results']
+        if not categories:
+            raise ScenarioError('No categories, run add_categories first')
+
+        self.call('submission_list', 'POST', {
+            'category_id': random.choice(categories)['category_id'],
+            'image_url': SimpleUploadedFile('meter.jpg', self.photo, content_type='image/jpeg'),
+            'invoice_image': SimpleUploadedFile('invoice.jpg', self.invoice, content_type='image/jpeg'),
+            'latitude': f'{33.5138 + random.uniform(-0.05, 0.05):.8f}',
+            'longitude': f'{36.2765 + random.uniform(-0.05, 0.05):.8f}',
+            'counter_number': str(random.randrange(10 ** 6)),
+            'notes': 'اختبار حمل',
+        }, token=access)
+
+        # الطلب الجديد في أول صفحة القائمة
+        latest = self.call('submission_list', 'GET', token=access)['results'][0]
+        self.call('submission_detail', 'GET', token=access, pk=latest['submission_id'])
+        self.call('refresh_token', 'POST', {'refresh': tokens['refresh']})
+
+
+def run_load(transport_factory, users, iterations, phone_prefix='+96398', log=None):
+    """
+    Run `iterations` scenarios for each of `users` concurrent virtual users.
+    Returns (samples, completed scenarios, failed scenarios, wall seconds).
+    """
+    samples = []
+    outcomes = defaultdict(int)
+    lock = threading.Lock()
+    invoice = make_photo(-1, size=(1240, 1754))
+
+    def virtual_user(index):
+        transport = transport_factory()
+        # صورة مختلفة لكل مستخدم، وإلا اعتُبرت كل الطلبات مكررة
+        scenario = Scenario(transport, f'{phone_prefix}{index:07d}', make_photo(index), invoice, samples.append)
+        try:
+            for _ in range(iterations):
+                try:
+                    scenario.run()
+                    outcome = 'completed'
+                except ScenarioError as error:
+                    outcome = 'failed'
+                    if log:
+                        log(f'User {index}: {error}')
+                with lock:
+                    outcomes[outcome] += 1
+        finally:
+            transport.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users, thread_name_prefix='virtual-user') as pool:
+        # list() لإظهار استثناءات الخيوط
+        list(pool.map(virtual_user, range(users)))
+    return samples, outcomes['completed'], outcomes['failed'], time.perf_counter() - started
+
+
+# Reports
+
+def percentile(values, percent):
+    """Nearest-rank percentile of sorted `values`"""
+    if not values:
+        return None
+    rank = max(1, -(-len(values) * percent // 100))
+    return values[int(rank) - 1]
+
+
+def build_report(samples, completed, failed, seconds, **config):
+    """Per-endpoint statistics of a run, JSON-serializable"""
+    by_endpoint = defaultdict(list)
+    for sample in samples:
+        by_endpoint[sample.endpoint].append(sample)
+
+    endpoints = {}
+    for endpoint, items in sorted(by_endpoint.items()):
+        latencies = sorted(sample.seconds * 1000 for sample in items)
+        queries = [sample.queries for sample in items if sample.queries is not None]
+        endpoints[endpoint] = {
+            'requests': len(items),
+            'errors': sum(sample.status is None or sample.status >= 400 for sample in items),
+            'throughput_rps': round(len(items) / seconds, 2) if seconds else None,
+            'mean_ms': round(sum(latencies) / len(latencies), 2),
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'max_ms': round(latencies[-1], 2),
+            'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+        }
+    return {
+        'config': config,
+        'duration_s': round(seconds, 3),
+        'scenarios': {
+            'completed': completed,
+            'failed': failed,
+            'per_second': round(completed / seconds, 2) if seconds else None,
+        },
+        'endpoints': endpoints,
+    }
+
+
+def compare_reports(baseline, report, threshold=10):
+    """
+    [(endpoint, metric, before, after, change %, regressed)] for the
+    endpoints of both runs. A metric regresses when it gets worse by more
+    than `threshold` percent, queries per request when they grow by half a
+    query or more (the average hides cache hits).
+    """
+    rows = []
+    for endpoint, after in report['endpoints'].items():
+        before = baseline['endpoints'].get(endpoint)
+        if before is None:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS:
+            old, new = before.get(metric), after.get(metric)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old * 100 if old else 0.0
+            if metric == 'queries_per_request':
+                regressed = new - old >= 0.5
+            else:
+                regressed = (-change if higher_is_better else change) > threshold
+            rows.append((endpoint, metric, old, new, change, regressed))
+    return rows
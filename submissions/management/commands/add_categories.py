@@ -3,6 +3,7 @@ Management command to add categories to the database
 Usage: python manage.py add_categories
 """
 from django.core.management.base import BaseCommand
+from submissions.caching import category_cache
 from submissions.models import Category
 
 
@@ -93,6 +94,9 @@ class Command(BaseCommand):
                         )
                     )
 
+        # إبطال الـ cache في جميع العمليات
+        category_cache.invalidate()
+
         self.stdout.write(
             self.style.SUCCESS(
                 f'\n✓ Successfully processed categories: {created_count} created, {updated_count} updated'
@@ -0,0 +1,77 @@
+"""
+Management command to measure authenticated request throughput with and without the user cache
+Usage: python manage.py benchmark_auth [--requests 2000] [--rows 50]
+
+Requests go through django.test.Client in this process (user_profile and
+the first page of the submission list). Rows are inserted inside a
+transaction that is rolled back at the end, so the database is left
+unchanged.
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from submissions.caching import user_cache
+from submissions.models import Category, Submission, User
+
+MODES = {
+    'no cache': {'SUBMISSIONS_USER_CACHE_SIZE': 0, 'SUBMISSIONS_USER_CACHE_SHARED': False},
+    'local LRU': {'SUBMISSIONS_USER_CACHE_SIZE': 10000, 'SUBMISSIONS_USER_CACHE_SHARED': False},
+    'shared only': {'SUBMISSIONS_USER_CACHE_SIZE': 0, 'SUBMISSIONS_USER_CACHE_SHARED': True},
+}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark requests/sec of authenticated endpoints with and without the user cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per endpoint and mode')
+        parser.add_argument('--rows', type=int, default=50, help='Submissions owned by the benchmark user')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"endpoint":<18} {"mode":<12} {"req/s":>9} {"queries":>8}')
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']), transaction.atomic():
+            user = self.create_rows(options['rows'])
+            client = Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+            for endpoint in ('user_profile', 'submission_list'):
+                url = reverse(f'submissions:{endpoint}')
+                for mode, overrides in MODES.items():
+                    with override_settings(**overrides):
+                        rate, queries = self.measure(client, url, options['requests'])
+                    self.stdout.write(f'{endpoint:<18} {mode:<12} {rate:>9.0f} {queries:>8.1f}')
+            transaction.set_rollback(True)
+        # لا تبقى في الكاش نسخة من المستخدم المحذوف بالتراجع
+        user_cache.invalidate()
+
+    def create_rows(self, rows):
+        user = User.objects.create(phone_number='+000benchmark')
+        category = Category.objects.create(name_ar='قياس', name_en='Benchmark')
+        now = timezone.now()
+        Submission.objects.bulk_create([
+            Submission(
+                user=user, category=category, image_url=f'submissions/benchmark_{i}.jpg',
+                latitude='33.51380000', longitude='36.27650000', created_at=now - timezone.timedelta(seconds=i),
+            )
+            for i in range(rows)
+        ])
+        return user
+
+    def measure(self, client, url, requests):
+        """(requests per second, queries per request) after one warm-up request"""
+        user_cache.invalidate()
+        client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for _ in range(requests):
+                response = client.get(url)
+            elapsed = time.perf_counter() - started
+        if response.status_code != 200:
+            raise CommandError(f'{url} answered HTTP {response.status_code}')
+        return requests / elapsed, len(queries) / requests
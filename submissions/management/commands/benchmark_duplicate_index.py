@@ -0,0 +1,102 @@
+"""
+Management command to measure near-duplicate lookup latency
+Usage: python manage.py benchmark_duplicate_index [--hashes 1000000] [--lookups 500] [--max-distance 8]
+
+Random hashes are inserted inside a transaction that is rolled back at
+the end, so the database is left unchanged. Half of the lookups are
+existing hashes with up to --max-distance bits flipped (must be found),
+the other half random hashes (usually no match).
+"""
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from submissions.models import User, Category, Submission
+from submissions.phash import HASH_BITS, find_near_duplicate, hamming, hash_fields, to_unsigned
+
+
+class Command(BaseCommand):
+    help = 'Benchmark near-duplicate image lookups against a large hash index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hashes', type=int, default=1_000_000, help='Number of indexed hashes')
+        parser.add_argument('--lookups', type=int, default=500, help='Number of timed lookups')
+        parser.add_argument('--max-distance', type=int, default=8)
+        parser.add_argument('--linear', type=int, default=5, help='Full scans timed for comparison')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        max_distance = options['max_distance']
+
+        with transaction.atomic():
+            start = time.perf_counter()
+            hashes = self.create_rows(rng, options['hashes'])
+            self.stdout.write(f'Inserted {len(hashes)} hashes in {time.perf_counter() - start:.1f}s')
+
+            near, far, misses = [], [], 0
+            for i in range(options['lookups']):
+                if i % 2 == 0:
+                    query = self.flip_bits(rng, rng.choice(hashes), rng.randint(0, max_distance))
+                    elapsed, match = self.timed(find_near_duplicate, query, max_distance)
+                    near.append(elapsed)
+                    misses += match is None
+                else:
+                    elapsed, _ = self.timed(find_near_duplicate, rng.getrandbits(HASH_BITS), max_distance)
+                    far.append(elapsed)
+
+            linear = []
+            for _ in range(options['linear']):
+                query = rng.getrandbits(HASH_BITS)
+                elapsed, _ = self.timed(self.linear_scan, query, max_distance)
+                linear.append(elapsed)
+            transaction.set_rollback(True)
+
+        self.stdout.write(f'{"lookup":>22} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9}')
+        for label, timings in [('near-duplicate', near), ('random', far), ('linear scan', linear)]:
+            if timings:
+                self.stdout.write(f'{label:>22} ' + ' '.join(f'{value:>9.2f}' for value in self.percentiles(timings)))
+        if misses:
+            self.stdout.write(self.style.ERROR(f'✗ {misses} near-duplicates were not found'))
+
+    def create_rows(self, rng, count):
+        user = User.objects.create(phone_number='+000benchmark')
+        category = Category.objects.create(name_ar='قياس', name_en='Benchmark')
+        now = timezone.now()
+        hashes = []
+        for offset in range(0, count, 10000):
+            batch = [rng.getrandbits(HASH_BITS) for _ in range(min(10000, count - offset))]
+            Submission.objects.bulk_create([
+                Submission(
+                    user=user, category=category, image_url='submissions/benchmark.jpg',
+                    latitude='33.51380000', longitude='36.27650000', created_at=now,
+                    **hash_fields(value),
+                )
+                for value in batch
+            ], batch_size=2000)
+            hashes.extend(batch)
+        return hashes
+
+    def linear_scan(self, query, max_distance):
+        """Reference: compare against every stored hash"""
+        for candidate in Submission.objects.values_list('image_phash', flat=True).iterator(chunk_size=10000):
+            if candidate is not None and hamming(query, to_unsigned(candidate)) <= max_distance:
+                return candidate
+        return None
+
+    def flip_bits(self, rng, value, bits):
+        for bit in rng.sample(range(HASH_BITS), bits):
+            value ^= 1 << bit
+        return value
+
+    def timed(self, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        return (time.perf_counter() - start) * 1000, result
+
+    def percentiles(self, timings):
+        timings = sorted(timings)
+        return [timings[min(len(timings) - 1, int(len(timings) * q))] for q in (0.5, 0.95, 0.99)]
@@ -0,0 +1,87 @@
+"""
+Management command to compare SubmissionSerializer with the fast read path
+Usage: python manage.py benchmark_serializers [--rows 100 1000 10000] [--repeat 5]
+
+Rows are inserted inside a transaction that is rolled back at the end,
+so the database is left unchanged.
+"""
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from submissions.fastpath import FastJSONRenderer, SUBMISSION_VALUE_FIELDS, serialize_submission_rows, orjson
+from submissions.models import User, Category, Submission
+from submissions.serializers import SubmissionSerializer
+
+
+class Command(BaseCommand):
+    help = 'Benchmark SubmissionSerializer against the fast read path'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            nargs='+',
+            default=[100, 1000, 10000],
+            help='List sizes to benchmark',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Number of timed runs per size (the median is reported)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'JSON encoder: {"orjson" if orjson else "json (stdlib)"}')
+        self.stdout.write(f'{"rows":>8} {"serializer ms":>15} {"fast path ms":>14} {"speedup":>9}')
+
+        for rows in options['rows']:
+            with transaction.atomic():
+                queryset = self.create_rows(rows)
+                serializer_ms, expected = self.measure(options['repeat'], lambda: JSONRenderer().render(
+                    SubmissionSerializer(queryset.select_related('user', 'category'), many=True).data
+                ))
+                fast_ms, output = self.measure(options['repeat'], lambda: FastJSONRenderer().render(
+                    serialize_submission_rows(queryset.values(*SUBMISSION_VALUE_FIELDS))
+                ))
+                transaction.set_rollback(True)
+
+            if output != expected:
+                self.stdout.write(self.style.ERROR(f'✗ Output differs at {rows} rows'))
+            self.stdout.write(
+                f'{rows:>8} {serializer_ms:>15.1f} {fast_ms:>14.1f} {serializer_ms / fast_ms:>8.1f}x'
+            )
+
+    def create_rows(self, rows):
+        user = User.objects.create(phone_number='+000benchmark')
+        category = Category.objects.create(name_ar='قياس', name_en='Benchmark')
+        now = timezone.now()
+        Submission.objects.bulk_create([
+            Submission(
+                user=user,
+                category=category,
+                image_url=f'submissions/benchmark_{i}.jpg',
+                invoice_image=f'invoices/benchmark_{i}.jpg' if i % 2 else None,
+                notes='ملاحظة للقياس',
+                latitude='33.51380000',
+                longitude='36.27650000',
+                counter_number=str(100000 + i),
+                created_at=now - timezone.timedelta(seconds=i),
+            )
+            for i in range(rows)
+        ], batch_size=1000)
+        return Submission.objects.filter(user=user).order_by('-created_at', '-submission_id')
+
+    def measure(self, repeat, func):
+        timings = []
+        result = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings), result
@@ -0,0 +1,429 @@
+"""
+Management command to fill the database with a realistic synthetic dataset for performance testing
+Usage: python manage.py generate_synthetic_data [--users N] [--submissions M] [--seed S] [--days D]
+
+Distributions:
+    users        a few heavy submitters and a long tail (user index ~ N * U^USER_SKEW)
+    categories   Zipf-like mix over the existing categories (add_categories runs if there are none)
+    locations    Gaussian clusters around Syrian cities, weighted by population
+    timestamps   growing volume over --days, daytime peaks in TIME_ZONE
+    images       a pool of generated JPEGs at common phone camera resolutions,
+                 stored content-addressed and shared by many rows; every row gets
+                 a random perceptual hash, as distinct photos would
+
+Rows are generated from --seed, so two runs produce the same dataset,
+and written with executemany() in --batch-size chunks, bypassing model
+instances and signals. Days are generated oldest first, so primary keys
+follow created_at, and the map tiles and daily rollups of each day are
+added as it is generated instead of rescanning the table afterwards.
+The Submission indexes are dropped during the load and built once at
+the end (--keep-indexes to disable; --restore-indexes after a crash).
+"""
+import hashlib
+import io
+import random
+import time
+from bisect import bisect
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from itertools import accumulate
+from operator import itemgetter
+
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image
+
+from submissions.aggregates import get_tile_zooms, increment_rows, point_tiles
+from submissions.caching import category_cache
+from submissions.geo import GEO_CELL_SIZE, GEO_COLUMNS
+from submissions.models import (
+    Category, DailySubmissionStats, DailyUserActivity, OtpCode, Submission, SubmissionTile, User,
+)
+from submissions.phash import hash_segments, to_signed
+from submissions.storage import ContentAddressedStorage, submission_media_storage
+
+PHONE_PREFIX = '+96399'
+
+# (latitude, longitude, weight, spread in degrees)
+CITIES = [
+    (33.5138, 36.2765, 26, 0.08),  # دمشق
+    (36.2021, 37.1343, 22, 0.07),  # حلب
+    (34.7324, 36.7137, 9, 0.05),   # حمص
+    (35.1318, 36.7578, 8, 0.05),   # حماة
+    (35.5317, 35.7901, 7, 0.04),   # اللاذقية
+    (35.3360, 40.1408, 5, 0.04),   # دير الزور
+    (35.9528, 39.0079, 4, 0.04),   # الرقة
+    (34.8890, 35.8866, 4, 0.03),   # طرطوس
+    (35.9306, 36.6339, 4, 0.03),   # إدلب
+    (32.6189, 36.1021, 4, 0.03),   # درعا
+    (37.0522, 41.2316, 4, 0.03),   # القامشلي
+    (32.7090, 36.5695, 3, 0.03),   # السويداء
+]
+# Share of submissions spread uniformly over the country instead of a city
+RURAL_SHARE = 0.08
+COUNTRY_BOUNDS = (32.4, 35.8, 37.2, 42.3)
+
+# Relative submission volume per local hour of the day
+HOURLY_WEIGHTS = [1, 1, 1, 1, 1, 2, 4, 7, 10, 12, 12, 11, 10, 10, 11, 11, 10, 9, 8, 7, 6, 4, 3, 2]
+USER_SKEW = 2.5
+INVOICE_SHARE = 0.4
+NOTES_SHARE = 0.15
+NOTES = ['العداد متوقف', 'قراءة تقديرية', 'الفاتورة مرتفعة', 'تسرب', 'انقطاع متكرر', 'meter replaced']
+
+# Tile counts kept in memory before they are added to SubmissionTile
+TILE_BUFFER = 500000
+
+# (width, height, weight) of the generated photos
+IMAGE_SIZES = [(1280, 960, 2), (1600, 1200, 3), (2048, 1536, 3), (3264, 2448, 2), (4032, 3024, 1)]
+INVOICE_SIZE = (1240, 1754)
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic users, OTP codes and submissions for performance testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--submissions', type=int, default=100000)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--days', type=int, default=365, help='Submissions span the last D days')
+        parser.add_argument('--images', type=int, default=20, help='Distinct image files shared by the rows')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--skip-aggregates',
+            action='store_true',
+            help='Leave map tiles and daily rollups untouched (run rebuild_aggregates later)',
+        )
+        parser.add_argument(
+            '--keep-indexes',
+            action='store_true',
+            help='Insert with the Submission indexes in place instead of rebuilding them after the load',
+        )
+        parser.add_argument(
+            '--restore-indexes',
+            action='store_true',
+            help='Only recreate Submission indexes left missing by an interrupted run',
+        )
+
+    def handle(self, *args, **options):
+        if options['restore_indexes']:
+            self.restore_indexes()
+            return
+        if options['users'] <= 0 or options['users'] >= 10 ** 7:
+            raise CommandError('--users must be between 1 and 9999999')
+        for option in ('submissions', 'days', 'images', 'batch_size'):
+            if options[option] < 1:
+                raise CommandError(f'--{option.replace("_", "-")} must be at least 1')
+        if User.objects.filter(phone_number__startswith=PHONE_PREFIX).exists():
+            raise CommandError(f'Synthetic users ({PHONE_PREFIX}...) already exist, use a fresh database')
+
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now().replace(microsecond=0)
+        started = time.monotonic()
+
+        user_ids = self.generate_users(options['users'], options['days'])
+        categories = self.category_weights()
+        images, invoices = self.generate_images(options['images'])
+        count = self.generate_submissions(
+            options['submissions'], options['days'], user_ids, categories, images, invoices,
+            defer_indexes=not options['keep_indexes'], aggregates=not options['skip_aggregates'],
+        )
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Generated {len(user_ids)} users and {count} submissions in {elapsed:.0f}s'
+        ))
+
+    # Helpers
+
+    def insert(self, model, fields, rows):
+        """executemany() an INSERT of `rows` (tuples in `fields` order)"""
+        quote = connection.ops.quote_name
+        columns = [model._meta.get_field(field).column for field in fields]
+        sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            quote(model._meta.db_table),
+            ', '.join(quote(column) for column in columns),
+            ', '.join(['%s'] * len(columns)),
+        )
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(sql, rows)
+
+    @staticmethod
+    def db_datetime(timestamp):
+        """UTC epoch seconds -> naive UTC string, accepted by every backend with USE_TZ"""
+        return datetime.fromtimestamp(timestamp, dt_timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+    # Users and OTP codes
+
+    def generate_users(self, count, days):
+        rng = self.rng
+        start = self.now.timestamp() - days * 86400
+        # أرقام متتالية بترتيب عشوائي ثابت
+        numbers = list(range(count))
+        rng.shuffle(numbers)
+        users, otps = [], []
+        for number in numbers:
+            phone_number = f'{PHONE_PREFIX}{number:07d}'
+            joined = start - rng.random() * 180 * 86400
+            users.append((phone_number, self.db_datetime(joined)))
+            code = f'{rng.randrange(10 ** 6):06d}'
+            # معظم الأكواد منتهية الصلاحية
+            expires = self.now.timestamp() + rng.uniform(-days * 86400, 300)
+            otps.append((phone_number, hashlib.sha256(code.encode()).hexdigest(), self.db_datetime(expires), 0))
+
+        for offset in range(0, count, self.batch_size):
+            self.insert(User, ['phone_number', 'created_at'], users[offset:offset + self.batch_size])
+            self.insert(OtpCode, ['phone_number', 'hashed_code', 'expires_at', 'attempts'], otps[offset:offset + self.batch_size])
+        self.stdout.write(f'... {count} users and OTP codes')
+
+        by_phone = dict(User.objects.filter(phone_number__startswith=PHONE_PREFIX).values_list('phone_number', 'user_id'))
+        # ترتيب الإدخال: المستخدمون الأوائل هم الأكثر نشاطاً
+        return [by_phone[phone_number] for phone_number, _ in users]
+
+    def category_weights(self):
+        category_ids = list(Category.objects.order_by('category_id').values_list('category_id', flat=True))
+        if not category_ids:
+            call_command('add_categories', stdout=self.stdout)
+            category_cache.invalidate()
+            category_ids = list(Category.objects.order_by('category_id').values_list('category_id', flat=True))
+        self.rng.shuffle(category_ids)
+        weights = [1 / (rank + 1) ** 1.1 for rank in range(len(category_ids))]
+        return category_ids, list(accumulate(weights))
+
+    def generate_images(self, count):
+        """Store `count` photos and count // 2 invoices, return their names"""
+        rng = self.rng
+        storage = submission_media_storage()
+        size_weights = list(accumulate(weight for _, _, weight in IMAGE_SIZES))
+
+        def photo(size):
+            # نمط كتل عشوائي مع ضجيج، ليكون حجم JPEG قريباً من صور الهواتف
+            pattern = Image.new('L', (16, 12))
+            pattern.putdata([rng.randrange(256) for _ in range(16 * 12)])
+            base = pattern.resize(size, Image.Resampling.BILINEAR).convert('RGB')
+            noise = Image.effect_noise((size[0] // 2, size[1] // 2), 24).resize(size).convert('RGB')
+            image = Image.blend(base, noise, 0.25)
+            buffer = io.BytesIO()
+            image.save(buffer, format='JPEG', quality=85)
+            return ContentFile(buffer.getvalue())
+
+        images = []
+        for index in range(count):
+            width, height, _ = IMAGE_SIZES[bisect(size_weights, rng.random() * size_weights[-1])]
+            images.append(storage.save(f'submissions/synthetic_{index}.jpg', photo((width, height))))
+        invoices = [
+            storage.save(f'invoices/synthetic_{index}.jpg', photo(INVOICE_SIZE))
+            for index in range(max(1, count // 2))
+        ]
+        self.stdout.write(f'... {len(images)} photos and {len(invoices)} invoices')
+        return images, invoices
+
+    # Submissions
+
+    SUBMISSION_FIELDS = [
+        'user_id', 'category_id', 'image_url', 'notes', 'latitude', 'longitude',
+        'counter_number', 'consumption_number', 'invoice_image',
+        'image_thumbnail', 'image_web', 'invoice_thumbnail', 'invoice_web', 'geo_cell',
+        'image_phash', 'phash_segment_0', 'phash_segment_1', 'phash_segment_2', 'phash_segment_3',
+        'duplicate_of_id', 'duplicate_distance', 'created_at', 'updated_at',
+    ]
+
+    def generate_submissions(self, count, days, user_ids, categories, images, invoices, defer_indexes, aggregates):
+        columns = {field.attname for field in Submission._meta.concrete_fields if not field.primary_key}
+        if columns != set(self.SUBMISSION_FIELDS):
+            raise CommandError(f'Submission columns changed, update the generator: {columns ^ set(self.SUBMISSION_FIELDS)}')
+
+        self.references = Counter()
+        self.tiles = {}
+        if defer_indexes:
+            # بناء الفهارس مرة واحدة بعد التحميل أسرع بكثير من تحديثها مع كل دفعة
+            self.drop_indexes()
+        try:
+            written = 0
+            started = time.monotonic()
+            batch = []
+            # يوماً بيوم من الأقدم، فترتيب submission_id يتبع created_at كما في الإنتاج
+            for day, rows in self.daily_rows(count, days, user_ids, categories, images, invoices):
+                if aggregates:
+                    self.add_aggregates(day, rows)
+                batch.extend(rows)
+                while len(batch) >= self.batch_size or (batch and written + len(batch) == count):
+                    chunk, batch = batch[:self.batch_size], batch[self.batch_size:]
+                    self.insert(Submission, self.SUBMISSION_FIELDS, chunk)
+                    written += len(chunk)
+                    elapsed = time.monotonic() - started
+                    self.stdout.write(f'... {written} submissions ({written / elapsed if elapsed else 0:.0f} rows/s)')
+        finally:
+            if defer_indexes:
+                self.restore_indexes()
+
+        if aggregates:
+            self.flush_tiles()
+        self.retain_images(self.references)
+        return written
+
+    def daily_counts(self, count, days):
+        """Submissions per day (oldest first), growing linearly over the period and summing to `count`"""
+        weights = [day + 0.5 for day in range(days)]
+        total = sum(weights)
+        expected = [count * weight / total for weight in weights]
+        counts = [int(value) for value in expected]
+        # توزيع الباقي على الأيام ذات الكسور الأكبر
+        for day in sorted(range(days), key=lambda day: counts[day] - expected[day])[:count - sum(counts)]:
+            counts[day] += 1
+        return counts
+
+    def daily_rows(self, count, days, user_ids, categories, images, invoices):
+        """
+        Yield (local date, rows) per day, oldest first, rows sorted by
+        created_at in SUBMISSION_FIELDS order (kept tight: ~10M rows).
+        """
+        rng = self.rng
+        random_value, gauss = rng.random, rng.gauss
+        category_ids, category_cumulative = categories
+        category_total = category_cumulative[-1]
+        city_cumulative = list(accumulate(weight for _, _, weight, _ in CITIES))
+        hour_cumulative = list(accumulate(HOURLY_WEIGHTS))
+        cell_units = int(GEO_CELL_SIZE * 10 ** 6)
+        min_lat, min_lng, max_lat, max_lng = COUNTRY_BOUNDS
+        users, image_count, invoice_count = len(user_ids), len(images), len(invoices)
+        references = self.references
+
+        tz = timezone.get_default_timezone()
+        today = timezone.localdate(self.now, tz)
+        latest = int(self.now.timestamp())
+        # 'YYYY-MM-DD HH:' لكل ساعة UTC، تُحسب مرة واحدة
+        hour_prefixes = {}
+        by_created_at = itemgetter(self.SUBMISSION_FIELDS.index('created_at'))
+
+        for age, day_count in zip(range(days - 1, -1, -1), self.daily_counts(count, days)):
+            day = today - timedelta(days=age)
+            midnight = int(datetime.combine(day, datetime.min.time(), tz).timestamp())
+            day_end = min(int(datetime.combine(day + timedelta(days=1), datetime.min.time(), tz).timestamp()), latest + 1)
+            rows = []
+            for _ in range(day_count):
+                user_index = int(users * random_value() ** USER_SKEW)
+                category_id = category_ids[bisect(category_cumulative, random_value() * category_total)]
+
+                if random_value() < RURAL_SHARE:
+                    latitude = min_lat + (max_lat - min_lat) * random_value()
+                    longitude = min_lng + (max_lng - min_lng) * random_value()
+                else:
+                    lat, lng, _, spread = CITIES[bisect(city_cumulative, random_value() * city_cumulative[-1])]
+                    latitude, longitude = gauss(lat, spread), gauss(lng, spread)
+                # ميكرو درجات، لحساب الخلية الجغرافية دون Decimal
+                lat_units, lng_units = round(latitude * 1000000), round(longitude * 1000000)
+                cell = ((lat_units + 90000000) // cell_units) * GEO_COLUMNS + (lng_units + 180000000) // cell_units
+
+                hour = bisect(hour_cumulative, random_value() * hour_cumulative[-1])
+                created = min(midnight + hour * 3600 + int(random_value() * 3600), day_end - 1)
+                prefix = hour_prefixes.get(created // 3600)
+                if prefix is None:
+                    prefix = hour_prefixes[created // 3600] = self.db_datetime(created)[:14]
+                created_at = f'{prefix}{created % 3600 // 60:02d}:{created % 60:02d}'
+
+                image = images[int(random_value() * image_count)]
+                references[image] += 1
+                invoice = ''
+                if random_value() < INVOICE_SHARE:
+                    invoice = invoices[int(random_value() * invoice_count)]
+                    references[invoice] += 1
+
+                phash = rng.getrandbits(64)
+                rows.append((
+                    user_ids[user_index], category_id, image,
+                    NOTES[int(random_value() * len(NOTES))] if random_value() < NOTES_SHARE else None,
+                    f'{lat_units / 1000000:.6f}', f'{lng_units / 1000000:.6f}',
+                    str(1000000 + user_index), str(int(random_value() * 1000000)),
+                    invoice, '', '', '', '', cell,
+                    to_signed(phash), *hash_segments(phash),
+                    None, None, created_at, created_at,
+                ))
+            rows.sort(key=by_created_at)
+            yield day, rows
+
+    # Aggregates (the same rows rebuild_aggregates would produce)
+
+    def add_aggregates(self, day, rows):
+        """Add a day of rows to the tile buffer and write that day's rollups"""
+        zooms = get_tile_zooms()
+        tiles = self.tiles
+        activity = Counter()
+        # (user_id, category_id, ..., latitude, longitude) حسب SUBMISSION_FIELDS
+        for user_id, category_id, _, _, latitude, longitude, *_ in rows:
+            latitude, longitude = float(latitude), float(longitude)
+            activity[(category_id, user_id)] += 1
+            for tile in point_tiles(latitude, longitude, zooms):
+                totals = tiles.get((*tile, category_id))
+                if totals is None:
+                    tiles[(*tile, category_id)] = [1, latitude, longitude]
+                else:
+                    totals[0] += 1
+                    totals[1] += latitude
+                    totals[2] += longitude
+
+        # المستخدمون جدد، فلا توجد صفوف نشاط سابقة لهم
+        self.insert(
+            DailyUserActivity, ['day', 'category_id', 'user_id', 'submissions'],
+            [(day.isoformat(), category_id, user_id, submissions) for (category_id, user_id), submissions in activity.items()],
+        )
+        stats = defaultdict(lambda: {'submissions': 0, 'users': 0})
+        for (category_id, _), submissions in activity.items():
+            stats[(day, category_id)]['submissions'] += submissions
+            stats[(day, category_id)]['users'] += 1
+        increment_rows(DailySubmissionStats, ('day', 'category_id'), stats)
+
+        if len(tiles) >= TILE_BUFFER:
+            self.flush_tiles()
+
+    def flush_tiles(self):
+        """
+        Add the buffered tile counts to SubmissionTile: new tiles with one
+        executemany() INSERT, tiles that already have rows with one
+        executemany() UPDATE by primary key.
+        """
+        existing = {
+            (zoom, x, y, category_id): pk
+            for pk, zoom, x, y, category_id in SubmissionTile.objects.values_list('pk', 'zoom', 'x', 'y', 'category_id')
+        }
+        fields = ['count', 'latitude_sum', 'longitude_sum']
+        self.insert(
+            SubmissionTile, ['zoom', 'x', 'y', 'category_id', *fields],
+            [(*key, *totals) for key, totals in self.tiles.items() if key not in existing],
+        )
+        quote = connection.ops.quote_name
+        sql = 'UPDATE {} SET {} WHERE {} = %s'.format(
+            quote(SubmissionTile._meta.db_table),
+            ', '.join(f'{quote(field)} = {quote(field)} + %s' for field in fields),
+            quote(SubmissionTile._meta.pk.column),
+        )
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(sql, [
+                (*totals, existing[key]) for key, totals in self.tiles.items() if key in existing
+            ])
+        self.tiles = {}
+
+    def drop_indexes(self):
+        with connection.schema_editor() as editor:
+            for index in Submission._meta.indexes:
+                editor.remove_index(Submission, index)
+        self.stdout.write(f'... dropped {len(Submission._meta.indexes)} Submission indexes for the load')
+
+    def restore_indexes(self):
+        """Create the Submission Meta.indexes that are missing"""
+        with connection.cursor() as cursor:
+            existing = connection.introspection.get_constraints(cursor, Submission._meta.db_table)
+        missing = [index for index in Submission._meta.indexes if index.name not in existing]
+        started = time.monotonic()
+        with connection.schema_editor() as editor:
+            for index in missing:
+                editor.add_index(Submission, index)
+        self.stdout.write(f'... built {len(missing)} Submission indexes in {time.monotonic() - started:.0f}s')
+
+    def retain_images(self, references):
+        """Set the StoredBlob reference counts of the shared files in one pass"""
+        storage = submission_media_storage()
+        if isinstance(storage, ContentAddressedStorage):
+            storage.retain_many(references)
@@ -0,0 +1,306 @@
+"""
+Management command to bulk import submissions (legacy or partner data) with their images
+Usage: python manage.py import_submissions records.ndjson --images-dir DIR [--create-users] [--workers N]
+
+One JSON object per line:
+    {"phone_number": "+963...", "category": "مياه" or "Water", "image": "relative/path.jpg",
+     "invoice_image": "optional/path.jpg", "latitude": "33.51", "longitude": "36.27",
+     "notes": "...", "counter_number": "...", "consumption_number": "...", "created_at": "ISO-8601"}
+
+Records are read in batches. Images of a batch are validated, hashed and
+copied into media storage by a thread pool (each distinct content once
+per batch) while the main thread keeps the database work: users and
+categories are resolved through in-memory maps (one query per batch for
+unseen phone numbers) and valid rows are inserted with a single
+bulk_create. Invalid rows are reported (and optionally written to
+--errors) without stopping the import; a database error rejects the
+rows of its batch only.
+"""
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+from PIL import Image
+
+from submissions.aggregates import apply_changes, submission_point
+from submissions.caching import submission_versions
+from submissions.geo import assign_geo_cell
+from submissions.images import derivative_pipeline
+from submissions.models import Category, Submission, User
+from submissions.phash import compute_phash, hash_fields, insert_indexed_batch
+from submissions.serializers import OTPSendSerializer
+from submissions.storage import ContentAddressedStorage, retain_instance_files, submission_media_storage
+
+# حقول السجل المنسوخة كما هي (يتحقق منها Submission.clean_fields)
+VALUE_FIELDS = ('notes', 'latitude', 'longitude', 'counter_number', 'consumption_number', 'created_at')
+# حقل السجل -> حقل الصورة في Submission
+IMAGE_FIELDS = {'image': 'image_url', 'invoice_image': 'invoice_image'}
+
+
+class Command(BaseCommand):
+    help = 'Import submissions from an NDJSON file and a directory of images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='NDJSON file with one submission per line')
+        parser.add_argument('--images-dir', required=True, help='Directory the image paths are relative to')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=8, help='Threads copying and validating images')
+        parser.add_argument(
+            '--create-users',
+            action='store_true',
+            help='Create users for unknown phone numbers instead of rejecting the rows',
+        )
+        parser.add_argument('--errors', help='Write rejected rows (line number and errors) to this NDJSON file')
+
+    def handle(self, *args, **options):
+        if not os.path.isdir(options['images_dir']):
+            raise CommandError(f'{options["images_dir"]} is not a directory')
+        self.images_dir = os.path.realpath(options['images_dir'])
+        self.create_users = options['create_users']
+        self.categories = self.load_categories()
+        self.users = {}
+        self.imported = self.failed = 0
+        self.errors_file = open(options['errors'], 'w') if options['errors'] else None
+        started = time.monotonic()
+
+        try:
+            with open(options['path'], encoding='utf-8') as records, \
+                    ThreadPoolExecutor(max_workers=options['workers'], thread_name_prefix='import-images') as pool:
+                batch = []
+                for line_number, line in enumerate(records, start=1):
+                    if line.strip():
+                        batch.append((line_number, line))
+                    if len(batch) >= options['batch_size']:
+                        self.import_batch(batch, pool)
+                        self.report_progress(started)
+                        batch = []
+                if batch:
+                    self.import_batch(batch, pool)
+                    self.report_progress(started)
+        finally:
+            if self.errors_file:
+                self.errors_file.close()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Imported {self.imported} submissions, {self.failed} rejected '
+            f'({self.imported / elapsed if elapsed else 0:.0f} rows/s)'
+        ))
+
+    def report_progress(self, started):
+        elapsed = time.monotonic() - started
+        rate = (self.imported + self.failed) / elapsed if elapsed else 0
+        self.stdout.write(f'... {self.imported} imported, {self.failed} rejected ({rate:.0f} rows/s)')
+
+    def reject(self, line_number, errors):
+        self.failed += 1
+        self.stderr.write(f'Line {line_number}: {errors}')
+        if self.errors_file:
+            self.errors_file.write(json.dumps({'line': line_number, 'errors': errors}, ensure_ascii=False) + '\n')
+
+    # Lookups
+
+    def load_categories(self):
+        """{name: category_id} for both the Arabic and (case-insensitive) English names"""
+        categories = {}
+        for category_id, name_ar, name_en in Category.objects.values_list('category_id', 'name_ar', 'name_en'):
+            categories[name_ar] = category_id
+            categories[name_en.lower()] = category_id
+        return categories
+
+    def resolve_users(self, phone_numbers):
+        """Add the batch's unseen phone numbers to self.users, creating them if allowed"""
+        unseen = set(phone_numbers) - set(self.users)
+        if not unseen:
+            return
+        self.users.update(User.objects.filter(phone_number__in=unseen).values_list('phone_number', 'user_id'))
+        missing = [
+            phone_number for phone_number in unseen - set(self.users)
+            if OTPSendSerializer(data={'phone_number': phone_number}).is_valid()
+        ]
+        if self.create_users and missing:
+            User.objects.bulk_create([User(phone_number=phone_number) for phone_number in missing], ignore_conflicts=True)
+            self.users.update(User.objects.filter(phone_number__in=missing).values_list('phone_number', 'user_id'))
+
+    # Batches
+
+    def parse(self, line):
+        """Return (record, errors) for one NDJSON line"""
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            return None, {'record': f'Invalid JSON: {error}'}
+        if not isinstance(record, dict):
+            return None, {'record': 'Expected a JSON object'}
+
+        errors = {}
+        for field in ('phone_number', 'category', 'image'):
+            if not isinstance(record.get(field), str) or not record[field]:
+                errors[field] = 'Required'
+        return record, errors
+
+    def build(self, record):
+        """Return (unsaved Submission, errors) from a parsed record"""
+        errors = {}
+        user_id = self.users.get(record['phone_number'])
+        if user_id is None:
+            errors['phone_number'] = 'Unknown user' if not self.create_users else 'Invalid phone number'
+        category = record['category']
+        category_id = self.categories.get(category, self.categories.get(category.lower()))
+        if category_id is None:
+            errors['category'] = 'Unknown category'
+
+        instance = Submission(
+            user_id=user_id, category_id=category_id,
+            **{field: record.get(field) for field in VALUE_FIELDS},
+        )
+        if instance.created_at in (None, ''):
+            instance.created_at = timezone.now()
+        try:
+            instance.clean_fields(exclude=[
+                field.name for field in Submission._meta.fields if field.name not in VALUE_FIELDS
+            ])
+        except ValidationError as error:
+            errors.update({field: ' '.join(messages) for field, messages in error.message_dict.items()})
+        if not errors and timezone.is_naive(instance.created_at):
+            instance.created_at = timezone.make_aware(instance.created_at)
+        return instance, errors
+
+    def store_images(self, record):
+        """
+        Validate and hash the record's images (runs in the thread pool,
+        must not touch the database). Content-addressed images are only
+        named here and copied once per batch by copy_files(); other
+        storages get their copy right away.
+        Returns ({Submission field: stored name}, phash or None, errors,
+        {stored name: (upload name, source path)}).
+        """
+        names, errors, value, sources = {}, {}, None, {}
+        for record_field, model_field in IMAGE_FIELDS.items():
+            relative = record.get(record_field)
+            if not relative:
+                continue
+            path = os.path.realpath(os.path.join(self.images_dir, relative))
+            if os.path.commonpath([path, self.images_dir]) != self.images_dir:
+                errors[record_field] = 'Path outside the images directory'
+                continue
+            try:
+                with open(path, 'rb') as image_file:
+                    with Image.open(image_file) as image:
+                        image.verify()
+                    if model_field == 'image_url':
+                        value = compute_phash(image_file)
+                    image_file.seek(0)
+                    field = Submission._meta.get_field(model_field)
+                    name = field.generate_filename(None, os.path.basename(path))
+                    if isinstance(field.storage, ContentAddressedStorage):
+                        names[model_field] = field.storage.content_name(name, File(image_file, name=name))
+                        sources[names[model_field]] = (name, path)
+                    else:
+                        names[model_field] = field.storage.save(name, File(image_file, name=name))
+            except FileNotFoundError:
+                errors[record_field] = 'File not found'
+            except Exception as error:
+                errors[record_field] = f'Invalid image: {error}'
+        return names, value, errors, sources
+
+    def copy_file(self, stored_name, source):
+        """Copy one source file into content-addressed storage (thread pool); returns an error or None"""
+        name, path = source
+        try:
+            with open(path, 'rb') as image_file:
+                submission_media_storage().store(name, File(image_file, name=name))
+        except OSError as error:
+            return f'Could not store the image: {error}'
+        return None
+
+    def copy_files(self, sources, pool):
+        """
+        Copy the batch's images, each content once however many records
+        share it (legacy data repeats photos), then keep them from being
+        purged before the rows reference them. Returns {stored name: error}.
+        """
+        if not sources:
+            return {}
+        failed = {
+            stored_name: error
+            for stored_name, error in zip(sources, pool.map(self.copy_file, sources, sources.values()))
+            if error
+        }
+        stored = [stored_name for stored_name in sources if stored_name not in failed]
+        for stored_name in submission_media_storage().protect(stored):
+            # حذفها purge_unreferenced_media بعد نسخها: تُنسخ من جديد
+            error = self.copy_file(stored_name, sources[stored_name])
+            if error:
+                failed[stored_name] = error
+        return failed
+
+    def import_batch(self, batch, pool):
+        parsed = []
+        for line_number, line in batch:
+            record, errors = self.parse(line)
+            if errors:
+                self.reject(line_number, errors)
+            else:
+                parsed.append((line_number, record))
+
+        self.resolve_users(record['phone_number'] for _, record in parsed)
+        built = []
+        for line_number, record in parsed:
+            instance, errors = self.build(record)
+            if errors:
+                self.reject(line_number, errors)
+            else:
+                built.append((line_number, record, instance))
+
+        stored = list(pool.map(self.store_images, [record for _, record, _ in built]))
+        failed = self.copy_files({
+            stored_name: source for _, _, errors, sources in stored if not errors for stored_name, source in sources.items()
+        }, pool)
+        rows, hashes = [], []
+        for (line_number, _, instance), (names, value, errors, _) in zip(built, stored):
+            errors = errors or {
+                field: failed[name] for field, name in names.items() if name in failed
+            }
+            if errors:
+                # الملفات المنسوخة بلا مراجع تُحذف لاحقاً (purge_unreferenced_media)
+                self.reject(line_number, errors)
+                continue
+            for field, name in names.items():
+                setattr(instance, field, name)
+            if value is not None:
+                for field, field_value in hash_fields(value).items():
+                    setattr(instance, field, field_value)
+                hashes.append((instance, value))
+            # bulk_create لا يرسل pre_save
+            assign_geo_cell(instance)
+            rows.append((line_number, instance))
+
+        if not rows:
+            return
+        instances = [instance for _, instance in rows]
+        try:
+            with transaction.atomic():
+                # الصور المكررة داخل الدفعة نفسها تُدرج بعد أصلها لتُكتشف أيضاً
+                insert_indexed_batch(instances, hashes, Submission.objects.bulk_create)
+                retain_instance_files(instances)
+                apply_changes(added=[submission_point(instance) for instance in instances])
+                for instance in instances:
+                    derivative_pipeline.schedule(instance)
+        except DatabaseError as error:
+            # مثلاً فئة أو مستخدم حُذف أثناء الاستيراد: الدفعة كلها مرفوضة، والاستيراد يستمر
+            for line_number, _ in rows:
+                self.reject(line_number, {'database': str(error)})
+            self.categories = self.load_categories()
+            self.users = {}
+            return
+        # bulk_create لا يرسل post_save
+        for user_id in {instance.user_id for instance in instances}:
+            submission_versions.invalidate(user_id)
+        self.imported += len(instances)
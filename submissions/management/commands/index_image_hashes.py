@@ -0,0 +1,56 @@
+"""
+Management command to compute perceptual hashes for submissions created before hashing existed
+Usage: python manage.py index_image_hashes [--batch-size N]
+
+Only rows without a hash are processed, so an interrupted run can simply
+be started again. Rows are processed oldest first, so a re-submitted
+photo is flagged as a duplicate of the original and not the other way round.
+"""
+from django.core.management.base import BaseCommand
+
+from submissions.models import Submission
+from submissions.phash import compute_phash, find_near_duplicate, hash_fields
+
+
+class Command(BaseCommand):
+    help = 'Compute perceptual hashes for submissions without one'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        indexed = failed = 0
+        last_id = 0
+        while True:
+            batch = list(
+                Submission.objects.filter(submission_id__gt=last_id, image_phash__isnull=True)
+                .exclude(image_url='')
+                .order_by('submission_id')
+                .only('submission_id', 'image_url')[:options['batch_size']]
+            )
+            if not batch:
+                break
+
+            for submission in batch:
+                try:
+                    with submission.image_url.open('rb') as image:
+                        value = compute_phash(image)
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(f'Submission {submission.pk}: {error}')
+                    continue
+
+                match = find_near_duplicate(value, exclude_id=submission.pk)
+                duplicate_of, distance = match or (None, None)
+                # update() so the image reference counts and version markers are untouched
+                Submission.objects.filter(pk=submission.pk).update(
+                    duplicate_of=duplicate_of, duplicate_distance=distance, **hash_fields(value)
+                )
+                indexed += 1
+
+            last_id = batch[-1].submission_id
+            self.stdout.write(f'... up to submission {last_id} ({indexed} indexed)')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Indexed {indexed} images ({failed} failed)')
+        )
@@ -0,0 +1,90 @@
+"""
+Management command to load test the API with concurrent virtual users replaying the client flows
+Usage: python manage.py load_test [--users 10] [--iterations 5] [--url http://127.0.0.1:8000] [--output run.json] [--compare baseline.json]
+
+Without --url, requests go through django.test.Client in this process
+against the configured database, and DB queries per request are counted.
+Every virtual user logs in with its own phone number (--phone-prefix)
+and creates real submissions, so point it at a test database.
+See submissions/loadtest.py for the scenario and the report format.
+"""
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from submissions.loadtest import HTTPTransport, TestClientTransport, build_report, compare_reports, run_load
+
+
+class Command(BaseCommand):
+    help = 'Run the client scenario with concurrent virtual users and report per-endpoint latency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='Concurrent virtual users')
+        parser.add_argument('--iterations', type=int, default=5, help='Scenarios run by each virtual user')
+        parser.add_argument('--url', help='Base URL of a running server (default: in-process test client)')
+        parser.add_argument('--phone-prefix', default='+96398', help='Virtual user N logs in as PREFIX + N (7 digits)')
+        parser.add_argument('--output', help='Write the JSON report to this file')
+        parser.add_argument('--compare', help='JSON report of a previous run to compare with')
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=10,
+            help='Percent change counted as a regression when comparing (exit status 1)',
+        )
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['iterations'] < 1:
+            raise CommandError('--users and --iterations must be at least 1')
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as baseline_file:
+                baseline = json.load(baseline_file)
+
+        if options['url']:
+            transport, hosts = (lambda: HTTPTransport(options['url'])), settings.ALLOWED_HOSTS
+        else:
+            transport, hosts = TestClientTransport, [*settings.ALLOWED_HOSTS, 'testserver']
+        with override_settings(ALLOWED_HOSTS=hosts):
+            samples, completed, failed, seconds = run_load(
+                transport, options['users'], options['iterations'], options['phone_prefix'], log=self.stderr.write,
+            )
+        report = build_report(
+            samples, completed, failed, seconds,
+            target=options['url'] or 'test-client', users=options['users'], iterations=options['iterations'],
+        )
+
+        self.stdout.write(
+            f'{"endpoint":<28} {"requests":>8} {"errors":>6} {"req/s":>8} '
+            f'{"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"queries":>7}'
+        )
+        for endpoint, stats in report['endpoints'].items():
+            queries = stats['queries_per_request']
+            self.stdout.write(
+                f'{endpoint:<28} {stats["requests"]:>8} {stats["errors"]:>6} {stats["throughput_rps"]:>8} '
+                f'{stats["p50_ms"]:>8} {stats["p95_ms"]:>8} {stats["p99_ms"]:>8} {"-" if queries is None else queries:>7}'
+            )
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2, ensure_ascii=False)
+
+        scenarios = report['scenarios']
+        summary = f'{scenarios["completed"]} scenarios in {report["duration_s"]}s ({scenarios["per_second"]}/s)'
+        if failed:
+            self.stdout.write(self.style.ERROR(f'✗ {failed} scenarios failed, {summary}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'✓ {summary}'))
+
+        if baseline is not None:
+            regressions = self.compare(baseline, report, options['threshold'])
+            if regressions:
+                raise CommandError(f'{regressions} metrics regressed by more than {options["threshold"]}%')
+
+    def compare(self, baseline, report, threshold):
+        regressions = 0
+        for endpoint, metric, before, after, change, regressed in compare_reports(baseline, report, threshold):
+            line = f'{endpoint:<28} {metric:<20} {before:>10} -> {after:<10} {change:+.1f}%'
+            self.stdout.write(self.style.ERROR(line) if regressed else line)
+            regressions += regressed
+        return regressions
@@ -0,0 +1,105 @@
+"""
+Management command to move existing submission images to content-addressed storage
+Usage: python manage.py migrate_media_to_cas [--batch-size N] [--checkpoint PATH] [--delete-originals]
+
+Progress is written to a checkpoint file after every batch, so an
+interrupted run continues where it stopped. Rows already pointing at
+content-addressed files are skipped, so re-running is safe.
+"""
+import json
+import os
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from submissions.caching import submission_versions
+from submissions.models import Submission
+from submissions.storage import IMAGE_FIELDS, ContentAddressedStorage, submission_media_storage
+
+
+class Command(BaseCommand):
+    help = 'Move existing submission images to content-addressed storage'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--checkpoint',
+            default=os.path.join(settings.BASE_DIR, '.migrate_media_to_cas.json'),
+            help='File recording the last migrated submission id',
+        )
+        parser.add_argument('--restart', action='store_true', help='Ignore an existing checkpoint')
+        parser.add_argument(
+            '--delete-originals',
+            action='store_true',
+            help='Delete the old files once their rows point at the new ones',
+        )
+
+    def handle(self, *args, **options):
+        storage = submission_media_storage()
+        if not isinstance(storage, ContentAddressedStorage):
+            raise CommandError('SUBMISSIONS_CONTENT_ADDRESSED_MEDIA is disabled')
+
+        checkpoint = options['checkpoint']
+        last_id = 0 if options['restart'] else self.read_checkpoint(checkpoint)
+        if last_id:
+            self.stdout.write(f'Resuming after submission {last_id}')
+
+        migrated = missing = 0
+        while True:
+            batch = list(
+                Submission.objects.filter(submission_id__gt=last_id)
+                .order_by('submission_id')
+                .values('submission_id', 'user_id', *IMAGE_FIELDS)[:options['batch_size']]
+            )
+            if not batch:
+                break
+
+            for row in batch:
+                updates, originals = {}, []
+                for field in IMAGE_FIELDS:
+                    name = row[field]
+                    if not name or storage.is_content_addressed(name):
+                        continue
+                    if not default_storage.exists(name):
+                        missing += 1
+                        self.stderr.write(f'Missing file for submission {row["submission_id"]}: {name}')
+                        continue
+                    with default_storage.open(name, 'rb') as content:
+                        updates[field] = storage.save(name, content)
+                    originals.append(name)
+
+                if updates:
+                    with transaction.atomic():
+                        Submission.objects.filter(submission_id=row['submission_id']).update(**updates, updated_at=timezone.now())
+                        for new_name in updates.values():
+                            storage.retain(new_name)
+                    submission_versions.invalidate(row['user_id'])
+                    migrated += 1
+                    if options['delete_originals']:
+                        for name in originals:
+                            default_storage.delete(name)
+
+            last_id = batch[-1]['submission_id']
+            self.write_checkpoint(checkpoint, last_id)
+            self.stdout.write(f'... up to submission {last_id} ({migrated} migrated)')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Migrated {migrated} submissions ({missing} missing files)')
+        )
+
+    def read_checkpoint(self, path):
+        try:
+            with open(path) as checkpoint:
+                return json.load(checkpoint)['last_id']
+        except FileNotFoundError:
+            return 0
+
+    def write_checkpoint(self, path, last_id):
+        # write-then-rename so a crash never leaves a truncated checkpoint
+        temporary = f'{path}.tmp'
+        with open(temporary, 'w') as checkpoint:
+            json.dump({'last_id': last_id}, checkpoint)
+        os.replace(temporary, path)
@@ -0,0 +1,18 @@
+"""
+Management command to delete expired OTP codes
+Usage: python manage.py purge_expired_otps
+"""
+from django.core.management.base import BaseCommand
+
+from submissions.otp import get_otp_store
+
+
+class Command(BaseCommand):
+    help = 'Delete expired OTP codes (nothing to do for stores with native expiry)'
+
+    def handle(self, *args, **options):
+        purged = get_otp_store().purge_expired()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Purged {purged} expired OTP codes')
+        )
@@ -0,0 +1,23 @@
+"""
+Management command to delete expired chunked uploads and their partial files
+Usage: python manage.py purge_expired_uploads
+"""
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from submissions.models import Upload
+from submissions.uploads import discard_upload
+
+
+class Command(BaseCommand):
+    help = 'Delete expired chunked uploads and their partial files'
+
+    def handle(self, *args, **options):
+        purged = 0
+        for upload in Upload.objects.filter(expires_at__lte=timezone.now()).iterator():
+            discard_upload(upload)
+            purged += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Purged {purged} expired uploads')
+        )
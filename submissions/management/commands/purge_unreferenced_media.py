@@ -0,0 +1,48 @@
+"""
+Management command to delete stored media files no submission references anymore
+Usage: python manage.py purge_unreferenced_media [--grace SECONDS]
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from submissions.models import StoredBlob
+from submissions.storage import submission_media_storage
+
+
+class Command(BaseCommand):
+    help = 'Delete content-addressed media files with no remaining references'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace',
+            type=int,
+            default=getattr(settings, 'SUBMISSIONS_MEDIA_PURGE_GRACE', 60 * 60),
+            help='Only purge files unreferenced for at least this many seconds',
+        )
+
+    def handle(self, *args, **options):
+        storage = submission_media_storage()
+        cutoff = timezone.now() - timedelta(seconds=options['grace'])
+        candidates = StoredBlob.objects.filter(ref_count=0, updated_at__lte=cutoff)
+
+        purged = freed = 0
+        for name in candidates.values_list('name', flat=True).iterator():
+            with transaction.atomic():
+                # re-check under lock: the file may have been referenced or saved again
+                blob = StoredBlob.objects.select_for_update().filter(
+                    name=name, ref_count=0, updated_at__lte=cutoff,
+                ).first()
+                if blob is None:
+                    continue
+                storage.delete(blob.name)
+                blob.delete()
+            purged += 1
+            freed += blob.size
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Purged {purged} unreferenced files ({freed} bytes)')
+        )
@@ -0,0 +1,112 @@
+"""
+Management command to recompute the submission aggregates from the Submissions table
+Usage: python manage.py rebuild_aggregates [--only tiles|rollups] [--batch-size N]
+
+Needed after changing SUBMISSIONS_TILE_ZOOMS or TIME_ZONE, and to
+backfill existing submissions. Runs in one transaction, so readers keep
+seeing the old aggregates until it commits.
+
+Submission writes must be paused while it runs (maintenance mode, or
+stop the app servers and workers). The Submissions table is read before
+the aggregate rows are replaced, so a submission created or deleted in
+between is missing from the snapshot and its tile and daily rollup
+updates are lost with the deleted rows. Locking the aggregate tables would not help: a
+submission row commits before its aggregates are updated.
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from submissions.aggregates import SubmissionPoint, tile_deltas
+from submissions.models import DailySubmissionStats, DailyUserActivity, Submission, SubmissionTile
+
+
+class Command(BaseCommand):
+    help = 'Recompute map tile aggregates and daily rollups from the Submissions table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only', choices=['tiles', 'rollups'], help='Rebuild only one kind of aggregate')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['only'] in (None, 'tiles'):
+                self.rebuild_tiles(options['batch_size'])
+            if options['only'] in (None, 'rollups'):
+                self.rebuild_rollups(options['batch_size'])
+
+    def rebuild_tiles(self, batch_size):
+        tiles = {}
+        for points in self.iter_points(batch_size):
+            for key, delta in tile_deltas(points, []).items():
+                total = tiles.setdefault(key, {'count': 0, 'latitude_sum': 0.0, 'longitude_sum': 0.0})
+                for field, value in delta.items():
+                    total[field] += value
+
+        SubmissionTile.objects.all().delete()
+        SubmissionTile.objects.bulk_create([
+            SubmissionTile(zoom=zoom, x=x, y=y, category_id=category_id, **totals)
+            for (zoom, x, y, category_id), totals in tiles.items()
+        ], batch_size=batch_size)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Rebuilt {len(tiles)} map tiles')
+        )
+
+    def rebuild_rollups(self, batch_size):
+        """
+        Group in the database: per-user activity first, then the daily stats from it.
+
+        The rows are deleted before the Submissions table is grouped, so a
+        submission written in between can leave both rollups short; run it
+        with submission writes paused (see the module docstring).
+        """
+        DailyUserActivity.objects.all().delete()
+        DailySubmissionStats.objects.all().delete()
+
+        activity = (
+            Submission.objects
+            .annotate(day=TruncDate('created_at', tzinfo=timezone.get_default_timezone()))
+            .values('day', 'category_id', 'user_id')
+            .annotate(submissions=Count('submission_id'))
+            .order_by()
+        )
+        rows = 0
+        batch = []
+        for row in activity.iterator(chunk_size=batch_size):
+            batch.append(DailyUserActivity(**row))
+            if len(batch) >= batch_size:
+                rows += len(DailyUserActivity.objects.bulk_create(batch))
+                batch = []
+        rows += len(DailyUserActivity.objects.bulk_create(batch))
+
+        stats = (
+            DailyUserActivity.objects
+            .values('day', 'category_id')
+            .annotate(submissions=Sum('submissions'), users=Count('user_id'))
+            .order_by()
+        )
+        days = DailySubmissionStats.objects.bulk_create(
+            [DailySubmissionStats(**row) for row in stats], batch_size=batch_size
+        )
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Rebuilt {len(days)} daily rollups ({rows} user activity rows)')
+        )
+
+    def iter_points(self, batch_size):
+        """Yield lists of SubmissionPoint, in primary key order"""
+        last_id = 0
+        while True:
+            rows = list(
+                Submission.objects.filter(submission_id__gt=last_id)
+                .order_by('submission_id')
+                .values_list('submission_id', *SubmissionPoint._fields)[:batch_size]
+            )
+            if not rows:
+                return
+            yield [SubmissionPoint(*row[1:]) for row in rows]
+            last_id = rows[-1][0]
+            self.stdout.write(f'... up to submission {last_id}')
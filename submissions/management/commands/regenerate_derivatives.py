@@ -0,0 +1,51 @@
+"""
+Management command to generate the image derivatives that are missing
+Usage: python manage.py regenerate_derivatives [--all]
+
+Derivative jobs run in the background after each upload; a job that failed
+or was lost (e.g. the server restarted) leaves the derivative columns
+empty. Each source image is rendered once, however many rows use it.
+"""
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from submissions.images import DERIVATIVE_FIELDS, derivative_pipeline, get_derivative_specs, render_derivatives
+from submissions.models import Submission
+
+
+class Command(BaseCommand):
+    help = 'Generate missing thumbnails and web versions of submission images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Regenerate every derivative (e.g. after SUBMISSIONS_IMAGE_DERIVATIVES changed)',
+        )
+
+    def handle(self, *args, **options):
+        specs = get_derivative_specs()
+        generated = failed = 0
+        for source_field, targets in DERIVATIVE_FIELDS.items():
+            rows = Submission.objects.exclude(**{source_field: ''}).exclude(**{f'{source_field}__isnull': True})
+            if not options['all']:
+                missing = Q()
+                for target_field in targets.values():
+                    missing |= Q(**{f'{target_field}__isnull': True}) | Q(**{target_field: ''})
+                rows = rows.filter(missing)
+
+            storage = Submission._meta.get_field(source_field).storage
+            names = rows.order_by().values_list(source_field, flat=True).distinct()
+            for name in list(names):
+                try:
+                    derivatives = render_derivatives(storage.path(name), specs)
+                    derivative_pipeline.store(source_field, name, derivatives)
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(f'{name}: {error}')
+                    continue
+                generated += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Generated derivatives for {generated} images ({failed} failed)')
+        )
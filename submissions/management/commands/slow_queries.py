@@ -0,0 +1,74 @@
+"""
+Management command to list the slow queries recorded by the sampler, grouped by fingerprint
+Usage: python manage.py slow_queries [--sort total|count|max] [--limit 20] [--plans] [--clear]
+
+Reads the ring buffer kept in CACHES by submissions/slowqueries.py, so
+the cache must be shared with the server processes (not LocMemCache).
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS
+from django.core.management.base import BaseCommand
+
+from submissions.checks import PROCESS_LOCAL_CACHES
+from submissions.slowqueries import slow_query_log
+
+SORT_KEYS = {
+    'total': lambda group: group['total_ms'],
+    'count': lambda group: group['count'],
+    'max': lambda group: group['max_ms'],
+}
+
+
+def group_by_fingerprint(records):
+    """[{fingerprint, sql, count, total_ms, max_ms, views, last_at, plan}] from sampler records"""
+    groups = defaultdict(lambda: {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'views': defaultdict(int), 'plan': None})
+    for record in records:
+        group = groups[record['fingerprint']]
+        group['fingerprint'] = record['fingerprint']
+        group['sql'] = record['sql']
+        group['count'] += 1
+        group['total_ms'] += record['ms']
+        group['max_ms'] = max(group['max_ms'], record['ms'])
+        group['views'][record['view'] or '-'] += 1
+        group['last_at'] = record['at']
+        # آخر خطة مسجلة (السجلات مرتبة من الأقدم)
+        group['plan'] = record['plan'] or group['plan']
+    return list(groups.values())
+
+
+class Command(BaseCommand):
+    help = 'Show slow queries recorded by the slow-query sampler, grouped by fingerprint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sort', choices=list(SORT_KEYS), default='total')
+        parser.add_argument('--limit', type=int, default=20, help='Number of fingerprints shown')
+        parser.add_argument('--plans', action='store_true', help='Print the last EXPLAIN plan of each query')
+        parser.add_argument('--clear', action='store_true', help='Empty the buffer')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            slow_query_log.clear()
+            self.stdout.write(self.style.SUCCESS('✓ Slow query buffer cleared'))
+            return
+
+        if settings.CACHES.get(DEFAULT_CACHE_ALIAS, {}).get('BACKEND') in PROCESS_LOCAL_CACHES:
+            self.stderr.write(self.style.WARNING(
+                'The default cache is local to this process: queries recorded by the server are not visible here'
+            ))
+        records = slow_query_log.records()
+        groups = sorted(group_by_fingerprint(records), key=SORT_KEYS[options['sort']], reverse=True)
+        self.stdout.write(f'{len(records)} slow queries, {len(groups)} fingerprints')
+        for group in groups[:options['limit']]:
+            views = ', '.join(f'{view} ({count})' for view, count in sorted(group['views'].items(), key=lambda item: -item[1]))
+            self.stdout.write('')
+            self.stdout.write(self.style.WARNING(
+                f'{group["fingerprint"]}  {group["count"]}x  total {group["total_ms"]:.0f} ms  '
+                f'mean {group["total_ms"] / group["count"]:.0f} ms  max {group["max_ms"]:.0f} ms  last {group["last_at"]}'
+            ))
+            self.stdout.write(f'  views: {views}')
+            self.stdout.write(f'  {group["sql"]}')
+            if options['plans'] and group['plan']:
+                for line in group['plan'].splitlines():
+                    self.stdout.write(f'    {line}')
@@ -0,0 +1,271 @@
+"""
+Per-request performance instrumentation.
+
+RequestMetricsMiddleware times every request and splits it into phases:
+database (count and time of every query, through a connection
+execute_wrapper), authentication (CustomJWTAuthentication), serializers
+(TimedSerializerMixin and the fast read path) and response rendering.
+
+The phases are sent back in a Server-Timing header when
+SUBMISSIONS_SERVER_TIMING is on, and added to per-view latency
+histograms served in the Prometheus text format by `metrics_view`.
+Counters live in the memory of each server process: with several
+workers, every scrape reports the process that answered it.
+"""
+import copy
+import threading
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from ipaddress import ip_address, ip_network
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+PHASES = ('db', 'auth', 'serializer', 'render')
+# Methods kept as label values, anything else is counted as 'other'
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Phase timings of the request being served"""
+    __slots__ = ('request', 'phases', 'active', 'queries', 'render_started')
+
+    def __init__(self, request):
+        self.request = request
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.active = set()
+        self.queries = 0
+        self.render_started = None
+
+    def execute(self, execute, sql, params, many, context):
+        """Connection execute_wrapper counting queries and their time"""
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.phases['db'] += perf_counter() - started
+            self.queries += 1
+
+    def start_render(self):
+        self.render_started = perf_counter()
+
+    def end_render(self, response):
+        if self.render_started is not None:
+            self.phases['render'] += perf_counter() - self.render_started
+            self.render_started = None
+
+    def server_timing(self, total):
+        """Server-Timing header value (durations in milliseconds)"""
+        entries = [f'total;dur={total * 1000:.2f}']
+        for phase, seconds in self.phases.items():
+            if phase == 'db':
+                entries.append(f'db;dur={seconds * 1000:.2f};desc="{self.queries} queries"')
+            elif seconds:
+                entries.append(f'{phase};dur={seconds * 1000:.2f}')
+        return ', '.join(entries)
+
+
+def current_view():
+    """view_name of the request being served, None outside a (measured) request"""
+    metrics = _current.get()
+    match = metrics.request.resolver_match if metrics is not None else None
+    return match.view_name if match else None
+
+
+@contextmanager
+def timed(phase):
+    """
+    Add the time spent in the block to `phase` of the current request.
+    Nested blocks of the same phase (a serializer inside a serializer)
+    are counted once; outside a request this does nothing.
+    """
+    metrics = _current.get()
+    if metrics is None or phase in metrics.active:
+        yield
+        return
+    metrics.active.add(phase)
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        metrics.phases[phase] += perf_counter() - started
+        metrics.active.discard(phase)
+
+
+class TimedSerializerMixin:
+    """Counts validation and representation time of a serializer in the 'serializer' phase"""
+
+    def is_valid(self, *args, **kwargs):
+        with timed('serializer'):
+            return super().is_valid(*args, **kwargs)
+
+    def to_representation(self, instance):
+        with timed('serializer'):
+            return super().to_representation(instance)
+
+
+# Aggregation
+
+class MetricsRegistry:
+    """Per (view, method) latency histograms and phase totals, thread-safe"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.series = {}
+        self.collectors = []
+
+    def add_collector(self, collector):
+        """Add a callable returning extra exposition lines (other per-process counters)"""
+        self.collectors.append(collector)
+
+    def observe(self, view, method, status, seconds, metrics):
+        key = (view, method)
+        status_class = f'{status // 100}xx'
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = {
+                    'buckets': [0] * len(self.buckets),
+                    'count': 0,
+                    'sum': 0.0,
+                    'phases': dict.fromkeys(PHASES, 0.0),
+                    'queries': 0,
+                    'responses': {},
+                }
+            index = bisect_left(self.buckets, seconds)
+            if index < len(self.buckets):
+                series['buckets'][index] += 1
+            series['count'] += 1
+            series['sum'] += seconds
+            for phase, phase_seconds in metrics.phases.items():
+                series['phases'][phase] += phase_seconds
+            series['queries'] += metrics.queries
+            series['responses'][status_class] = series['responses'].get(status_class, 0) + 1
+
+    def reset(self):
+        with self.lock:
+            self.series = {}
+
+    def render(self):
+        """Prometheus text exposition format"""
+        with self.lock:
+            series = copy.deepcopy(self.series)
+
+        lines = [
+            '# HELP sm_http_request_duration_seconds Request wall time per view',
+            '# TYPE sm_http_request_duration_seconds histogram',
+        ]
+        for (view, method), value in sorted(series.items()):
+            labels = f'view="{view}",method="{method}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets, value['buckets']):
+                cumulative += count
+                lines.append(f'sm_http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'sm_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {value["count"]}')
+            lines.append(f'sm_http_request_duration_seconds_sum{{{labels}}} {value["sum"]:.6f}')
+            lines.append(f'sm_http_request_duration_seconds_count{{{labels}}} {value["count"]}')
+
+        lines += [
+            '# HELP sm_http_request_phase_seconds_total Time spent per request phase',
+            '# TYPE sm_http_request_phase_seconds_total counter',
+        ]
+        for (view, method), value in sorted(series.items()):
+            for phase, seconds in value['phases'].items():
+                lines.append(
+                    f'sm_http_request_phase_seconds_total{{view="{view}",method="{method}",phase="{phase}"}} {seconds:.6f}'
+                )
+
+        lines += [
+            '# HELP sm_http_request_db_queries_total Database queries run by requests',
+            '# TYPE sm_http_request_db_queries_total counter',
+        ]
+        for (view, method), value in sorted(series.items()):
+            lines.append(f'sm_http_request_db_queries_total{{view="{view}",method="{method}"}} {value["queries"]}')
+
+        lines += [
+            '# HELP sm_http_responses_total Responses per status class',
+            '# TYPE sm_http_responses_total counter',
+        ]
+        for (view, method), value in sorted(series.items()):
+            for status_class, count in sorted(value['responses'].items()):
+                lines.append(
+                    f'sm_http_responses_total{{view="{view}",method="{method}",status="{status_class}"}} {count}'
+                )
+        for collector in self.collectors:
+            lines += collector()
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+# Middleware and endpoint
+
+class RequestMetricsMiddleware:
+    """
+    Times every request (keep it first in MIDDLEWARE so the total covers
+    the other middleware). Controlled by SUBMISSIONS_METRICS_ENABLED and
+    SUBMISSIONS_SERVER_TIMING.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        enabled = getattr(settings, 'SUBMISSIONS_METRICS_ENABLED', True)
+        server_timing = getattr(settings, 'SUBMISSIONS_SERVER_TIMING', False)
+        if not (enabled or server_timing):
+            return self.get_response(request)
+
+        metrics = RequestMetrics(request)
+        token = _current.set(metrics)
+        started = perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics.execute))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = perf_counter() - started
+
+        if server_timing:
+            response['Server-Timing'] = metrics.server_timing(total)
+        if enabled:
+            match = request.resolver_match
+            registry.observe(
+                match.view_name if match else 'unmatched',
+                request.method if request.method in METHODS else 'other',
+                response.status_code, total, metrics,
+            )
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF Response يُعرض بعد هذه الخطوة مباشرة
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.start_render()
+            response.add_post_render_callback(metrics.end_render)
+        return response
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint, limited to SUBMISSIONS_METRICS_ALLOWED_IPS"""
+    allowed = getattr(settings, 'SUBMISSIONS_METRICS_ALLOWED_IPS', ('127.0.0.1/32', '::1/128'))
+    try:
+        address = ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return HttpResponseForbidden()
+    if not any(address in ip_network(network) for network in allowed):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submissions', '0006_alter_submission_created_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['user', 'created_at', 'submission_id'], name='sub_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['user', 'category', 'created_at'], name='sub_user_cat_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['user', 'latitude', 'longitude'], name='sub_user_lat_lng_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submissions', '0007_submission_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='image_thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='derivatives/thumbnails/', verbose_name='الصورة المصغرة'),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='image_web',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='derivatives/web/', verbose_name='صورة الويب'),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='invoice_thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='derivatives/thumbnails/', verbose_name='صورة الفاتورة المصغرة'),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='invoice_web',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='derivatives/web/', verbose_name='صورة الفاتورة للويب'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:54
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submissions', '0008_submission_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Upload',
+            fields=[
+                ('upload_id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255, verbose_name='اسم الملف')),
+                ('total_size', models.PositiveBigIntegerField(verbose_name='الحجم الكلي')),
+                ('received_size', models.PositiveBigIntegerField(default=0, verbose_name='الحجم المستلم')),
+                ('completed_at', models.DateTimeField(blank=True, null=True, verbose_name='تاريخ الاكتمال')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاريخ الإنشاء')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='تاريخ الانتهاء')),
+                ('user', models.ForeignKey(db_column='user_id', on_delete=django.db.models.deletion.CASCADE, to='submissions.user', verbose_name='المستخدم')),
+            ],
+            options={
+                'verbose_name': 'رفع ملف',
+                'verbose_name_plural': 'رفع الملفات',
+                'db_table': 'Uploads',
+            },
+        ),
+    ]
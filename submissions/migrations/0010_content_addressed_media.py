@@ -0,0 +1,59 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:56
+
+import submissions.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submissions', '0009_upload'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='submission',
+            name='image_thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, storage=submissions.storage.submission_media_storage, upload_to='derivatives/thumbnails/', verbose_name='الصورة المصغرة'),
+        ),
+        migrations.AlterField(
+            model_name='submission',
+            name='image_url',
+            field=models.ImageField(storage=submissions.storage.submission_media_storage, upload_to='submissions/', verbose_name='صورة التقديم'),
+        ),
+        migrations.AlterField(
+            model_name='submission',
+            name='image_web',
+            field=models.ImageField(blank=True, editable=False, null=True, storage=submissions.storage.submission_media_storage, upload_to='derivatives/web/', verbose_name='صورة الويب'),
+        ),
+        migrations.AlterField(
+            model_name='submission',
+            name='invoice_image',
+            field=models.ImageField(blank=True, null=True, storage=submissions.storage.submission_media_storage, upload_to='invoices/', verbose_name='صورة الفاتورة'),
+        ),
+        migrations.AlterField(
+            model_name='submission',
+            name='invoice_thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, storage=submissions.storage.submission_media_storage, upload_to='derivatives/thumbnails/', verbose_name='صورة الفاتورة المصغرة'),
+        ),
+        migrations.AlterField(
+            model_name='submission',
+            name='invoice_web',
+            field=models.ImageField(blank=True, editable=False, null=True, storage=submissions.storage.submission_media_storage, upload_to='derivatives/web/', verbose_name='صورة الفاتورة للويب'),
+        ),
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False, verbose_name='المسار')),
+                ('size', models.PositiveBigIntegerField(verbose_name='الحجم')),
+                ('ref_count', models.PositiveIntegerField(default=0, verbose_name='عدد المراجع')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='تاريخ التحديث')),
+            ],
+            options={
+                'verbose_name': 'ملف مخزن',
+                'verbose_name_plural': 'الملفات المخزنة',
+                'db_table': 'StoredBlobs',
+                'indexes': [models.Index(fields=['ref_count', 'updated_at'], name='blob_unreferenced_idx')],
+            },
+        ),
+    ]
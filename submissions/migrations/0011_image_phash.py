@@ -0,0 +1,65 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submissions', '0010_content_addressed_media'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='duplicate_distance',
+            field=models.PositiveSmallIntegerField(blank=True, editable=False, null=True, verbose_name='مسافة التشابه'),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='duplicate_of',
+            field=models.ForeignKey(blank=True, db_column='duplicate_of_id', editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='near_duplicates', to='submissions.submission', verbose_name='مكرر محتمل لـ'),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='image_phash',
+            field=models.BigIntegerField(blank=True, editable=False, null=True, verbose_name='بصمة الصورة'),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='phash_segment_0',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='phash_segment_1',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='phash_segment_2',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='phash_segment_3',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['phash_segment_0'], name='sub_phash_seg0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['phash_segment_1'], name='sub_phash_seg1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['phash_segment_2'], name='sub_phash_seg2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['phash_segment_3'], name='sub_phash_seg3_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:09
+
+from django.db import migrations, models
+
+from submissions.geo import geo_cell
+
+BATCH_SIZE = 2000
+
+
+def backfill_geo_cells(apps, schema_editor):
+    """Compute geo_cell for existing rows, in primary key batches"""
+    Submission = apps.get_model('submissions', 'Submission')
+    last_id = 0
+    while True:
+        batch = list(
+            Submission.objects.filter(submission_id__gt=last_id)
+            .order_by('submission_id')
+            .only('submission_id', 'latitude', 'longitude')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        for submission in batch:
+            submission.geo_cell = geo_cell(submission.latitude, submission.longitude)
+        Submission.objects.bulk_update(batch, ['geo_cell'])
+        last_id = batch[-1].submission_id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submissions', '0011_image_phash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='geo_cell',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='الخلية الجغرافية'),
+        ),
+        # قبل إنشاء الفهرس، لتسريع التعبئة
+        migrations.RunPython(backfill_geo_cells, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['geo_cell', 'category', 'created_at'], name='sub_geo_cat_created_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submissions', '0012_geo_cell'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubmissionTile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('zoom', models.PositiveSmallIntegerField(verbose_name='مستوى التكبير')),
+                ('x', models.PositiveIntegerField()),
+                ('y', models.PositiveIntegerField()),
+                ('count', models.IntegerField(default=0, verbose_name='العدد')),
+                ('latitude_sum', models.FloatField(default=0)),
+                ('longitude_sum', models.FloatField(default=0)),
+                ('category', models.ForeignKey(db_column='category_id', on_delete=django.db.models.deletion.CASCADE, to='submissions.category', verbose_name='الفئة')),
+            ],
+            options={
+                'verbose_name': 'خلية خريطة',
+                'verbose_name_plural': 'خلايا الخريطة',
+                'db_table': 'SubmissionTiles',
+                'constraints': [models.UniqueConstraint(fields=('zoom', 'x', 'y', 'category'), name='tile_zoom_xy_category_uniq')],
+            },
+        ),
+    ]
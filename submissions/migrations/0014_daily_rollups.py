@@ -0,0 +1,46 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submissions', '0013_submission_tiles'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySubmissionStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='اليوم')),
+                ('submissions', models.IntegerField(default=0, verbose_name='عدد التقديمات')),
+                ('users', models.IntegerField(default=0, verbose_name='عدد المستخدمين')),
+                ('category', models.ForeignKey(db_column='category_id', on_delete=django.db.models.deletion.CASCADE, to='submissions.category', verbose_name='الفئة')),
+            ],
+            options={
+                'verbose_name': 'إحصائية يومية',
+                'verbose_name_plural': 'الإحصائيات اليومية',
+                'db_table': 'DailySubmissionStats',
+                'constraints': [models.UniqueConstraint(fields=('day', 'category'), name='daily_stats_day_category_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyUserActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='اليوم')),
+                ('submissions', models.IntegerField(default=0, verbose_name='عدد التقديمات')),
+                ('category', models.ForeignKey(db_column='category_id', on_delete=django.db.models.deletion.CASCADE, to='submissions.category', verbose_name='الفئة')),
+                ('user', models.ForeignKey(db_column='user_id', on_delete=django.db.models.deletion.CASCADE, to='submissions.user', verbose_name='المستخدم')),
+            ],
+            options={
+                'verbose_name': 'نشاط يومي',
+                'verbose_name_plural': 'النشاط اليومي',
+                'db_table': 'DailyUserActivity',
+                'constraints': [models.UniqueConstraint(fields=('day', 'category', 'user'), name='daily_activity_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submissions', '0014_daily_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='تاريخ التعديل'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['updated_at', 'submission_id'], name='sub_updated_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-18 08:46
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+from django.utils import timezone
+
+
+def keep_latest_codes(apps, schema_editor):
+    """Drop expired codes and all but the newest code of each phone number, before the unique index"""
+    OtpCode = apps.get_model('submissions', 'OtpCode')
+    OtpCode.objects.filter(expires_at__lte=timezone.now()).delete()
+    # MySQL يرفض DELETE مع استعلام فرعي على الجدول نفسه (خطأ 1093): المعرّفات تُقرأ أولاً
+    duplicated = (
+        OtpCode.objects.values('phone_number').annotate(latest=Max('id'), codes=Count('id')).filter(codes__gt=1)
+    )
+    for row in duplicated.iterator():
+        OtpCode.objects.filter(phone_number=row['phone_number'], id__lt=row['latest']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('submissions', '0015_submission_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='otpcode',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='المحاولات الخاطئة'),
+        ),
+        migrations.AlterField(
+            model_name='otpcode',
+            name='expires_at',
+            field=models.DateTimeField(db_index=True, verbose_name='تاريخ الانتهاء'),
+        ),
+        migrations.RunPython(keep_latest_codes, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='otpcode',
+            name='phone_number',
+            field=models.CharField(max_length=20, unique=True, verbose_name='رقم الهاتف'),
+        ),
+    ]
@@ -1,5 +1,9 @@
+import uuid
+
 from django.db import models
 
+from .storage import submission_media_storage
+
 class User(models.Model):
     user_id = models.AutoField(primary_key=True)
     phone_number = models.CharField(max_length=20, unique=True, verbose_name="رقم الهاتف")
@@ -52,10 +56,13 @@ class User(models.Model):
 
 
 class OtpCode(models.Model):
+    """Pending login code per phone number (the 'database' OTP store, see submissions/otp.py)"""
     id = models.AutoField(primary_key=True)
-    phone_number = models.CharField(max_length=20, verbose_name="رقم الهاتف")
+    phone_number = models.CharField(max_length=20, unique=True, verbose_name="رقم الهاتف")
     hashed_code = models.CharField(max_length=255, verbose_name="الكود المشفر")
-    expires_at = models.DateTimeField(verbose_name="تاريخ الانتهاء")
+    # فهرس لحذف الأكواد المنتهية (purge_expired_otps)
+    expires_at = models.DateTimeField(db_index=True, verbose_name="تاريخ الانتهاء")
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="المحاولات الخاطئة")
 
     class Meta:
         db_table = 'OtpCodes'
@@ -84,19 +91,167 @@ class Submission(models.Model):
     submission_id = models.AutoField(primary_key=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, db_column='user_id', verbose_name="المستخدم")
     category = models.ForeignKey(Category, on_delete=models.CASCADE, db_column='category_id', verbose_name="الفئة")
-    image_url = models.ImageField(upload_to='submissions/', verbose_name="صورة التقديم")
+    image_url = models.ImageField(upload_to='submissions/', storage=submission_media_storage, verbose_name="صورة التقديم")
     notes = models.TextField(blank=True, null=True, verbose_name="الملاحظات")
     latitude = models.DecimalField(max_digits=10, decimal_places=8, verbose_name="خط العرض")
     longitude = models.DecimalField(max_digits=11, decimal_places=8, verbose_name="خط الطول")
     counter_number = models.CharField(max_length=50, blank=True, null=True, verbose_name="رقم العداد")
     consumption_number = models.CharField(max_length=50, blank=True, null=True, verbose_name="رقم الاستهلاك")
-    invoice_image = models.ImageField(upload_to='invoices/', blank=True, null=True, verbose_name="صورة الفاتورة")
+    invoice_image = models.ImageField(upload_to='invoices/', storage=submission_media_storage, blank=True, null=True, verbose_name="صورة الفاتورة")
+    # نسخ مصغرة تولَّد في الخلفية (submissions/images.py)
+    image_thumbnail = models.ImageField(upload_to='derivatives/thumbnails/', storage=submission_media_storage, blank=True, null=True, editable=False, verbose_name="الصورة المصغرة")
+    image_web = models.ImageField(upload_to='derivatives/web/', storage=submission_media_storage, blank=True, null=True, editable=False, verbose_name="صورة الويب")
+    invoice_thumbnail = models.ImageField(upload_to='derivatives/thumbnails/', storage=submission_media_storage, blank=True, null=True, editable=False, verbose_name="صورة الفاتورة المصغرة")
+    invoice_web = models.ImageField(upload_to='derivatives/web/', storage=submission_media_storage, blank=True, null=True, editable=False, verbose_name="صورة الفاتورة للويب")
+    # خلية الشبكة الجغرافية للبحث عن التقديمات القريبة (submissions/geo.py)
+    geo_cell = models.PositiveIntegerField(blank=True, null=True, editable=False, verbose_name="الخلية الجغرافية")
+    # بصمة الصورة الإدراكية وأقرب صورة مشابهة (submissions/phash.py)
+    image_phash = models.BigIntegerField(blank=True, null=True, editable=False, verbose_name="بصمة الصورة")
+    phash_segment_0 = models.PositiveIntegerField(blank=True, null=True, editable=False)
+    phash_segment_1 = models.PositiveIntegerField(blank=True, null=True, editable=False)
+    phash_segment_2 = models.PositiveIntegerField(blank=True, null=True, editable=False)
+    phash_segment_3 = models.PositiveIntegerField(blank=True, null=True, editable=False)
+    duplicate_of = models.ForeignKey(
+        'self', on_delete=models.SET_NULL, blank=True, null=True, editable=False,
+        related_name='near_duplicates', db_column='duplicate_of_id', verbose_name="مكرر محتمل لـ",
+    )
+    duplicate_distance = models.PositiveSmallIntegerField(blank=True, null=True, editable=False, verbose_name="مسافة التشابه")
     created_at = models.DateTimeField(auto_now_add=False, verbose_name="تاريخ الإنشاء")
+    # آخر تعديل، للتصدير التزايدي (export_submissions --incremental)
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="تاريخ التعديل")
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # القيم كما قُرئت من قاعدة البيانات، لمعرفة ما تغيّر عند الحفظ
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
 
     class Meta:
         db_table = 'Submissions'
         verbose_name = 'تقديم'
         verbose_name_plural = 'التقديمات'
+        indexes = [
+            # قائمة المستخدم مرتبة بالتاريخ (cursor pagination + created_after/before)
+            models.Index(fields=['user', 'created_at', 'submission_id'], name='sub_user_created_idx'),
+            # تصفية حسب فئة أو عدة فئات
+            models.Index(fields=['user', 'category', 'created_at'], name='sub_user_cat_created_idx'),
+            # تصفية حسب النطاق الجغرافي (bbox)
+            models.Index(fields=['user', 'latitude', 'longitude'], name='sub_user_lat_lng_idx'),
+            # التقديمات القريبة من نقطة، مع تصفية حسب الفئة والتاريخ
+            models.Index(fields=['geo_cell', 'category', 'created_at'], name='sub_geo_cat_created_idx'),
+            # البحث عن الصور المتشابهة (multi-index hashing)
+            models.Index(fields=['phash_segment_0'], name='sub_phash_seg0_idx'),
+            models.Index(fields=['phash_segment_1'], name='sub_phash_seg1_idx'),
+            models.Index(fields=['phash_segment_2'], name='sub_phash_seg2_idx'),
+            models.Index(fields=['phash_segment_3'], name='sub_phash_seg3_idx'),
+            # التصدير التزايدي للصفوف المعدلة منذ آخر تشغيل
+            models.Index(fields=['updated_at', 'submission_id'], name='sub_updated_idx'),
+        ]
 
     def __str__(self):
         return f"تقديم {self.submission_id} - {self.user.phone_number}"
+
+
+class Upload(models.Model):
+    """Resumable chunked upload; attached to a submission by upload_id once finalized"""
+    upload_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_column='user_id', verbose_name="المستخدم")
+    filename = models.CharField(max_length=255, verbose_name="اسم الملف")
+    total_size = models.PositiveBigIntegerField(verbose_name="الحجم الكلي")
+    received_size = models.PositiveBigIntegerField(default=0, verbose_name="الحجم المستلم")
+    completed_at = models.DateTimeField(blank=True, null=True, verbose_name="تاريخ الاكتمال")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="تاريخ الإنشاء")
+    expires_at = models.DateTimeField(db_index=True, verbose_name="تاريخ الانتهاء")
+
+    class Meta:
+        db_table = 'Uploads'
+        verbose_name = 'رفع ملف'
+        verbose_name_plural = 'رفع الملفات'
+
+    def __str__(self):
+        return f"{self.filename} ({self.received_size}/{self.total_size})"
+
+    @property
+    def is_completed(self):
+        return self.completed_at is not None
+
+
+class StoredBlob(models.Model):
+    """Reference count of a content-addressed media file (see submissions/storage.py)"""
+    name = models.CharField(max_length=255, primary_key=True, verbose_name="المسار")
+    size = models.PositiveBigIntegerField(verbose_name="الحجم")
+    ref_count = models.PositiveIntegerField(default=0, verbose_name="عدد المراجع")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="تاريخ التحديث")
+
+    class Meta:
+        db_table = 'StoredBlobs'
+        verbose_name = 'ملف مخزن'
+        verbose_name_plural = 'الملفات المخزنة'
+        indexes = [
+            models.Index(fields=['ref_count', 'updated_at'], name='blob_unreferenced_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count})"
+
+
+class SubmissionTile(models.Model):
+    """Submission count per map tile and category (see submissions/aggregates.py)"""
+    zoom = models.PositiveSmallIntegerField(verbose_name="مستوى التكبير")
+    x = models.PositiveIntegerField()
+    y = models.PositiveIntegerField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, db_column='category_id', verbose_name="الفئة")
+    count = models.IntegerField(default=0, verbose_name="العدد")
+    # لحساب مركز التجمع
+    latitude_sum = models.FloatField(default=0)
+    longitude_sum = models.FloatField(default=0)
+
+    class Meta:
+        db_table = 'SubmissionTiles'
+        verbose_name = 'خلية خريطة'
+        verbose_name_plural = 'خلايا الخريطة'
+        constraints = [
+            models.UniqueConstraint(fields=['zoom', 'x', 'y', 'category'], name='tile_zoom_xy_category_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.zoom}/{self.x}/{self.y} - {self.category_id}: {self.count}"
+
+
+class DailySubmissionStats(models.Model):
+    """Submissions and distinct users per day and category (see submissions/aggregates.py)"""
+    day = models.DateField(verbose_name="اليوم")
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, db_column='category_id', verbose_name="الفئة")
+    submissions = models.IntegerField(default=0, verbose_name="عدد التقديمات")
+    users = models.IntegerField(default=0, verbose_name="عدد المستخدمين")
+
+    class Meta:
+        db_table = 'DailySubmissionStats'
+        verbose_name = 'إحصائية يومية'
+        verbose_name_plural = 'الإحصائيات اليومية'
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'category'], name='daily_stats_day_category_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} - {self.category_id}: {self.submissions}"
+
+
+class DailyUserActivity(models.Model):
+    """Submissions per day, category and user; backs the distinct user counts"""
+    day = models.DateField(verbose_name="اليوم")
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, db_column='category_id', verbose_name="الفئة")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_column='user_id', verbose_name="المستخدم")
+    submissions = models.IntegerField(default=0, verbose_name="عدد التقديمات")
+
+    class Meta:
+        db_table = 'DailyUserActivity'
+        verbose_name = 'نشاط يومي'
+        verbose_name_plural = 'النشاط اليومي'
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'category', 'user'], name='daily_activity_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} - {self.category_id} - {self.user_id}: {self.submissions}"
@@ -0,0 +1,139 @@
+"""
+Storage for one-time login codes.
+
+send_otp saves the hashed code of a phone number for SUBMISSIONS_OTP_TTL
+seconds (a new code replaces the previous one). verify_otp consumes it:
+a matching code is deleted in the same step, a wrong one counts as an
+attempt, and after SUBMISSIONS_OTP_MAX_ATTEMPTS wrong attempts the code
+stops working until a new one is sent.
+
+SUBMISSIONS_OTP_STORE selects the backend:
+    'database'  the OtpCodes table, one row per phone number (unique),
+                written with a single upsert; expired rows are deleted
+                by `python manage.py purge_expired_otps`
+    'cache'     Django's cache, expiring natively, no SQL at all (CACHES
+                must be shared between the server processes)
+or the dotted path of an OTPStore subclass.
+"""
+import hashlib
+import hmac
+from abc import ABC, abstractmethod
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import OtpCode
+
+# verify() results
+VERIFIED = 'verified'
+INVALID = 'invalid'  # wrong, expired, never sent or out of attempts
+
+
+def hash_code(code):
+    return hashlib.sha256(code.encode()).hexdigest()
+
+
+def get_otp_ttl():
+    return getattr(settings, 'SUBMISSIONS_OTP_TTL', 300)
+
+
+def get_max_attempts():
+    return getattr(settings, 'SUBMISSIONS_OTP_MAX_ATTEMPTS', 5)
+
+
+class OTPStore(ABC):
+    """Abstract base class for OTP stores"""
+
+    @abstractmethod
+    def save(self, phone_number: str, hashed_code: str, ttl: int) -> None:
+        """Store the code of a phone number for `ttl` seconds, replacing any previous one"""
+
+    @abstractmethod
+    def verify(self, phone_number: str, hashed_code: str) -> str:
+        """Consume the code if it matches (VERIFIED), otherwise count an attempt (INVALID)"""
+
+    def purge_expired(self) -> int:
+        """Delete expired codes, return how many (stores with native expiry have nothing to do)"""
+        return 0
+
+
+class DatabaseOTPStore(OTPStore):
+    """OTPs in the OtpCodes table: one upsert per send, one DELETE per successful verification"""
+
+    def save(self, phone_number, hashed_code, ttl):
+        conflict = {'update_conflicts': True, 'update_fields': ['hashed_code', 'expires_at', 'attempts']}
+        # MySQL: ON DUPLICATE KEY UPDATE لا يقبل تحديد العمود (الفهرس الفريد هو phone_number)
+        if connections[OtpCode.objects.db].features.supports_update_conflicts_with_target:
+            conflict['unique_fields'] = ['phone_number']
+        OtpCode.objects.bulk_create(
+            [OtpCode(
+                phone_number=phone_number, hashed_code=hashed_code,
+                expires_at=timezone.now() + timedelta(seconds=ttl), attempts=0,
+            )],
+            **conflict,
+        )
+
+    def verify(self, phone_number, hashed_code):
+        usable = OtpCode.objects.filter(
+            phone_number=phone_number, expires_at__gt=timezone.now(), attempts__lt=get_max_attempts(),
+        )
+        # الحذف المشروط هو التحقق نفسه: طلبان متزامنان لا ينجحان معاً
+        deleted, _ = usable.filter(hashed_code=hashed_code).delete()
+        if deleted:
+            return VERIFIED
+        usable.update(attempts=F('attempts') + 1)
+        return INVALID
+
+    def purge_expired(self):
+        deleted, _ = OtpCode.objects.filter(expires_at__lte=timezone.now()).delete()
+        return deleted
+
+
+class CacheOTPStore(OTPStore):
+    """OTPs in Django's cache with native expiry; the attempt counter uses atomic incr()"""
+    key_prefix = 'submissions:otp'
+
+    def keys(self, phone_number):
+        digest = hashlib.sha256(phone_number.encode()).hexdigest()
+        return f'{self.key_prefix}:{digest}', f'{self.key_prefix}:{digest}:attempts'
+
+    def save(self, phone_number, hashed_code, ttl):
+        code_key, attempts_key = self.keys(phone_number)
+        cache.set_many({code_key: hashed_code, attempts_key: 0}, ttl)
+
+    def verify(self, phone_number, hashed_code):
+        code_key, attempts_key = self.keys(phone_number)
+        stored = cache.get(code_key)
+        if stored is None:
+            return INVALID
+        try:
+            attempts = cache.incr(attempts_key)
+        except ValueError:
+            # العداد انتهى أو حُذف قبل الكود
+            return INVALID
+        if attempts > get_max_attempts():
+            cache.delete_many([code_key, attempts_key])
+            return INVALID
+        # delete() يعيد True لطلب واحد فقط عند التزامن
+        if hmac.compare_digest(stored, hashed_code) and cache.delete(code_key):
+            cache.delete(attempts_key)
+            return VERIFIED
+        return INVALID
+
+
+OTP_STORES = {
+    'database': DatabaseOTPStore,
+    'cache': CacheOTPStore,
+}
+
+
+def get_otp_store():
+    """The OTPStore selected by SUBMISSIONS_OTP_STORE"""
+    name = getattr(settings, 'SUBMISSIONS_OTP_STORE', 'database')
+    store_class = OTP_STORES[name] if name in OTP_STORES else import_string(name)
+    return store_class()
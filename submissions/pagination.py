@@ -0,0 +1,152 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class SubmissionCursorPagination(BasePagination):
+    """
+    Keyset (cursor) pagination on (created_at, submission_id), newest first.
+
+    Each page is fetched with a WHERE clause on the last seen key instead of
+    an OFFSET, so page N costs the same as page 1. Cursors are opaque tokens
+    returned in the `next` / `previous` links.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    paginate_query_param = 'paginate'
+    invalid_cursor_message = 'Cursor غير صالح'
+
+    def __init__(self):
+        self.page_size = getattr(settings, 'SUBMISSIONS_PAGE_SIZE', 50)
+        self.max_page_size = getattr(settings, 'SUBMISSIONS_MAX_PAGE_SIZE', 500)
+
+    # Query params
+
+    def is_disabled(self, request):
+        """Unpaginated responses are opt-in via ?paginate=false"""
+        value = request.query_params.get(self.paginate_query_param, '')
+        return value.lower() in ('false', '0', 'no')
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError, TypeError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    # Cursor encoding
+
+    def encode_cursor(self, created_at, submission_id, reverse):
+        payload = json.dumps([created_at.isoformat(), submission_id, int(reverse)])
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            created_at, submission_id, reverse = json.loads(base64.urlsafe_b64decode(padded))
+            created_at = parse_datetime(created_at)
+            if created_at is None:
+                raise ValueError
+            return created_at, int(submission_id), bool(reverse)
+        except (TypeError, ValueError, json.JSONDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def get_position(item):
+        """Return the (created_at, submission_id) key of a model instance or a values() row"""
+        if isinstance(item, dict):
+            return item['created_at'], item['submission_id']
+        return item.created_at, item.submission_id
+
+    # Pagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.is_disabled(request):
+            return None
+
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor[2])
+
+        if reverse:
+            queryset = queryset.order_by('created_at', 'submission_id')
+        else:
+            queryset = queryset.order_by('-created_at', '-submission_id')
+
+        if cursor:
+            created_at, submission_id = cursor[0], cursor[1]
+            if reverse:
+                queryset = queryset.filter(
+                    Q(created_at__gt=created_at) |
+                    Q(created_at=created_at, submission_id__gt=submission_id)
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(created_at__lt=created_at) |
+                    Q(created_at=created_at, submission_id__lt=submission_id)
+                )
+
+        # نجلب عنصراً إضافياً لمعرفة إن كانت هناك صفحة تالية
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+
+        if reverse:
+            results.reverse()
+            self.has_next = cursor is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        self.page = results
+        return results
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        created_at, submission_id = self.get_position(self.page[-1])
+        cursor = self.encode_cursor(created_at, submission_id, reverse=False)
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        created_at, submission_id = self.get_position(self.page[0])
+        cursor = self.encode_cursor(created_at, submission_id, reverse=True)
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
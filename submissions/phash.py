@@ -0,0 +1,231 @@
+"""
+Perceptual hashes of submission images and a near-duplicate index.
+
+The 64-bit pHash (low frequencies of a 32x32 DCT) changes little when a
+photo is re-encoded, resized or slightly cropped, so re-submitted meter
+photos end up within a small Hamming distance of the original.
+
+Lookup uses multi-index hashing: the hash is split into SEGMENTS
+16-bit segments stored in indexed columns. If two hashes differ in at
+most `d` bits, at least one segment differs in at most d // SEGMENTS
+bits, so probing every segment with its neighbours within that radius
+finds all candidates through index lookups instead of a full scan.
+"""
+import logging
+import math
+import statistics
+from collections import defaultdict
+from itertools import combinations
+
+from django.conf import settings
+from django.db.models import Q
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+HASH_BITS = 64
+SEGMENTS = 4
+SEGMENT_BITS = HASH_BITS // SEGMENTS
+SEGMENT_MASK = (1 << SEGMENT_BITS) - 1
+# hashes looked up per query (each adds up to a few hundred IN values)
+LOOKUP_GROUP = 8
+
+DCT_SIZE = 32
+DCT_LOW = 8
+_DCT_BASIS = [
+    [math.cos(math.pi * k * (2 * n + 1) / (2 * DCT_SIZE)) for n in range(DCT_SIZE)]
+    for k in range(DCT_LOW)
+]
+
+
+def get_max_distance():
+    return getattr(settings, 'SUBMISSIONS_DUPLICATE_MAX_DISTANCE', 8)
+
+
+def compute_phash(file):
+    """Return the 64-bit perceptual hash (unsigned int) of an image file object"""
+    file.seek(0)
+    with Image.open(file) as image:
+        # JPEG decoder downscales while decoding
+        image.draft('L', (DCT_SIZE * 4, DCT_SIZE * 4))
+        image = ImageOps.exif_transpose(image).convert('L')
+        pixels = list(image.resize((DCT_SIZE, DCT_SIZE), Image.Resampling.LANCZOS).getdata())
+    file.seek(0)
+
+    rows = [pixels[i * DCT_SIZE:(i + 1) * DCT_SIZE] for i in range(DCT_SIZE)]
+    # 2D DCT-II, only the DCT_LOW x DCT_LOW low frequencies are needed
+    rows_dct = [[sum(c * p for c, p in zip(basis, row)) for basis in _DCT_BASIS] for row in rows]
+    coefficients = [
+        sum(_DCT_BASIS[u][r] * rows_dct[r][v] for r in range(DCT_SIZE))
+        for u in range(DCT_LOW) for v in range(DCT_LOW)
+    ]
+    # the DC term only reflects overall brightness
+    median = statistics.median(coefficients[1:])
+
+    value = 0
+    for coefficient in coefficients:
+        value = (value << 1) | (coefficient > median)
+    return value
+
+
+def to_signed(value):
+    """Unsigned 64-bit hash -> value storable in a BigIntegerField"""
+    return value - (1 << HASH_BITS) if value >= 1 << (HASH_BITS - 1) else value
+
+
+def to_unsigned(value):
+    return value + (1 << HASH_BITS) if value < 0 else value
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+def hash_segments(value):
+    """Split a hash into SEGMENTS integers, most significant first"""
+    return [
+        (value >> (SEGMENT_BITS * (SEGMENTS - 1 - i))) & SEGMENT_MASK
+        for i in range(SEGMENTS)
+    ]
+
+
+def segment_neighbours(segment, radius):
+    """Every segment value within `radius` bits of `segment`"""
+    values = [segment]
+    for flips in range(1, radius + 1):
+        for bits in combinations(range(SEGMENT_BITS), flips):
+            mask = 0
+            for bit in bits:
+                mask |= 1 << bit
+            values.append(segment ^ mask)
+    return values
+
+
+def hash_fields(value):
+    """Submission field values for the hash `value`"""
+    fields = {'image_phash': to_signed(value)}
+    for index, segment in enumerate(hash_segments(value)):
+        fields[f'phash_segment_{index}'] = segment
+    return fields
+
+
+def find_near_duplicates(values, max_distance=None, exclude_ids=()):
+    """
+    Return the closest indexed image for each hash in `values` as
+    (submission_id, distance) or None. Ties go to the oldest row.
+    Hashes are looked up LOOKUP_GROUP at a time, one query per group.
+
+    Every candidate is compared (streamed, not sliced: an arbitrary subset
+    could miss the closest match); a warning is logged when a group has
+    more than SUBMISSIONS_DUPLICATE_MAX_CANDIDATES per hash, which points
+    at degenerate hashes such as blank photos.
+    """
+    from .models import Submission
+
+    if max_distance is None:
+        max_distance = get_max_distance()
+    radius = max_distance // SEGMENTS
+    limit = getattr(settings, 'SUBMISSIONS_DUPLICATE_MAX_CANDIDATES', 10000)
+
+    results = []
+    for start in range(0, len(values), LOOKUP_GROUP):
+        group = values[start:start + LOOKUP_GROUP]
+        probes = [set() for _ in range(SEGMENTS)]
+        for value in group:
+            for index, segment in enumerate(hash_segments(value)):
+                probes[index].update(segment_neighbours(segment, radius))
+
+        query = Q()
+        for index, segments in enumerate(probes):
+            query |= Q(**{f'phash_segment_{index}__in': sorted(segments)})
+        candidates = Submission.objects.filter(query).values_list('submission_id', 'image_phash')
+
+        best = [None] * len(group)
+        scanned = 0
+        for submission_id, candidate in candidates.iterator(chunk_size=2000):
+            scanned += 1
+            if submission_id in exclude_ids:
+                continue
+            candidate = to_unsigned(candidate)
+            for position, value in enumerate(group):
+                distance = hamming(value, candidate)
+                match = best[position]
+                if distance <= max_distance and (match is None or (distance, submission_id) < (match[1], match[0])):
+                    best[position] = (submission_id, distance)
+        if scanned > limit * len(group):
+            logger.warning('Near-duplicate lookup compared %d candidates for %d hashes', scanned, len(group))
+        results.extend(best)
+    return results
+
+
+def find_near_duplicate(value, max_distance=None, exclude_id=None):
+    """Closest indexed image within `max_distance` bits of `value`, or None"""
+    exclude_ids = () if exclude_id is None else (exclude_id,)
+    return find_near_duplicates([value], max_distance, exclude_ids)[0]
+
+
+def hash_submission_images(instances):
+    """Set the hash fields of each instance from its image_url; returns [(instance, hash)]"""
+    hashed = []
+    for instance in instances:
+        try:
+            value = compute_phash(instance.image_url)
+        except Exception:
+            logger.warning('Could not hash image for submission %s', instance.pk, exc_info=True)
+            continue
+        for field, field_value in hash_fields(value).items():
+            setattr(instance, field, field_value)
+        hashed.append((instance, value))
+    return hashed
+
+
+def flag_near_duplicates(hashed):
+    """Set duplicate_of/duplicate_distance of each (instance, hash) from the indexed rows"""
+    exclude_ids = {instance.pk for instance, _ in hashed if instance.pk is not None}
+    matches = find_near_duplicates([value for _, value in hashed], exclude_ids=exclude_ids)
+    for (instance, _), match in zip(hashed, matches):
+        instance.duplicate_of_id, instance.duplicate_distance = match or (None, None)
+
+
+def index_submission_images(instances):
+    """Hash each instance's image_url and flag its closest near-duplicate"""
+    flag_near_duplicates(hash_submission_images(instances))
+
+
+def batch_waves(values, max_distance=None):
+    """
+    Split the positions of `values` into insertion waves: a hash within
+    `max_distance` bits of an earlier hash of the batch goes one wave
+    after the earliest wave holding such a hash.
+    """
+    if max_distance is None:
+        max_distance = get_max_distance()
+    levels = []
+    for position, value in enumerate(values):
+        earlier = [levels[i] for i in range(position) if hamming(values[i], value) <= max_distance]
+        levels.append(min(earlier) + 1 if earlier else 0)
+    waves = defaultdict(list)
+    for position, level in enumerate(levels):
+        waves[level].append(position)
+    return [waves[level] for level in sorted(waves)]
+
+
+def insert_indexed_batch(instances, hashed, insert):
+    """
+    Flag near-duplicates of a batch of new rows and insert them with
+    `insert(list of instances)`.
+
+    `hashed` is [(instance, hash)] for the instances with a hash, as
+    returned by hash_submission_images(instances). Copies inside the batch
+    itself are inserted in a later wave than their original, after a
+    lookup that sees it, so they are flagged as well. Usually one wave, or
+    two when the batch holds copies.
+    """
+    wave_of = {}
+    for number, wave in enumerate(batch_waves([value for _, value in hashed])):
+        for position in wave:
+            wave_of[id(hashed[position][0])] = number
+    # الصفوف بلا بصمة لا تُقارن، فتُدرج مع الموجة الأولى
+    for number in range(max(wave_of.values(), default=0) + 1):
+        flag_near_duplicates([(instance, value) for instance, value in hashed if wave_of[id(instance)] == number])
+        insert([instance for instance in instances if wave_of.get(id(instance), 0) == number])
@@ -2,13 +2,18 @@ from rest_framework import serializers
 from django.contrib.auth import authenticate
 from django.utils import timezone
 from datetime import timedelta
-import hashlib
 import secrets
 
-from .models import User, OtpCode, Category, Submission
+from .models import User, Category, Submission, Upload
+from .caching import category_cache
+from .images import DERIVATIVE_FIELDS
+from .metrics import TimedSerializerMixin
+from .otp import VERIFIED, get_otp_store, hash_code
+from .phash import index_submission_images
+from .uploads import close_uploads, open_upload, release_uploads
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for User model"""
     class Meta:
         model = User
@@ -16,26 +21,32 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ['user_id', 'created_at']
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for Category model"""
     class Meta:
         model = Category
         fields = ['category_id', 'name_ar', 'name_en']
 
 
-class SubmissionSerializer(serializers.ModelSerializer):
+class SubmissionSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for Submission model"""
     user = UserSerializer(read_only=True)
     category = CategorySerializer(read_only=True)
     image_url = serializers.SerializerMethodField()
     invoice_image = serializers.SerializerMethodField()
+    image_thumbnail = serializers.SerializerMethodField()
+    image_web = serializers.SerializerMethodField()
+    invoice_thumbnail = serializers.SerializerMethodField()
+    invoice_web = serializers.SerializerMethodField()
 
     class Meta:
         model = Submission
         fields = [
             'submission_id', 'user', 'category', 'image_url',
             'notes', 'latitude', 'longitude', 'counter_number',
-            'consumption_number', 'invoice_image', 'created_at'
+            'consumption_number', 'invoice_image',
+            'image_thumbnail', 'image_web', 'invoice_thumbnail', 'invoice_web',
+            'created_at'
         ]
         read_only_fields = ['submission_id', 'created_at']
 
@@ -51,18 +62,76 @@ class SubmissionSerializer(serializers.ModelSerializer):
             return obj.invoice_image.url
         return None
 
+    def get_image_thumbnail(self, obj):
+        """Return relative path for the image thumbnail (None until generated)"""
+        if obj.image_thumbnail:
+            return obj.image_thumbnail.url
+        return None
+
+    def get_image_web(self, obj):
+        """Return relative path for the web-sized image (None until generated)"""
+        if obj.image_web:
+            return obj.image_web.url
+        return None
+
+    def get_invoice_thumbnail(self, obj):
+        """Return relative path for the invoice thumbnail (None until generated)"""
+        if obj.invoice_thumbnail:
+            return obj.invoice_thumbnail.url
+        return None
+
+    def get_invoice_web(self, obj):
+        """Return relative path for the web-sized invoice (None until generated)"""
+        if obj.invoice_web:
+            return obj.invoice_web.url
+        return None
+
+
+class SubmissionUpdateSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Serializer for updating submissions, images included"""
+
+    class Meta:
+        model = Submission
+        fields = [
+            'image_url', 'notes', 'latitude', 'longitude',
+            'counter_number', 'consumption_number', 'invoice_image'
+        ]
+        extra_kwargs = {'image_url': {'required': False}}
+
+    def update(self, instance, validated_data):
+        # النسخ المصغرة القديمة لم تعد صالحة عند استبدال الصورة
+        for source_field, targets in DERIVATIVE_FIELDS.items():
+            if source_field in validated_data:
+                for target_field in targets.values():
+                    setattr(instance, target_field, None)
+        if validated_data.get('image_url'):
+            instance.image_url = validated_data['image_url']
+            index_submission_images([instance])
+        return super().update(instance, validated_data)
+
+    def to_representation(self, instance):
+        return SubmissionSerializer(instance, context=self.context).data
+
 
-class SubmissionCreateSerializer(serializers.ModelSerializer):
+class SubmissionCreateSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     """Serializer for creating new submissions"""
     category_id = serializers.IntegerField(write_only=True)
     created_at = serializers.DateTimeField(required=False, allow_null=True)
+    # بديل عن رفع الملف مباشرة: معرف رفع مجزأ مكتمل (submissions/uploads.py)
+    image_upload_id = serializers.UUIDField(write_only=True, required=False)
+    invoice_upload_id = serializers.UUIDField(write_only=True, required=False)
+
+    upload_fields = {'image_upload_id': 'image_url', 'invoice_upload_id': 'invoice_image'}
 
     class Meta:
         model = Submission
         fields = [
             'category_id', 'image_url', 'notes', 'latitude', 'longitude',
-            'counter_number', 'consumption_number', 'invoice_image', 'created_at'
+            'counter_number', 'consumption_number', 'invoice_image', 'created_at',
+            'image_upload_id', 'invoice_upload_id', 'duplicate_of', 'duplicate_distance'
         ]
+        read_only_fields = ['duplicate_of', 'duplicate_distance']
+        extra_kwargs = {'image_url': {'required': False}}
 
     def validate_created_at(self, value):
         """Validate that created_at is not in the future and not too old"""
@@ -82,29 +151,132 @@ class SubmissionCreateSerializer(serializers.ModelSerializer):
         
         return value
 
-    def create(self, validated_data):
+    def validate_category_id(self, value):
+        """Validate category_id against the cached categories"""
+        if not category_cache.exists(value):
+            raise serializers.ValidationError("الفئة غير موجودة")
+        return value
+
+    def validate(self, data):
+        """Resolve upload ids to their finalized files"""
+        self.attached_uploads = []
+        try:
+            for upload_field, file_field in self.upload_fields.items():
+                upload_id = data.pop(upload_field, None)
+                if upload_id is None:
+                    continue
+                if data.get(file_field):
+                    raise serializers.ValidationError({upload_field: "لا يمكن إرسال الملف ومعرف الرفع معاً"})
+
+                upload = Upload.objects.filter(
+                    upload_id=upload_id,
+                    user=self.context['request'].user,
+                    completed_at__isnull=False,
+                ).first()
+                if upload is None:
+                    raise serializers.ValidationError({upload_field: "الرفع غير موجود أو غير مكتمل"})
+
+                data[file_field] = open_upload(upload)
+                self.attached_uploads.append((data[file_field], upload))
+
+            if not data.get('image_url'):
+                raise serializers.ValidationError({'image_url': "صورة التقديم مطلوبة"})
+        except serializers.ValidationError:
+            self.close_uploads()
+            raise
+        return data
+
+    def release_uploads(self):
+        """Discard the uploads attached to this submission once it is committed"""
+        if getattr(self, 'attached_uploads', None):
+            release_uploads(self.attached_uploads)
+
+    def close_uploads(self):
+        """Close the attached upload files; call it whether or not the save succeeded"""
+        if getattr(self, 'attached_uploads', None):
+            close_uploads(self.attached_uploads)
+
+    def build_instance(self, validated_data, find_duplicates=True):
+        """
+        Return an unsaved Submission for the request user.
+
+        With find_duplicates=False the caller hashes and flags the images
+        itself (the batch endpoint looks up all items together, see
+        insert_indexed_batch).
+        """
         from django.utils import timezone
         
+        validated_data = dict(validated_data)
         category_id = validated_data.pop('category_id')
         user = self.context['request'].user
-        category = Category.objects.get(category_id=category_id)
         
         # إذا لم يتم إرسال created_at، استخدم الوقت الحالي
         created_at = validated_data.pop('created_at', None)
         if not created_at:
             created_at = timezone.now()
         
-        return Submission.objects.create(
+        instance = Submission(
             user=user, 
-            category=category, 
+            category_id=category_id, 
             created_at=created_at,
             **validated_data
         )
+        if find_duplicates:
+            index_submission_images([instance])
+        return instance
+
+    def create(self, validated_data):
+        try:
+            instance = self.build_instance(validated_data)
+            instance.save(force_insert=True)
+        finally:
+            self.close_uploads()
+        self.release_uploads()
+        return instance
+
+
+class UploadStartSerializer(TimedSerializerMixin, serializers.Serializer):
+    """Serializer for starting a chunked upload"""
+    filename = serializers.CharField(max_length=255)
+    total_size = serializers.IntegerField(min_value=1)
+
+    def validate_filename(self, value):
+        """Accept a plain file name with an image extension only"""
+        import os
+
+        from django.core.validators import get_available_image_extensions
+
+        # الاسم يُمرَّر لاحقاً إلى التخزين، فلا نقبل مسارات
+        if value in ('.', '..') or os.path.basename(value.replace('\\', '/')) != value:
+            raise serializers.ValidationError("اسم الملف غير صالح")
+        extension = os.path.splitext(value)[1][1:].lower()
+        if extension not in get_available_image_extensions():
+            raise serializers.ValidationError("امتداد الملف غير مدعوم")
+        return value
+
+    def validate_total_size(self, value):
+        from django.conf import settings
+
+        max_size = getattr(settings, 'SUBMISSIONS_UPLOAD_MAX_SIZE', 20 * 1024 * 1024)
+        if value > max_size:
+            raise serializers.ValidationError(f"الحجم الأقصى للملف هو {max_size} بايت")
+        return value
+
+
+class UploadSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    """Serializer for chunked upload state"""
+    offset = serializers.IntegerField(source='received_size', read_only=True)
+    completed = serializers.BooleanField(source='is_completed', read_only=True)
+
+    class Meta:
+        model = Upload
+        fields = ['upload_id', 'filename', 'total_size', 'offset', 'completed', 'expires_at']
+        read_only_fields = fields
 
 
 # Authentication Serializers
 
-class OTPSendSerializer(serializers.Serializer):
+class OTPSendSerializer(TimedSerializerMixin, serializers.Serializer):
     """Serializer for sending OTP"""
     phone_number = serializers.CharField(max_length=20)
 
@@ -117,7 +289,7 @@ class OTPSendSerializer(serializers.Serializer):
         return value
 
 
-class OTPVerifySerializer(serializers.Serializer):
+class OTPVerifySerializer(TimedSerializerMixin, serializers.Serializer):
     """Serializer for OTP verification"""
     phone_number = serializers.CharField(max_length=20)
     otp_code = serializers.CharField(max_length=6, min_length=6)
@@ -126,28 +298,13 @@ class OTPVerifySerializer(serializers.Serializer):
         phone_number = data.get('phone_number')
         otp_code = data.get('otp_code')
 
-        try:
-            # Hash the provided OTP code
-            hashed_code = hashlib.sha256(otp_code.encode()).hexdigest()
-
-            # Find valid OTP code
-            otp_obj = OtpCode.objects.filter(
-                phone_number=phone_number,
-                hashed_code=hashed_code,
-                expires_at__gt=timezone.now()
-            ).first()
-
-            if not otp_obj:
-                raise serializers.ValidationError("كود OTP غير صحيح أو منتهي الصلاحية")
-
-            data['otp_obj'] = otp_obj
-            return data
-
-        except OtpCode.DoesNotExist:
-            raise serializers.ValidationError("كود OTP غير صحيح")
+        # التحقق يستهلك الكود (أو يحسب محاولة خاطئة) في خطوة واحدة
+        if get_otp_store().verify(phone_number, hash_code(otp_code)) != VERIFIED:
+            raise serializers.ValidationError("كود OTP غير صحيح أو منتهي الصلاحية")
+        return data
 
 
-class JWTTokenSerializer(serializers.Serializer):
+class JWTTokenSerializer(TimedSerializerMixin, serializers.Serializer):
     """Serializer for JWT token response"""
     access = serializers.CharField()
     refresh = serializers.CharField()
@@ -0,0 +1,79 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .aggregates import release_submission, track_submission
+from .caching import category_cache, submission_versions, user_cache
+from .geo import assign_geo_cell
+from .models import Category, Submission, User
+from .slowqueries import install_slow_query_sampler
+from .storage import release_instance_files, track_instance_files
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_cache(sender, **kwargs):
+    """Any change to the Categories table invalidates the category cache"""
+    category_cache.invalidate()
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_cache(sender, created=False, **kwargs):
+    """Updated or deleted users must not authenticate from a cached row"""
+    if not created:
+        user_cache.invalidate()
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_submission_versions(sender, instance, created=False, **kwargs):
+    """Submission responses embed the user's phone number, so their ETags change with it"""
+    if not created:
+        submission_versions.invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=Submission)
+@receiver(post_delete, sender=Submission)
+def invalidate_submission_versions(sender, instance, **kwargs):
+    """Any change to a user's submissions invalidates their ETags"""
+    submission_versions.invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=Submission)
+def track_submission_files(sender, instance, **kwargs):
+    """Keep media reference counts in line with the saved image fields"""
+    track_instance_files(instance)
+
+
+@receiver(post_delete, sender=Submission)
+def release_submission_files(sender, instance, **kwargs):
+    """A deleted submission no longer references its images"""
+    release_instance_files(instance)
+
+
+@receiver(pre_save, sender=Submission)
+def update_submission_geo_cell(sender, instance, **kwargs):
+    """Keep geo_cell in line with the coordinates"""
+    assign_geo_cell(instance)
+
+
+@receiver(post_save, sender=Submission)
+def track_submission_aggregates(sender, instance, created, **kwargs):
+    """Update the map tiles for a created/moved/recategorized submission"""
+    track_submission(instance, created)
+
+
+@receiver(pre_delete, sender=Submission)
+def release_submission_aggregates(sender, instance, **kwargs):
+    """
+    Remove a submission's contribution before the delete: when a User or
+    Category delete cascades to its submissions, the aggregate rows of that
+    parent are removed (fast delete) before any post_delete is sent.
+    """
+    release_submission(instance)
+
+
+@receiver(connection_created)
+def sample_connection_slow_queries(sender, connection, **kwargs):
+    """Every database connection records its slow queries (submissions/slowqueries.py)"""
+    install_slow_query_sampler(connection)
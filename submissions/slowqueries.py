@@ -0,0 +1,157 @@
+"""
+Slow-query sampler.
+
+`sample_slow_queries` is installed as an execute_wrapper on every
+database connection (see signals.py). Queries slower than
+SUBMISSIONS_SLOW_QUERY_MS are recorded with their normalized SQL and
+fingerprint, the view that ran them and, for SELECTs, the EXPLAIN plan
+(captured at most once per fingerprint every
+SUBMISSIONS_SLOW_QUERY_EXPLAIN_INTERVAL seconds and per process).
+
+Records are logged and kept in a ring buffer of
+SUBMISSIONS_SLOW_QUERY_BUFFER entries in Django's cache, so the
+`slow_queries` command can group them by fingerprint. With more than one
+server process, CACHES must point to a shared backend.
+"""
+import hashlib
+import logging
+import random
+import re
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .metrics import current_view
+
+logger = logging.getLogger(__name__)
+
+# إيقاف العينة أثناء EXPLAIN وكتابة السجل (لا تُقاس استعلاماتهما)
+_sampling = ContextVar('slow_query_sampling', default=False)
+# fingerprint -> monotonic time of its last EXPLAIN (per process)
+_explained = {}
+
+MAX_SQL_LENGTH = 4000
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|\?')
+_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_ROWS = re.compile(r'\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+')
+_SPACE = re.compile(r'\s+')
+
+
+def normalize_sql(sql):
+    """SQL with literals and placeholders replaced, so queries differing only in values match"""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    # IN (?, ?, ...) و VALUES (...), (...) بأي طول
+    sql = _LIST.sub('(...)', sql)
+    sql = _ROWS.sub('(...), ...', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def fingerprint(normalized):
+    return hashlib.sha1(normalized.encode()).hexdigest()[:12]
+
+
+class SlowQueryLog:
+    """Ring buffer of slow-query records in Django's cache"""
+    key_prefix = 'submissions:slowqueries'
+
+    def size(self):
+        return getattr(settings, 'SUBMISSIONS_SLOW_QUERY_BUFFER', 500)
+
+    def add(self, record):
+        counter = f'{self.key_prefix}:counter'
+        cache.add(counter, 0, None)
+        try:
+            position = cache.incr(counter)
+        except ValueError:
+            # العداد حُذف بين add و incr
+            position = 1
+            cache.set(counter, position, None)
+        cache.set(f'{self.key_prefix}:{position % self.size()}', record, 7 * 24 * 60 * 60)
+
+    def records(self):
+        """All buffered records, oldest first"""
+        keys = [f'{self.key_prefix}:{slot}' for slot in range(self.size())]
+        return sorted(cache.get_many(keys).values(), key=lambda record: record['at'])
+
+    def clear(self):
+        cache.delete_many([f'{self.key_prefix}:counter'] + [f'{self.key_prefix}:{slot}' for slot in range(self.size())])
+
+
+slow_query_log = SlowQueryLog()
+
+
+def explain(connection, sql, params):
+    """EXPLAIN output of a SELECT as text (or the database's error message)"""
+    try:
+        # نقطة حفظ: خطأ في EXPLAIN لا يُفسد معاملة الطلب (PostgreSQL)
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+            return '\n'.join(' '.join(str(value) for value in row) for row in cursor.fetchall())
+    except Exception as error:
+        return f'EXPLAIN failed: {error}'
+
+
+def sample_slow_queries(execute, sql, params, many, context):
+    """execute_wrapper recording queries slower than SUBMISSIONS_SLOW_QUERY_MS"""
+    threshold = getattr(settings, 'SUBMISSIONS_SLOW_QUERY_MS', None)
+    if threshold is None or _sampling.get():
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    result = execute(sql, params, many, context)
+    elapsed = (time.perf_counter() - started) * 1000
+    if elapsed < threshold or random.random() >= getattr(settings, 'SUBMISSIONS_SLOW_QUERY_SAMPLE_RATE', 1.0):
+        return result
+
+    token = _sampling.set(True)
+    try:
+        record_slow_query(context['connection'], sql, params, many, elapsed)
+    except Exception:
+        # العينة لا تُفشل الطلب أبداً
+        logger.exception('Could not record a slow query')
+    finally:
+        _sampling.reset(token)
+    return result
+
+
+def record_slow_query(connection, sql, params, many, elapsed):
+    normalized = normalize_sql(sql)[:MAX_SQL_LENGTH]
+    key = fingerprint(normalized)
+    view = current_view()
+
+    plan = None
+    if not many and normalized[:6].upper() == 'SELECT':
+        interval = getattr(settings, 'SUBMISSIONS_SLOW_QUERY_EXPLAIN_INTERVAL', 300)
+        now = time.monotonic()
+        last = _explained.get(key)
+        if last is None or now - last >= interval:
+            _explained[key] = now
+            plan = explain(connection, sql, params)
+
+    logger.warning('Slow query %s (%.0f ms) in %s: %s', key, elapsed, view or '-', normalized)
+    slow_query_log.add({
+        'fingerprint': key,
+        'sql': normalized,
+        'view': view,
+        'database': connection.alias,
+        'ms': round(elapsed, 2),
+        'at': timezone.now().isoformat(),
+        'plan': plan,
+    })
+
+
+def install_slow_query_sampler(connection):
+    """Add the sampler to a connection's execute wrappers (once)"""
+    if sample_slow_queries not in connection.execute_wrappers:
+        # في البداية: connection.execute_wrapper() يزيل آخر عنصر عند الخروج،
+        # والاتصال قد يُفتح داخل طلب بعد أن أضاف RequestMetricsMiddleware غلافه
+        connection.execute_wrappers.insert(0, sample_slow_queries)
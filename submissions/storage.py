@@ -0,0 +1,264 @@
+"""
+Content-addressed, sharded media storage for submission images.
+
+Files are named after the SHA-256 of their bytes inside a two-level
+sharded tree, e.g. `invoices/3f/a2/3fa2...e1.jpg`, so identical uploads
+are stored once and no directory grows past a few thousand entries.
+
+StoredBlob keeps one reference per (row, image field) pointing at a
+file. References are taken/released by the Submission signals and by
+the bulk write paths. Files that drop to zero references are removed by
+`purge_unreferenced_media` after a grace period; saving the same bytes
+again restarts it, so a concurrent upload can't lose its file between
+save() and the reference taken when its row is written.
+"""
+import hashlib
+import os
+import re
+import tempfile
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+HASH_CHUNK_SIZE = 64 * 1024
+CONTENT_ADDRESSED_NAME = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """FileSystemStorage that names files by content hash in a sharded tree"""
+
+    def content_name(self, name, content):
+        """Return the content-addressed name for `content` uploaded as `name`"""
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks(HASH_CHUNK_SIZE):
+            digest.update(chunk if isinstance(chunk, bytes) else chunk.encode())
+        content.seek(0)
+
+        digest = digest.hexdigest()
+        prefix = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(prefix, digest[:2], digest[2:4], f'{digest}{extension}').replace('\\', '/')
+
+    def get_available_name(self, name, max_length=None):
+        # الأسماء تُحسب من المحتوى في _save
+        return name
+
+    def _save(self, name, content):
+        name = self.content_name(name, content)
+        # ملف موجود قد يكون بلا مراجع: protect() يمنع حذفه، أو يكشف أن purge_unreferenced_media سبقنا إليه
+        if not self.exists(name) or self.protect([name]):
+            self._write_new(name, content)
+        return name
+
+    def store(self, name, content):
+        """
+        Store `content` under its content-addressed name without touching
+        the database (worker threads). protect() the returned name before
+        referencing it.
+        """
+        name = self.content_name(name, content)
+        if not self.exists(name):
+            self._write_new(name, content)
+        return name
+
+    def _write_new(self, name, content):
+        """
+        Write to a temporary file next to the target, then rename it into
+        place. Concurrent saves of the same bytes each write their own
+        temporary file and the last rename wins with identical content
+        (FileSystemStorage._save would retry forever on FileExistsError,
+        since get_available_name() returns the same name).
+        """
+        path = self.path(name)
+        directory = os.path.dirname(path)
+        if self.directory_permissions_mode is not None:
+            old_umask = os.umask(0o777 & ~self.directory_permissions_mode)
+            try:
+                os.makedirs(directory, self.directory_permissions_mode, exist_ok=True)
+            finally:
+                os.umask(old_umask)
+        else:
+            os.makedirs(directory, exist_ok=True)
+
+        descriptor, temporary = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(descriptor, 'wb') as destination:
+                content.seek(0)
+                for chunk in content.chunks():
+                    destination.write(chunk if isinstance(chunk, bytes) else chunk.encode())
+            if self.file_permissions_mode is not None:
+                os.chmod(temporary, self.file_permissions_mode)
+            os.replace(temporary, path)
+        except BaseException:
+            os.remove(temporary)
+            raise
+
+    @staticmethod
+    def is_content_addressed(name):
+        return bool(name) and bool(CONTENT_ADDRESSED_NAME.search(name))
+
+    # Reference counting
+
+    def protect(self, names):
+        """
+        Restart the purge grace period of stored files about to be
+        referenced again. Returns the names whose files were purged before
+        that (they must be written again).
+        """
+        from .models import StoredBlob
+
+        # purge_unreferenced_media يتخطى الصفوف المحدّثة حديثاً، وإن كان قد قفل الصف
+        # فهذا التحديث ينتظره ثم يُكتشف الملف المحذوف أدناه
+        StoredBlob.objects.filter(name__in=names, ref_count=0).update(updated_at=timezone.now())
+        return [name for name in names if not self.exists(name)]
+
+    def retain(self, name, count=1):
+        """Add `count` references to a stored file"""
+        from .models import StoredBlob
+
+        if not self.is_content_addressed(name) or count <= 0:
+            return
+        updated = StoredBlob.objects.filter(name=name).update(ref_count=F('ref_count') + count)
+        if updated:
+            return
+        try:
+            with transaction.atomic():
+                StoredBlob.objects.create(name=name, size=self.size(name), ref_count=count)
+        except IntegrityError:
+            StoredBlob.objects.filter(name=name).update(ref_count=F('ref_count') + count)
+
+    def retain_many(self, counts):
+        """Add references for {name: count} with a handful of queries (bulk write paths)"""
+        from .models import StoredBlob
+
+        counts = {name: count for name, count in counts.items() if self.is_content_addressed(name) and count > 0}
+        if not counts:
+            return
+        existing = set(StoredBlob.objects.filter(name__in=counts).values_list('name', flat=True))
+
+        by_count = defaultdict(list)
+        for name in existing:
+            by_count[counts[name]].append(name)
+        for count, names in by_count.items():
+            StoredBlob.objects.filter(name__in=names).update(ref_count=F('ref_count') + count)
+
+        missing = [name for name in counts if name not in existing]
+        if not missing:
+            return
+        try:
+            with transaction.atomic():
+                StoredBlob.objects.bulk_create([
+                    StoredBlob(name=name, size=self.size(name), ref_count=counts[name]) for name in missing
+                ])
+        except IntegrityError:
+            # لحق طلب آخر بإنشاء بعضها
+            for name in missing:
+                self.retain(name, counts[name])
+
+    def release(self, name, count=1):
+        """Drop `count` references; unreferenced files are purged later"""
+        from .models import StoredBlob
+
+        if not self.is_content_addressed(name) or count <= 0:
+            return
+        # update() لا يحدّث auto_now: فترة السماح تبدأ من آخر تحرير
+        StoredBlob.objects.filter(name=name, ref_count__gte=count).update(
+            ref_count=F('ref_count') - count, updated_at=timezone.now(),
+        )
+
+
+_content_addressed_storage = None
+
+
+def submission_media_storage():
+    """Storage for the Submission image fields (callable, so migrations stay stable)"""
+    global _content_addressed_storage
+    if not getattr(settings, 'SUBMISSIONS_CONTENT_ADDRESSED_MEDIA', True):
+        return default_storage
+    if _content_addressed_storage is None:
+        _content_addressed_storage = ContentAddressedStorage()
+    return _content_addressed_storage
+
+
+# Helpers for the write paths
+
+IMAGE_FIELDS = (
+    'image_url', 'invoice_image',
+    'image_thumbnail', 'image_web', 'invoice_thumbnail', 'invoice_web',
+)
+
+
+def _storage():
+    storage = submission_media_storage()
+    return storage if isinstance(storage, ContentAddressedStorage) else None
+
+
+def retain_instance_files(instances):
+    """Take references for every image of newly inserted Submissions (bulk_create paths)"""
+    storage = _storage()
+    if storage is None:
+        return
+    counts = Counter()
+    for instance in instances:
+        instance._loaded_values = {field: getattr(instance, field).name for field in IMAGE_FIELDS}
+        counts.update(name for name in instance._loaded_values.values() if name)
+    storage.retain_many(counts)
+
+
+def discard_files(names):
+    """Hand files saved for rows that changed in the meantime over to the purge"""
+    storage = _storage()
+    if storage is None:
+        # أسماء التخزين العادي فريدة لكل حفظ
+        for name in names:
+            submission_media_storage().delete(name)
+        return
+    for name in names:
+        # صف بعدد مراجع صفر إن لم يكن الملف مستخدماً في مكان آخر
+        storage.retain(name)
+        storage.release(name)
+
+
+def track_instance_files(instance):
+    """Move references from the files loaded from the DB to the files now saved"""
+    storage = _storage()
+    if storage is None:
+        return
+    loaded = getattr(instance, '_loaded_values', None)
+    for field in IMAGE_FIELDS:
+        if loaded is not None and field not in loaded:
+            # حقل مؤجل (deferred) لم يُقرأ ولم يتغير
+            continue
+        old = (loaded or {}).get(field) or None
+        new = getattr(instance, field).name or None
+        if old != new:
+            storage.retain(new)
+            storage.release(old)
+    instance._loaded_values = dict(loaded or {}, **{
+        field: getattr(instance, field).name for field in IMAGE_FIELDS
+    })
+
+
+def release_instance_files(instance):
+    """Drop the references held by a deleted Submission"""
+    storage = _storage()
+    if storage is None:
+        return
+    for field in IMAGE_FIELDS:
+        storage.release(getattr(instance, field).name)
+
+
+def reassign_files(old_names, new_name):
+    """One reference per old name moves to `new_name` (queryset.update() paths)"""
+    storage = _storage()
+    if storage is None:
+        return
+    moved = [name for name in old_names if name != new_name]
+    storage.retain(new_name, len(moved))
+    for name in moved:
+        storage.release(name)
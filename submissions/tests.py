@@ -1,3 +1,1788 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DatabaseError, connection
+from django.http import QueryDict
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import parse_http_date
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import geo
+from . import urls as submission_urls
+from .export import encode_ndjson
+from .filters import filter_submissions
+from .geo import geo_cell, nearby
+from .loadtest import HTTPTransport, build_report, compare_reports, run_load
+from .caching import category_cache, user_cache
+from .checks import check_shared_cache
+from .metrics import registry
+from . import slowqueries
+from .slowqueries import normalize_sql, slow_query_log
+from .models import (
+    User, Category, OtpCode, Submission, StoredBlob, SubmissionTile, Upload, DailySubmissionStats, DailyUserActivity,
+)
+from .phash import batch_waves, find_near_duplicate, hash_fields
+from .images import derivative_pipeline, render_derivatives
+from .storage import ContentAddressedStorage
+from .uploads import open_upload, receive_chunk
+
+
+def make_image(name='photo.jpg', size=(64, 64)):
+    """Return a small in-memory JPEG upload"""
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color=(200, 120, 40)).save(buffer, format='JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+def make_meter_photo(name='meter.jpg', seed=0, size=(400, 300), quality=90, crop=0):
+    """Return a JPEG with a random block pattern, optionally cropped and re-encoded"""
+    import random
+    rng = random.Random(seed)
+    image = Image.new('L', (8, 6))
+    image.putdata([rng.randrange(256) for _ in range(48)])
+    image = image.resize(size, Image.Resampling.NEAREST).convert('RGB')
+    if crop:
+        image = image.crop((crop, crop, size[0] - crop, size[1] - crop))
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=quality)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+class SubmissionQueryPlanTests(TestCase):
+    """Every list filter combination must be served by one of the Submission indexes"""
+
+    FILTER_COMBINATIONS = [
+        '',
+        'category_id=1',
+        'category_ids=1,2,3',
+        'created_after=2025-01-01',
+        'created_before=2025-06-01',
+        'created_after=2025-01-01&created_before=2025-06-01',
+        'category_id=1&created_after=2025-01-01',
+        'category_ids=1,2&created_after=2025-01-01&created_before=2025-06-01',
+        'bbox=33.4,36.2,33.6,36.4',
+        'bbox=33.4,36.2,33.6,36.4&category_id=1',
+        'bbox=33.4,36.2,33.6,36.4&created_after=2025-01-01',
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(phone_number='+963900000001')
+        cls.index_names = [index.name for index in Submission._meta.indexes]
+
+    def assertUsesIndex(self, queryset):
+        plan = queryset.explain()
+        self.assertTrue(
+            any(name in plan for name in self.index_names),
+            f'Query does not use a Submission index:\n{queryset.query}\n{plan}'
+        )
+
+    def test_filter_combinations_use_index(self):
+        for params in self.FILTER_COMBINATIONS:
+            with self.subTest(params=params):
+                queryset = filter_submissions(
+                    Submission.objects.filter(user=self.user), QueryDict(params)
+                ).order_by('-created_at', '-submission_id')
+                self.assertUsesIndex(queryset)
+
+    def test_nearby_uses_geo_index(self):
+        # a spread of rows plus ANALYZE, so the planner has realistic statistics
+        category = Category.objects.create(name_ar='مياه')
+        now = timezone.now()
+        Submission.objects.bulk_create([
+            Submission(user=self.user, category=category, image_url='submissions/x.jpg',
+                       latitude=33 + i % 50 / 10, longitude=36 + i // 50 / 10, created_at=now,
+                       geo_cell=geo_cell(33 + i % 50 / 10, 36 + i // 50 / 10))
+            for i in range(2000)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        for params in ['', f'category_id={category.pk}', f'category_id={category.pk}&created_after=2025-01-01']:
+            with self.subTest(params=params):
+                queryset = filter_submissions(Submission.objects.all(), QueryDict(params))
+                plan = nearby(queryset, 33.5138, 36.2765, 2000).explain()
+                self.assertIn('sub_geo_cat_created_idx', plan)
+
+    def test_invalid_filter_returns_empty(self):
+        for params in ['category_id=abc', 'created_after=yesterday', 'bbox=1,2,3', 'bbox=nan,0,1,1', 'bbox=0,0,1,inf']:
+            with self.subTest(params=params):
+                queryset = filter_submissions(Submission.objects.all(), QueryDict(params))
+                self.assertFalse(queryset.exists())
+
+    def test_non_finite_bbox_endpoints(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        for url, params in [
+            (reverse('submissions:submission_list'), {'bbox': 'nan,0,1,1'}),
+            (reverse('submissions:submission_list'), {'bbox': '0,0,1,inf'}),
+            (reverse('submissions:submission_list'), {'bbox': 'nan,0,1,1', 'paginate': 'false'}),
+            (reverse('submissions:submission_export'), {'bbox': 'nan,0,1,1'}),
+        ]:
+            with self.subTest(url=url, params=params):
+                self.assertEqual(client.get(url, params).status_code, 200)
+
+
+class TempMediaMixin:
+    """Store uploaded files in a temporary MEDIA_ROOT and process images synchronously"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(
+            MEDIA_ROOT=cls.media_root,
+            SUBMISSIONS_UPLOAD_DIR=os.path.join(cls.media_root, 'upload_chunks'),
+            SUBMISSIONS_IMAGE_WORKERS=0,
+        )
+        cls.media_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+
+class QueryBudgetTests(TempMediaMixin, TestCase):
+    """
+    Maximum number of SQL queries per endpoint in submissions/urls.py.
+
+    The list endpoints are measured with many rows so an N+1 regression
+    blows the budget. Every URL name must have an entry here.
+    """
+
+    QUERY_BUDGETS = {
+        # One upsert per code; verification is one conditional DELETE plus
+        # get_or_create of the user (SELECT, then INSERT in a savepoint)
+        'send_otp': {'POST': 1},
+        'verify_otp': {'POST': 5},
+        'refresh_token': {'POST': 1},
+        'user_profile': {'GET': 1},
+        'category_list': {'GET': 2},
+        # Write budgets include the near-duplicate lookup (one query per 8 images),
+        # taking the first reference on a new stored file and creating the
+        # aggregate rows (SubmissionTile, daily rollups) the write is the first
+        # to touch; each aggregate table costs a SELECT plus an UPDATE/INSERT.
+        # Saving an image that is already stored costs one UPDATE restarting
+        # its purge grace period (the batch below sends the same image 10 times,
+        # so its copies are also inserted in a second wave after their own lookup)
+        'submission_list': {'GET': 2, 'POST': 21},
+        'submission_detail': {'GET': 2, 'PUT': 3, 'PATCH': 3, 'DELETE': 18},
+        'submission_export': {'GET': 2},
+        'submission_nearby': {'GET': 2},
+        'submission_tiles': {'GET': 2},
+        'submission_stats': {'GET': 4},
+        'submission_batch_create': {'POST': 34},
+        'upload_start': {'POST': 3},
+        'upload_detail': {'GET': 2, 'PATCH': 5},
+        'upload_finalize': {'POST': 3},
+    }
+    ROWS = 25
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(phone_number='+963900000001')
+        cls.categories = [
+            Category.objects.create(name_ar=f'فئة {i}', name_en=f'Category {i}') for i in range(3)
+        ]
+        now = timezone.now()
+        cls.submissions = Submission.objects.bulk_create([
+            Submission(
+                user=cls.user,
+                category=cls.categories[i % 3],
+                image_url='submissions/photo.jpg',
+                invoice_image='invoices/invoice.jpg' if i % 2 else None,
+                latitude='33.51380000',
+                longitude='36.27650000',
+                geo_cell=geo_cell('33.51380000', '36.27650000'),
+                created_at=now - timezone.timedelta(minutes=i),
+            )
+            for i in range(cls.ROWS)
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.refresh.access_token}')
+        self.submission = Submission.objects.filter(user=self.user).first()
+
+    def assertMaxQueries(self, budget, func, *args, **kwargs):
+        with CaptureQueriesContext(connection) as context:
+            response = func(*args, **kwargs)
+            # Streaming responses run their queries while being consumed
+            if getattr(response, 'streaming', False):
+                response.streamed_content = b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 400, getattr(response, 'data', response))
+        executed = len(context.captured_queries)
+        self.assertLessEqual(
+            executed, budget,
+            f'{executed} queries executed, budget is {budget}:\n' +
+            '\n'.join(query['sql'] for query in context.captured_queries)
+        )
+        return response
+
+    def submission_payload(self):
+        return {
+            'category_id': self.categories[0].category_id,
+            'image_url': make_image(),
+            'latitude': '33.51380000',
+            'longitude': '36.27650000',
+            'notes': 'budget',
+        }
+
+    def test_every_endpoint_has_a_budget(self):
+        names = {pattern.name for pattern in submission_urls.urlpatterns}
+        self.assertEqual(names - set(self.QUERY_BUDGETS), set())
+
+    def test_send_otp(self):
+        budget = self.QUERY_BUDGETS['send_otp']['POST']
+        self.assertMaxQueries(budget, self.client.post, reverse('submissions:send_otp'),
+                              {'phone_number': '+963900000002'})
+
+    def test_verify_otp(self):
+        self.client.post(reverse('submissions:send_otp'), {'phone_number': '+963900000002'})
+        budget = self.QUERY_BUDGETS['verify_otp']['POST']
+        self.assertMaxQueries(budget, self.client.post, reverse('submissions:verify_otp'),
+                              {'phone_number': '+963900000002', 'otp_code': '000000'})
+
+    def test_refresh_token(self):
+        budget = self.QUERY_BUDGETS['refresh_token']['POST']
+        self.assertMaxQueries(budget, self.client.post, reverse('submissions:refresh_token'),
+                              {'refresh': str(self.refresh)})
+
+    def test_user_profile(self):
+        budget = self.QUERY_BUDGETS['user_profile']['GET']
+        self.assertMaxQueries(budget, self.client.get, reverse('submissions:user_profile'))
+
+    def test_category_list(self):
+        budget = self.QUERY_BUDGETS['category_list']['GET']
+        self.assertMaxQueries(budget, self.client.get, reverse('submissions:category_list'))
+
+    def test_submission_list(self):
+        budget = self.QUERY_BUDGETS['submission_list']['GET']
+        url = reverse('submissions:submission_list')
+        response = self.assertMaxQueries(budget, self.client.get, url, {'paginate': 'false'})
+        self.assertEqual(len(response.data), self.ROWS)
+        self.assertMaxQueries(budget, self.client.get, url, {'page_size': 10})
+        self.assertMaxQueries(budget, self.client.get, url, {'category_ids': '1,2'})
+
+    def test_submission_create(self):
+        budget = self.QUERY_BUDGETS['submission_list']['POST']
+        self.assertMaxQueries(budget, self.client.post, reverse('submissions:submission_list'),
+                              self.submission_payload(), format='multipart')
+
+    def test_submission_export(self):
+        budget = self.QUERY_BUDGETS['submission_export']['GET']
+        url = reverse('submissions:submission_export')
+        for output in ('ndjson', 'csv'):
+            response = self.assertMaxQueries(budget, self.client.get, url, {'output': output})
+            lines = response.streamed_content.splitlines()
+            self.assertEqual(len(lines), self.ROWS + (output == 'csv'))
+
+    def test_submission_nearby(self):
+        budget = self.QUERY_BUDGETS['submission_nearby']['GET']
+        response = self.assertMaxQueries(budget, self.client.get, reverse('submissions:submission_nearby'),
+                                         {'lat': '33.5138', 'lng': '36.2765', 'radius': 100, 'limit': 500})
+        self.assertEqual(response.data['count'], self.ROWS)
+
+    def test_submission_tiles(self):
+        budget = self.QUERY_BUDGETS['submission_tiles']['GET']
+        call_command('rebuild_aggregates', stdout=io.StringIO())
+        response = self.assertMaxQueries(budget, self.client.get, reverse('submissions:submission_tiles'),
+                                         {'zoom': 15, 'bbox': '33.4,36.2,33.6,36.4'})
+        self.assertEqual(sum(tile['count'] for tile in response.data['tiles']), self.ROWS)
+
+    def test_submission_stats(self):
+        budget = self.QUERY_BUDGETS['submission_stats']['GET']
+        call_command('rebuild_aggregates', only='rollups', stdout=io.StringIO())
+        response = self.assertMaxQueries(budget, self.client.get, reverse('submissions:submission_stats'))
+        self.assertEqual(response.data['submissions'], self.ROWS)
+
+    def test_submission_batch_create(self):
+        budget = self.QUERY_BUDGETS['submission_batch_create']['POST']
+        items = [
+            {'category_id': self.categories[i % 3].category_id, 'latitude': '33.5', 'longitude': '36.2'}
+            for i in range(10)
+        ]
+        payload = {'items': json.dumps(items)}
+        for index in range(len(items)):
+            payload[f'items[{index}].image_url'] = make_image(f'photo_{index}.jpg')
+        response = self.assertMaxQueries(budget, self.client.post,
+                                         reverse('submissions:submission_batch_create'),
+                                         payload, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 10)
+        first, *copies = response.data['results']
+        self.assertIsNone(first['duplicate_of'])
+        self.assertEqual({result['duplicate_of'] for result in copies}, {first['submission_id']})
+
+    def test_submission_batch_create_without_bulk_returning(self):
+        # MySQL: bulk_create لا يعيد المفاتيح
+        items = [{'category_id': self.categories[0].category_id, 'latitude': '33.5', 'longitude': '36.2'}] * 3
+        payload = {'items': json.dumps(items)}
+        for index in range(len(items)):
+            payload[f'items[{index}].image_url'] = make_image(f'photo_{index}.jpg')
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert',
+                               new_callable=mock.PropertyMock, return_value=False):
+            response = self.client.post(reverse('submissions:submission_batch_create'), payload, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        ids = [result['submission_id'] for result in response.data['results']]
+        self.assertEqual(sorted(ids), sorted(Submission.objects.filter(pk__in=ids).values_list('pk', flat=True)))
+        self.assertEqual(len(set(ids)), 3)
+        name = Submission.objects.get(pk=ids[0]).image_url.name
+        self.assertEqual(StoredBlob.objects.get(name=name).ref_count, 3)
+        self.assertEqual(sum(SubmissionTile.objects.filter(zoom=3).values_list('count', flat=True)), 3)
+
+    def test_chunked_upload(self):
+        budgets = self.QUERY_BUDGETS
+        content = make_image(size=(300, 300)).read()
+        response = self.assertMaxQueries(budgets['upload_start']['POST'], self.client.post,
+                                         reverse('submissions:upload_start'),
+                                         {'filename': 'meter.jpg', 'total_size': len(content)})
+        upload_id = response.data['upload_id']
+        detail_url = reverse('submissions:upload_detail', args=[upload_id])
+
+        half = len(content) // 2
+        for offset, chunk in ((0, content[:half]), (half, content[half:])):
+            self.assertMaxQueries(budgets['upload_detail']['PATCH'], self.client.generic, 'PATCH', detail_url,
+                                  chunk, content_type='application/offset+octet-stream',
+                                  HTTP_UPLOAD_OFFSET=str(offset))
+        response = self.assertMaxQueries(budgets['upload_detail']['GET'], self.client.get, detail_url)
+        self.assertEqual(response.data['offset'], len(content))
+        self.assertMaxQueries(budgets['upload_finalize']['POST'], self.client.post,
+                              reverse('submissions:upload_finalize', args=[upload_id]))
+
+        payload = self.submission_payload()
+        del payload['image_url']
+        payload['image_upload_id'] = upload_id
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('submissions:submission_list'), payload, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertFalse(Upload.objects.filter(upload_id=upload_id).exists())
+
+    def test_submission_detail(self):
+        url = reverse('submissions:submission_detail', args=[self.submission.pk])
+        budgets = self.QUERY_BUDGETS['submission_detail']
+        self.assertMaxQueries(budgets['GET'], self.client.get, url)
+        self.assertMaxQueries(budgets['PATCH'], self.client.patch, url, {'notes': 'patched'},
+                              format='multipart')
+        self.assertMaxQueries(budgets['PUT'], self.client.put, url, {
+            'notes': 'put', 'latitude': '33.51380000', 'longitude': '36.27650000',
+        }, format='multipart')
+        self.assertMaxQueries(budgets['DELETE'], self.client.delete, url)
+
+
+class ChunkedUploadTests(TempMediaMixin, TestCase):
+    """Chunks are received outside the row lock; upload files are always closed"""
+
+    def setUp(self):
+        self.user = User.objects.create(phone_number='+963900000002')
+        self.category = Category.objects.create(name_ar='كهرباء', name_en='Electricity')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.content = make_image(size=(120, 120)).read()
+
+    def start(self, filename='meter.jpg'):
+        return self.client.post(reverse('submissions:upload_start'),
+                                {'filename': filename, 'total_size': len(self.content)})
+
+    def patch(self, upload_id, offset, chunk):
+        return self.client.generic('PATCH', reverse('submissions:upload_detail', args=[upload_id]), chunk,
+                                   content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET=str(offset))
+
+    def test_invalid_filename(self):
+        for filename in ('../meter.jpg', 'dir/meter.jpg', 'dir\\meter.jpg', '..', 'meter.exe', 'meter'):
+            response = self.start(filename)
+            self.assertEqual(response.status_code, 400, filename)
+            self.assertIn('filename', response.data)
+
+    def test_chunk_is_received_outside_the_transaction(self):
+        from . import views
+
+        upload_id = self.start().data['upload_id']
+        depth = len(connection.atomic_blocks)
+        depths = []
+
+        def receive(*args):
+            depths.append(len(connection.atomic_blocks))
+            return receive_chunk(*args)
+
+        with mock.patch.object(views, 'receive_chunk', side_effect=receive):
+            response = self.patch(upload_id, 0, self.content)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(depths, [depth])
+        self.assertEqual(response.data['offset'], len(self.content))
+        staged = [name for name in os.listdir(os.path.join(self.media_root, 'upload_chunks')) if name.startswith(upload_id)]
+        self.assertEqual(staged, [f'{upload_id}.part'])
+
+    def test_offset_claimed_while_receiving(self):
+        from . import views
+
+        upload_id = self.start().data['upload_id']
+
+        def receive(*args):
+            # طلب آخر أكمل الجزء نفسه أثناء الاستلام
+            result = receive_chunk(*args)
+            Upload.objects.filter(upload_id=upload_id).update(received_size=10)
+            return result
+
+        with mock.patch.object(views, 'receive_chunk', side_effect=receive):
+            response = self.patch(upload_id, 0, self.content[:100])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['offset'], 10)
+        staged = [name for name in os.listdir(os.path.join(self.media_root, 'upload_chunks')) if name.startswith(upload_id)]
+        self.assertEqual(staged, [])
+
+    def test_upload_file_closed_when_save_fails(self):
+        from . import serializers
+
+        upload_id = self.start().data['upload_id']
+        self.patch(upload_id, 0, self.content)
+        self.client.post(reverse('submissions:upload_finalize', args=[upload_id]))
+
+        opened = []
+
+        def open_and_track(upload):
+            opened.append(open_upload(upload))
+            return opened[-1]
+
+        payload = {'category_id': self.category.category_id, 'image_upload_id': upload_id,
+                   'latitude': '33.5', 'longitude': '36.2'}
+        with mock.patch.object(serializers, 'open_upload', side_effect=open_and_track), \
+                mock.patch.object(Submission, 'save', side_effect=DatabaseError('boom')):
+            with self.assertRaises(DatabaseError):
+                self.client.post(reverse('submissions:submission_list'), payload, format='multipart')
+        self.assertEqual(len(opened), 1)
+        self.assertTrue(opened[0].closed)
+        self.assertTrue(Upload.objects.filter(upload_id=upload_id).exists())
+
+
+class SharedCacheCheckTests(TestCase):
+    """A process-local default cache is reported unless explicitly allowed"""
+
+    @override_settings(SUBMISSIONS_ALLOW_LOCAL_CACHE=False)
+    def test_local_cache_is_a_warning(self):
+        from django.core.checks import Warning
+
+        messages = check_shared_cache()
+        self.assertEqual([message.id for message in messages], ['submissions.W001'])
+        self.assertIsInstance(messages[0], Warning)
+        # لا يوقف migrate ولا الأوامر الأخرى
+        call_command('check', '--fail-level', 'ERROR', stdout=io.StringIO(), stderr=io.StringIO())
+
+    @override_settings(SUBMISSIONS_ALLOW_LOCAL_CACHE=False, CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/tmp/sm-cache'},
+    })
+    def test_shared_cache(self):
+        self.assertEqual(check_shared_cache(), [])
+
+    @override_settings(SUBMISSIONS_ALLOW_LOCAL_CACHE=True)
+    def test_single_process(self):
+        self.assertEqual(check_shared_cache(), [])
+
+
+class CategoryCacheTests(TestCase):
+    """Category list is served from the version-stamped cache with a strong ETag"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.category = Category.objects.create(name_ar='كهرباء', name_en='Electricity')
+        self.url = reverse('submissions:category_list')
+
+    def test_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_save_invalidates(self):
+        etag = self.client.get(self.url)['ETag']
+        self.category.name_en = 'Power'
+        self.category.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['name_en'], 'Power')
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class SubmissionConditionalGetTests(TempMediaMixin, TestCase):
+    """List/detail answer conditional GETs from the per-user change marker"""
+
+    def setUp(self):
+        self.user = User.objects.create(phone_number='+963900000001')
+        self.category = Category.objects.create(name_ar='مياه', name_en='Water')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        self.list_url = reverse('submissions:submission_list')
+        self.client.post(self.list_url, {
+            'category_id': self.category.category_id, 'image_url': make_image(),
+            'latitude': '33.51380000', 'longitude': '36.27650000',
+        }, format='multipart')
+        self.submission = Submission.objects.get(user=self.user)
+
+    def test_unchanged_list_is_not_modified(self):
+        etag = self.client.get(self.list_url)['ETag']
+        # No query at all: the user comes from the user cache
+        with self.assertNumQueries(0):
+            response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_writes_invalidate_marker(self):
+        detail_url = reverse('submissions:submission_detail', args=[self.submission.pk])
+        list_etag = self.client.get(self.list_url)['ETag']
+        detail_etag = self.client.get(detail_url)['ETag']
+
+        self.client.patch(detail_url, {'notes': 'changed'}, format='multipart')
+        self.assertEqual(self.client.get(self.list_url, HTTP_IF_NONE_MATCH=list_etag).status_code, 200)
+        response = self.client.get(detail_url, HTTP_IF_NONE_MATCH=detail_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['notes'], 'changed')
+
+        list_etag = self.client.get(self.list_url)['ETag']
+        self.client.delete(detail_url)
+        self.assertEqual(self.client.get(self.list_url, HTTP_IF_NONE_MATCH=list_etag).status_code, 200)
+
+    def test_phone_number_change_invalidates(self):
+        detail_url = reverse('submissions:submission_detail', args=[self.submission.pk])
+        list_etag = self.client.get(self.list_url)['ETag']
+        detail_etag = self.client.get(detail_url)['ETag']
+        self.user.phone_number = '+963900000009'
+        self.user.save()
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['user']['phone_number'], '+963900000009')
+        self.assertEqual(self.client.get(detail_url, HTTP_IF_NONE_MATCH=detail_etag).status_code, 200)
+
+    def test_category_rename_invalidates(self):
+        list_etag = self.client.get(self.list_url)['ETag']
+        self.category.name_ar = 'مياه الشرب'
+        self.category.save()
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['category']['name_ar'], 'مياه الشرب')
+        self.assertGreaterEqual(parse_http_date(response['Last-Modified']), category_cache.get_marker().modified_at)
+
+
+class FastPathTests(TestCase):
+    """The fast read path must render the same bytes as SubmissionSerializer"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(phone_number='+963900000001')
+        category = Category.objects.create(name_ar='صرف صحي', name_en=None)
+        Submission.objects.create(
+            user=user, category=category, image_url='submissions/a b.jpg',
+            invoice_image='invoices/فاتورة.jpg', notes='ملاحظة\u2028سطر "جديد"',
+            latitude='-33.5', longitude='136.12345678', counter_number='42',
+            created_at=timezone.now(),
+        )
+        Submission.objects.create(
+            user=user, category=category, image_url='submissions/b.jpg',
+            latitude='0', longitude='0', created_at=timezone.now() - timezone.timedelta(days=3),
+        )
+
+    def test_byte_compatible(self):
+        from rest_framework.renderers import JSONRenderer
+        from .fastpath import FastJSONRenderer, SUBMISSION_VALUE_FIELDS, serialize_submission_rows
+        from .serializers import SubmissionSerializer
+
+        queryset = Submission.objects.select_related('user', 'category').order_by('submission_id')
+        expected = JSONRenderer().render(SubmissionSerializer(queryset, many=True).data)
+        rows = serialize_submission_rows(queryset.values(*SUBMISSION_VALUE_FIELDS))
+        self.assertEqual(FastJSONRenderer().render(rows), expected)
+
+
+class SubmissionPaginationTests(TestCase):
+    """Cursor links walk the list newest first in both directions; bad cursors are rejected"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(phone_number='+963900000001')
+        category = Category.objects.create(name_ar='مياه', name_en='Water')
+        now = timezone.now().replace(microsecond=0)
+        # ثلاثة صفوف بنفس الوقت: الترتيب يعتمد على submission_id عند التساوي
+        for minutes in (0, 5, 5, 5, 10, 20, 30):
+            Submission.objects.create(
+                user=cls.user, category=category, image_url='submissions/x.jpg',
+                latitude='33.5', longitude='36.2', created_at=now - timezone.timedelta(minutes=minutes),
+            )
+        cls.expected = list(
+            Submission.objects.order_by('-created_at', '-submission_id').values_list('submission_id', flat=True)
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('submissions:submission_list')
+
+    def ids(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [row['submission_id'] for row in response.json()['results']]
+
+    def test_round_trip(self):
+        pages, response = [], self.client.get(self.url, {'page_size': 3})
+        while True:
+            pages.append(self.ids(response))
+            if not response.json()['next']:
+                break
+            response = self.client.get(response.json()['next'])
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual(sum(pages, []), self.expected)
+
+        for page in reversed(pages[:-1]):
+            response = self.client.get(response.json()['previous'])
+            self.assertEqual(self.ids(response), page)
+        self.assertIsNone(response.json()['previous'])
+
+    def test_invalid_cursor(self):
+        import base64
+
+        def encode(payload):
+            return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+        for cursor in [
+            'not a cursor!', base64.urlsafe_b64encode(b'\xff\xfe').decode(), encode({'a': 1}),
+            encode(['yesterday', 1, 0]), encode(['2026-01-01T00:00:00+00:00', 'x', 0]),
+            encode(['2026-01-01T00:00:00+00:00', 1]), encode(['2026-13-45T00:00:00+00:00', 1, 0]),
+        ]:
+            with self.subTest(cursor=cursor):
+                response = self.client.get(self.url, {'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+                self.assertEqual(response.json()['detail'], 'Cursor غير صالح')
+
+
+class IdempotencyTests(TempMediaMixin, TestCase):
+    """Retried creates with the same Idempotency-Key replay the first response"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(phone_number='+963900000001')
+        self.category = Category.objects.create(name_ar='مياه', name_en='Water')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        self.url = reverse('submissions:submission_list')
+
+    def post(self, key, notes='retry'):
+        return self.client.post(self.url, {
+            'category_id': self.category.category_id, 'image_url': make_image(),
+            'latitude': '33.51380000', 'longitude': '36.27650000', 'notes': notes,
+        }, format='multipart', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_replay(self):
+        first = self.post('key-1')
+        self.assertEqual(first.status_code, 201)
+        # The replay runs no query (the user comes from the user cache)
+        with self.assertNumQueries(0):
+            replay = self.post('key-1')
+        self.assertEqual(replay.status_code, 201)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(replay.json(), first.json())
+        self.assertEqual(Submission.objects.count(), 1)
+
+    def test_key_reused_for_different_request(self):
+        self.post('key-2')
+        self.assertEqual(self.post('key-2', notes='other').status_code, 422)
+        self.assertEqual(Submission.objects.count(), 1)
+
+
+class ImageDerivativeTests(TempMediaMixin, TestCase):
+    """Derivatives are generated after upload and regenerated when an image is replaced"""
+
+    def setUp(self):
+        self.user = User.objects.create(phone_number='+963900000001')
+        self.category = Category.objects.create(name_ar='مياه', name_en='Water')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def test_generate_and_regenerate(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('submissions:submission_list'), {
+                'category_id': self.category.category_id, 'image_url': make_image(size=(2000, 1000)),
+                'latitude': '33.51380000', 'longitude': '36.27650000',
+            }, format='multipart')
+        submission = Submission.objects.get(user=self.user)
+        self.assertEqual(submission.image_thumbnail.width, 320)
+        self.assertEqual(submission.image_web.width, 1600)
+        self.assertFalse(submission.invoice_thumbnail)
+
+        detail_url = reverse('submissions:submission_detail', args=[submission.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(detail_url, {'image_url': make_image('new.jpg', size=(500, 1000))},
+                                         format='multipart')
+        self.assertIsNone(response.json()['image_thumbnail'])
+        old_thumbnail = submission.image_thumbnail.name
+        data = self.client.get(detail_url).json()
+        self.assertNotIn(old_thumbnail, data['image_thumbnail'])
+        submission.refresh_from_db()
+        self.assertEqual(submission.image_thumbnail.height, 320)
+
+
+    def test_regenerate_missing(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('submissions:submission_list'), {
+                'category_id': self.category.category_id, 'image_url': make_image(size=(800, 600)),
+                'invoice_image': make_image('invoice.jpg', size=(600, 800)),
+                'latitude': '33.51380000', 'longitude': '36.27650000',
+            }, format='multipart')
+        submission = Submission.objects.get(user=self.user)
+        thumbnail = submission.image_thumbnail.name
+        # مهمة ضاعت: الأعمدة فارغة والملف لم يعد له مرجع
+        Submission.objects.filter(pk=submission.pk).update(image_thumbnail=None, image_web=None)
+        StoredBlob.objects.filter(name=thumbnail).update(ref_count=0)
+
+        out = io.StringIO()
+        with mock.patch('submissions.management.commands.regenerate_derivatives.render_derivatives',
+                        wraps=render_derivatives) as render:
+            call_command('regenerate_derivatives', stdout=out)
+        self.assertEqual(render.call_count, 1)
+        self.assertIn('Generated derivatives for 1 images (0 failed)', out.getvalue())
+        submission.refresh_from_db()
+        self.assertEqual(submission.image_thumbnail.name, thumbnail)
+        self.assertEqual(StoredBlob.objects.get(name=thumbnail).ref_count, 1)
+
+    def test_source_replaced_while_storing(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('submissions:submission_list'), {
+                'category_id': self.category.category_id, 'image_url': make_image(size=(800, 600)),
+                'latitude': '33.51380000', 'longitude': '36.27650000',
+            }, format='multipart')
+        submission = Submission.objects.get(user=self.user)
+        path = submission.image_url.path
+        derivatives = render_derivatives(path, {'thumbnail': {'size': (100, 100), 'quality': 50}})
+        rows = Submission.objects.filter(image_url=submission.image_url.name)
+
+        def replace_source(*args, **kwargs):
+            # الصورة استُبدلت بعد قراءة الصف وقبل تحديثه
+            Submission.objects.filter(pk=submission.pk).update(image_url='submissions/other.jpg')
+            return original_select(*args, **kwargs)
+
+        original_select = type(rows).select_for_update
+        with mock.patch.object(type(rows), 'select_for_update', autospec=True, side_effect=replace_source):
+            derivative_pipeline.store('image_url', submission.image_url.name, derivatives)
+        blob = StoredBlob.objects.exclude(
+            name__in=Submission.objects.values_list('image_thumbnail', flat=True)
+        ).get(name__startswith='derivatives/thumbnails/')
+        self.assertEqual(blob.ref_count, 0)
+
+
+class ContentAddressedMediaTests(TempMediaMixin, TestCase):
+    """Identical images are stored once and reference counts follow the rows"""
+
+    def setUp(self):
+        self.user = User.objects.create(phone_number='+963900000001')
+        self.category = Category.objects.create(name_ar='مياه', name_en='Water')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def create(self, image):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('submissions:submission_list'), {
+                'category_id': self.category.category_id, 'image_url': image,
+                'latitude': '33.51380000', 'longitude': '36.27650000',
+            }, format='multipart')
+        return Submission.objects.latest('submission_id')
+
+    def ref_count(self, name):
+        return StoredBlob.objects.get(name=name).ref_count
+
+    def test_dedup_and_refcount(self):
+        first = self.create(make_image('a.jpg'))
+        second = self.create(make_image('b.jpg'))
+        self.assertEqual(first.image_url.name, second.image_url.name)
+        self.assertRegex(first.image_url.name, r'^submissions/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$')
+        self.assertEqual(self.ref_count(first.image_url.name), 2)
+        self.assertEqual(self.ref_count(first.image_thumbnail.name), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('submissions:submission_detail', args=[second.pk]),
+                              {'image_url': make_image(size=(80, 80))}, format='multipart')
+        second.refresh_from_db()
+        self.assertEqual(self.ref_count(first.image_url.name), 1)
+        self.assertEqual(self.ref_count(second.image_url.name), 1)
+
+        first.delete()
+        self.assertEqual(self.ref_count(first.image_url.name), 0)
+        call_command('purge_unreferenced_media', grace=0, stdout=io.StringIO())
+        self.assertFalse(StoredBlob.objects.filter(name=first.image_url.name).exists())
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, first.image_url.name)))
+        self.assertTrue(os.path.exists(second.image_url.path))
+
+    def test_concurrent_saves_of_the_same_bytes(self):
+        import threading
+        storage = ContentAddressedStorage()
+        content = make_meter_photo().read()
+        barrier = threading.Barrier(8)
+        names = []
+
+        def save():
+            barrier.wait()
+            names.append(storage.save('submissions/photo.jpg', SimpleUploadedFile('photo.jpg', content)))
+
+        # exists() False لكل الخيوط: كلها تكتب الملف نفسه في الوقت نفسه
+        with mock.patch.object(ContentAddressedStorage, 'exists', return_value=False):
+            threads = [threading.Thread(target=save, daemon=True) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(timeout=5)
+        self.assertFalse(any(thread.is_alive() for thread in threads))
+        self.assertEqual(len(set(names)), 1)
+        self.assertEqual(len(names), 8)
+        with storage.open(names[0]) as stored:
+            self.assertEqual(stored.read(), content)
+        self.assertEqual(os.listdir(os.path.dirname(storage.path(names[0]))), [os.path.basename(names[0])])
+
+    def test_saving_again_protects_an_unreferenced_file(self):
+        storage = ContentAddressedStorage()
+        content = make_meter_photo().read()
+        name = storage.save('submissions/photo.jpg', SimpleUploadedFile('photo.jpg', content))
+        storage.retain(name)
+        storage.release(name)
+        StoredBlob.objects.filter(name=name).update(updated_at=timezone.now() - timezone.timedelta(hours=2))
+
+        # رفع جديد للمحتوى نفسه قبل إنشاء الصف الذي يأخذ المرجع
+        self.assertEqual(storage.save('submissions/again.jpg', SimpleUploadedFile('again.jpg', content)), name)
+        call_command('purge_unreferenced_media', grace=3600, stdout=io.StringIO())
+        self.assertTrue(storage.exists(name))
+        storage.retain(name)
+        self.assertEqual(self.ref_count(name), 1)
+
+    def test_migrate_legacy_files(self):
+        legacy = 'submissions/legacy.jpg'
+        os.makedirs(os.path.join(self.media_root, 'submissions'), exist_ok=True)
+        with open(os.path.join(self.media_root, legacy), 'wb') as destination:
+            destination.write(make_image().read())
+        Submission.objects.bulk_create([
+            Submission(user=self.user, category=self.category, image_url=legacy,
+                       latitude='33.51380000', longitude='36.27650000', created_at=timezone.now()),
+        ])
+        checkpoint = os.path.join(self.media_root, 'checkpoint.json')
+
+        call_command('migrate_media_to_cas', checkpoint=checkpoint, delete_originals=True, stdout=io.StringIO())
+        submission = Submission.objects.get(user=self.user)
+        self.assertTrue(ContentAddressedStorage.is_content_addressed(submission.image_url.name))
+        self.assertEqual(self.ref_count(submission.image_url.name), 1)
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, legacy)))
+        with open(checkpoint) as saved:
+            self.assertEqual(json.load(saved)['last_id'], submission.pk)
+
+
+class NearDuplicateTests(TempMediaMixin, TestCase):
+    """Re-encoded or cropped copies of an earlier photo are flagged on create"""
+
+    def setUp(self):
+        self.user = User.objects.create(phone_number='+963900000001')
+        self.category = Category.objects.create(name_ar='مياه', name_en='Water')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def create(self, image):
+        return self.client.post(reverse('submissions:submission_list'), {
+            'category_id': self.category.category_id, 'image_url': image,
+            'latitude': '33.51380000', 'longitude': '36.27650000',
+        }, format='multipart').json()
+
+    def test_flags_near_duplicates(self):
+        self.assertIsNone(self.create(make_meter_photo(seed=1))['duplicate_of'])
+        original = Submission.objects.latest('submission_id')
+
+        response = self.create(make_meter_photo(seed=1, size=(800, 600), quality=40, crop=12))
+        self.assertEqual(response['duplicate_of'], original.pk)
+        self.assertLessEqual(response['duplicate_distance'], 8)
+
+        self.assertIsNone(self.create(make_meter_photo(seed=2))['duplicate_of'])
+
+    def test_lookup_finds_every_hash_within_distance(self):
+        now = timezone.now()
+        base = 0x0123456789ABCDEF
+        # 8 flipped bits spread over all segments: no segment matches exactly
+        spread = base ^ sum(1 << bit for bit in (0, 1, 16, 17, 32, 33, 48, 49))
+        Submission.objects.bulk_create([
+            Submission(user=self.user, category=self.category, image_url='submissions/x.jpg',
+                       latitude='0', longitude='0', created_at=now, **hash_fields(value))
+            for value in (spread, base ^ (0x1FF << 55))  # the second one is 9 bits away
+        ])
+        submission_id, distance = find_near_duplicate(base, max_distance=8)
+        self.assertEqual(distance, 8)
+        self.assertEqual(Submission.objects.get(pk=submission_id).image_phash, hash_fields(spread)['image_phash'])
+        self.assertIsNone(find_near_duplicate(base, max_distance=7))
+
+    @override_settings(SUBMISSIONS_DUPLICATE_MAX_CANDIDATES=5)
+    def test_every_candidate_is_compared(self):
+        now = timezone.now()
+        base = 0x0123456789ABCDEF
+        # نفس المقطع الأول وبعيدة في الباقي، ثم التطابق الحقيقي في آخر صف
+        crowd = [base ^ (bits << 16) for bits in range(0xFFFF00000000, 0xFFFF00000000 + 12)]
+        Submission.objects.bulk_create([
+            Submission(user=self.user, category=self.category, image_url='submissions/x.jpg',
+                       latitude='0', longitude='0', created_at=now, **hash_fields(value))
+            for value in crowd + [base ^ 0b11]
+        ])
+        with self.assertLogs('submissions.phash', 'WARNING'):
+            submission_id, distance = find_near_duplicate(base, max_distance=8)
+        self.assertEqual(distance, 2)
+        self.assertEqual(submission_id, Submission.objects.latest('submission_id').pk)
+
+    def test_batch_waves(self):
+        a = 0x0123456789ABCDEF
+        b = a ^ 0b11111       # 5 bits from a
+        c = b ^ (0b11111 << 8)  # 5 bits from b, 10 from a
+        d = ~a & (2 ** 64 - 1)
+        self.assertEqual(batch_waves([a, b, c, d, a], max_distance=8), [[0, 3], [1, 4], [2]])
+
+
+class NearbySubmissionTests(TestCase):
+    """Radius queries return submissions from all users, nearest first"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(phone_number='+963900000001')
+        other = User.objects.create(phone_number='+963900000002')
+        cls.water = Category.objects.create(name_ar='مياه', name_en='Water')
+        cls.power = Category.objects.create(name_ar='كهرباء', name_en='Power')
+        now = timezone.now()
+        # (user, category, latitude, longitude, age in days); ~0, ~150 m, ~1.1 km, ~300 m across a cell edge
+        for user, category, latitude, longitude, days in [
+            (cls.user, cls.water, '33.51380000', '36.27650000', 1),
+            (other, cls.water, '33.51380000', '36.27810000', 1),
+            (other, cls.power, '33.52380000', '36.27650000', 1),
+            (cls.user, cls.water, '33.51110000', '36.27650000', 40),
+        ]:
+            Submission.objects.create(
+                user=user, category=category, image_url='submissions/x.jpg',
+                latitude=latitude, longitude=longitude, created_at=now - timezone.timedelta(days=days),
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        self.url = reverse('submissions:submission_nearby')
+
+    def get(self, **params):
+        return self.client.get(self.url, {'lat': '33.5138', 'lng': '36.2765', **params})
+
+    def test_radius_and_order(self):
+        results = self.get(radius=500).data['results']
+        self.assertEqual([round(item['distance'], -1) for item in results], [0, 150, 300])
+        self.assertEqual(results[0]['category']['name_en'], 'Water')
+        self.assertNotIn('notes', results[0])
+
+        self.assertEqual(self.get(radius=2000).data['count'], 4)
+        self.assertEqual(self.get(radius=2000, limit=2).data['count'], 2)
+
+    def test_limit_applies_after_exact_distance(self):
+        exact = geo.haversine
+
+        def haversine(*args):
+            # أقرب صفين داخل التقريب المستوي لكن خارج المسافة الفعلية
+            distance = exact(*args)
+            return 5000 if distance < 200 else distance
+
+        with mock.patch.object(geo, 'haversine', side_effect=haversine):
+            results = self.get(radius=2000, limit=2).data['results']
+        self.assertEqual([round(item['distance'], -2) for item in results], [300, 1100])
+
+    def test_filters(self):
+        self.assertEqual(self.get(radius=2000, category_id=self.power.pk).data['count'], 1)
+        created_after = (timezone.now() - timezone.timedelta(days=7)).date().isoformat()
+        self.assertEqual(self.get(radius=2000, created_after=created_after).data['count'], 3)
+
+    def test_invalid_params(self):
+        for params in [
+            {'lng': '36.2'},
+            {'lat': 'x', 'lng': '36.2'},
+            {'lat': '100', 'lng': '36.2'},
+            {'lat': '33.5', 'lng': '36.2', 'radius': '0'},
+            {'lat': '33.5', 'lng': '36.2', 'radius': '999999'},
+        ]:
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(self.url, params).status_code, 400)
+
+    def test_geo_cell_follows_coordinates(self):
+        submission = Submission.objects.get(latitude='33.52380000')
+        self.assertEqual(submission.geo_cell, geo_cell('33.5238', '36.2765'))
+        submission.latitude = '33.51390000'
+        submission.save()
+        submission.refresh_from_db()
+        self.assertEqual(submission.geo_cell, geo_cell('33.5139', '36.2765'))
+
+
+class SubmissionTileTests(TestCase):
+    """Tile aggregates follow creates, moves, recategorizations and deletes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(phone_number='+963900000001')
+        cls.water = Category.objects.create(name_ar='مياه', name_en='Water')
+        cls.power = Category.objects.create(name_ar='كهرباء', name_en='Power')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def create(self, category, latitude='33.51380000', longitude='36.27650000'):
+        return Submission.objects.create(
+            user=self.user, category=category, image_url='submissions/x.jpg',
+            latitude=latitude, longitude=longitude, created_at=timezone.now(),
+        )
+
+    def tiles(self, zoom=9, bbox='32,35,37,43', **params):
+        response = self.client.get(reverse('submissions:submission_tiles'), {'zoom': zoom, 'bbox': bbox, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def snapshot(self):
+        return sorted(SubmissionTile.objects.filter(count__gt=0).values_list('zoom', 'x', 'y', 'category_id', 'count'))
+
+    def test_incremental_updates(self):
+        damascus = self.create(self.water)
+        self.create(self.water)
+        self.create(self.power, latitude='36.20210000', longitude='37.13430000')  # Aleppo
+
+        data = self.tiles(zoom=10)
+        self.assertEqual(data['zoom'], 9)
+        self.assertEqual(len(data['tiles']), 2)
+        tile = max(data['tiles'], key=lambda tile: tile['count'])
+        self.assertEqual(tile['count'], 2)
+        self.assertEqual(tile['categories'], {str(self.water.pk): 2})
+        self.assertAlmostEqual(tile['latitude'], 33.5138)
+        self.assertEqual(len(self.tiles(category_ids=str(self.power.pk))['tiles']), 1)
+
+        damascus.category = self.power
+        damascus.latitude = '36.20210000'
+        damascus.longitude = '37.13430000'
+        damascus.save()
+        tiles = {tile['count']: tile for tile in self.tiles()['tiles']}
+        self.assertEqual(set(tiles), {1, 2})
+        self.assertEqual(tiles[2]['categories'], {str(self.power.pk): 2})
+
+        # a fresh instance (values loaded from the database) and a deleted one
+        Submission.objects.get(pk=damascus.pk).delete()
+        self.assertEqual(sorted(tile['count'] for tile in self.tiles()['tiles']), [1, 1])
+
+        incremental = self.snapshot()
+        call_command('rebuild_aggregates', stdout=io.StringIO())
+        self.assertEqual(self.snapshot(), incremental)
+
+    def test_invalid_bbox(self):
+        for bbox in ['nan,0,1,1', '0,0,1,inf', '-91,0,1,1', '0,0,1,181']:
+            with self.subTest(bbox=bbox):
+                response = self.client.get(reverse('submissions:submission_tiles'), {'zoom': 5, 'bbox': bbox})
+                self.assertEqual(response.status_code, 400)
+
+    def test_bbox_too_large(self):
+        response = self.client.get(reverse('submissions:submission_tiles'), {'zoom': 15, 'bbox': '-80,-170,80,170'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('submissions:submission_tiles'), {'zoom': 5})
+        self.assertEqual(response.status_code, 400)
+
+
+class DailyRollupTests(TestCase):
+    """Daily rollups stay exact through creates, deletes and recategorizations"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create(phone_number='+963900000001')
+        cls.bob = User.objects.create(phone_number='+963900000002')
+        cls.water = Category.objects.create(name_ar='مياه', name_en='Water')
+        cls.power = Category.objects.create(name_ar='كهرباء', name_en='Power')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.alice).access_token}')
+        self.today = timezone.localdate()
+        self.yesterday = self.today - timezone.timedelta(days=1)
+
+    def create(self, user, category, day):
+        created_at = timezone.make_aware(timezone.datetime.combine(day, timezone.datetime.min.time())) + timezone.timedelta(hours=12)
+        return Submission.objects.create(
+            user=user, category=category, image_url='submissions/x.jpg',
+            latitude='33.51380000', longitude='36.27650000', created_at=created_at,
+        )
+
+    def rollups(self):
+        return sorted(
+            DailySubmissionStats.objects.filter(submissions__gt=0).values_list('day', 'category_id', 'submissions', 'users')
+        )
+
+    def test_incremental_rollups_match_rebuild(self):
+        first = self.create(self.alice, self.water, self.today)
+        self.create(self.alice, self.water, self.today)
+        self.create(self.bob, self.water, self.today)
+        self.create(self.bob, self.power, self.yesterday)
+        self.assertEqual(self.rollups(), [
+            (self.yesterday, self.power.pk, 1, 1),
+            (self.today, self.water.pk, 3, 2),
+        ])
+
+        first.delete()
+        self.assertIn((self.today, self.water.pk, 2, 2), self.rollups())
+
+        # recategorizing bob's only water submission removes him from water users
+        moved = Submission.objects.get(user=self.bob, category=self.water)
+        moved.category = self.power
+        moved.save()
+        self.assertEqual(self.rollups(), sorted([
+            (self.yesterday, self.power.pk, 1, 1),
+            (self.today, self.water.pk, 1, 1),
+            (self.today, self.power.pk, 1, 1),
+        ]))
+
+        incremental = self.rollups()
+        call_command('rebuild_aggregates', only='rollups', stdout=io.StringIO())
+        self.assertEqual(self.rollups(), incremental)
+
+    def test_cascade_deletes_of_users_and_categories(self):
+        self.create(self.alice, self.water, self.today)
+        self.create(self.bob, self.water, self.today)
+        self.create(self.bob, self.power, self.yesterday)
+
+        def aggregates():
+            return (
+                self.rollups(),
+                sorted(DailyUserActivity.objects.filter(submissions__gt=0).values_list('day', 'category_id', 'user_id', 'submissions')),
+                sorted(SubmissionTile.objects.filter(count__gt=0).values_list('zoom', 'x', 'y', 'category_id', 'count')),
+            )
+
+        # حذف المستخدم أو الفئة يحذف تقديماتهما (CASCADE) دون إعادة إنشاء صفوف محذوفة
+        self.bob.delete()
+        self.assertEqual(self.rollups(), [(self.today, self.water.pk, 1, 1)])
+        water_id = self.water.pk
+        self.water.delete()
+        self.assertEqual(aggregates(), ([], [], []))
+        self.assertFalse(SubmissionTile.objects.filter(category_id=water_id).exists())
+        connection.check_constraints()
+
+        incremental = aggregates()
+        call_command('rebuild_aggregates', stdout=io.StringIO())
+        self.assertEqual(aggregates(), incremental)
+
+    def test_stats_endpoint(self):
+        self.create(self.alice, self.water, self.today)
+        self.create(self.alice, self.power, self.today)
+        self.create(self.bob, self.water, self.yesterday)
+
+        data = self.client.get(reverse('submissions:submission_stats'), {
+            'start': self.yesterday.isoformat(), 'end': self.today.isoformat(),
+        }).data
+        self.assertEqual((data['submissions'], data['users']), (3, 2))
+        today = data['days'][-1]
+        self.assertEqual((today['day'], today['submissions'], today['users']), (self.today, 2, 1))
+        self.assertEqual(len(today['categories']), 2)
+
+        data = self.client.get(reverse('submissions:submission_stats'), {'category_ids': str(self.power.pk)}).data
+        self.assertEqual((data['submissions'], data['users']), (1, 1))
+
+        for params in [{'start': 'x'}, {'start': '2026-02-01', 'end': '2026-01-01'}, {'start': '2020-01-01', 'end': '2026-01-01'}]:
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(reverse('submissions:submission_stats'), params).status_code, 400)
+
+
+class LargeTableAdminTests(TestCase):
+    """Admin changelists run a fixed number of queries whatever the table size"""
+
+    QUERY_BUDGET = 5  # session, admin user, category filter choices, page, bounded count
+    ROWS = 120
+
+    @classmethod
+    def setUpTestData(cls):
+        from django.contrib.auth import get_user_model
+        cls.admin = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.users = [User.objects.create(phone_number=f'+9639{i}0000000') for i in range(3)]
+        cls.categories = [Category.objects.create(name_ar=f'فئة {i}', name_en=f'Category {i}') for i in range(3)]
+        now = timezone.now()
+        Submission.objects.bulk_create([
+            Submission(
+                user=cls.users[i % 3], category=cls.categories[i % 3], image_url='submissions/photo.jpg',
+                latitude='33.51380000', longitude='36.27650000', created_at=now - timezone.timedelta(minutes=i),
+            )
+            for i in range(cls.ROWS)
+        ])
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        self.url = reverse('admin:submissions_submission_changelist')
+
+    def get_page(self, url, **params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(
+            len(context.captured_queries), self.QUERY_BUDGET,
+            '\n'.join(query['sql'] for query in context.captured_queries),
+        )
+        sql = ' '.join(query['sql'] for query in context.captured_queries).upper()
+        self.assertNotIn('OFFSET', sql)
+        return response
+
+    def test_keyset_navigation(self):
+        per_page = admin.site._registry[Submission].list_per_page
+        first = self.get_page(self.url).context['cl']
+        ids = [row.pk for row in first.result_list]
+        self.assertEqual(len(ids), per_page)
+        self.assertEqual(ids, sorted(ids, reverse=True))
+        self.assertIsNone(first.previous_url)
+
+        second = self.get_page(self.url + first.next_url).context['cl']
+        self.assertEqual(second.result_list[0].pk, ids[-1] - 1)
+        self.assertIsNone(second.next_url)
+        self.assertEqual(second.result_count, self.ROWS)
+
+        back = self.get_page(self.url + second.previous_url).context['cl']
+        self.assertEqual([row.pk for row in back.result_list], ids)
+
+        self.assertEqual(self.client.get(self.url, {'after': 'x'}).status_code, 302)
+
+    def test_phone_prefix_search(self):
+        with CaptureQueriesContext(connection) as context:
+            cl = self.get_page(self.url, q='+96391').context['cl']
+        self.assertEqual(cl.result_count, self.ROWS // 3)
+        self.assertTrue(all(row.user_id == self.users[1].pk for row in cl.result_list))
+        self.assertNotIn("'%+96391", ' '.join(query['sql'] for query in context.captured_queries))
+        # istartswith: LIKE 'x%' في MySQL، بينما startswith يصبح LIKE BINARY الذي لا يستخدم الفهرس
+        self.assertEqual(self.search_lookups(Submission, '+96391'), {'istartswith'})
+        self.assertEqual(self.search_lookups(User, '+96391'), {'istartswith'})
+
+    def search_lookups(self, model, term):
+        from django.db.models.lookups import Lookup
+        from django.test import RequestFactory
+
+        request = RequestFactory().get('/', {'q': term})
+        request.user = self.admin
+        model_admin = admin.site._registry[model]
+        queryset, _ = model_admin.get_search_results(request, model.objects.all(), term)
+        lookups, nodes = set(), [queryset.query.where]
+        while nodes:
+            node = nodes.pop()
+            if isinstance(node, Lookup):
+                lookups.add(node.lookup_name)
+            else:
+                nodes.extend(getattr(node, 'children', []))
+        return lookups
+
+    @override_settings(SUBMISSIONS_ADMIN_EXACT_COUNT_LIMIT=50)
+    def test_bounded_count(self):
+        cl = self.get_page(self.url).context['cl']
+        self.assertEqual((cl.result_count, cl.result_count_display), (50, '+50'))
+
+    def test_user_changelist(self):
+        cl = self.get_page(reverse('admin:submissions_user_changelist'), q='+96392').context['cl']
+        self.assertEqual([row.pk for row in cl.result_list], [self.users[2].pk])
+
+
+@override_settings(SUBMISSIONS_EXPORT_COMMIT_LAG=0)
+class ExportCommandTests(TestCase):
+    """export_submissions writes resumable, optionally incremental dumps"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(phone_number='+963900000001')
+        cls.category = Category.objects.create(name_ar='مياه', name_en='Water')
+        for i in range(5):
+            Submission.objects.create(
+                user=cls.user, category=cls.category, image_url='submissions/photo.jpg',
+                latitude='33.51380000', longitude='36.27650000', notes=f'row {i}', created_at=timezone.now(),
+            )
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.checkpoint = os.path.join(self.directory, 'checkpoint.json')
+
+    def export(self, **options):
+        call_command(
+            'export_submissions', output_dir=self.directory, checkpoint=self.checkpoint,
+            batch_size=2, stdout=io.StringIO(), **options,
+        )
+        with open(self.checkpoint) as checkpoint:
+            self.assertIsNone(json.load(checkpoint)['run'])
+        return sorted(os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.startswith('submissions-'))
+
+    def read_ndjson(self, path):
+        with gzip.open(path) as export:
+            return [json.loads(line)['submission_id'] for line in export]
+
+    def test_full_export(self):
+        [path] = self.export()
+        ids = list(Submission.objects.order_by('submission_id').values_list('submission_id', flat=True))
+        self.assertEqual(self.read_ndjson(path), ids)
+
+        [path] = [path for path in self.export(format='csv', compress='none') if path.endswith('.csv')]
+        with open(path, newline='', encoding='utf-8') as export:
+            rows = list(csv.reader(export))
+        self.assertEqual(rows[0][0], 'submission_id')
+        self.assertEqual([int(row[0]) for row in rows[1:]], ids)
+
+    def test_resume_after_interruption(self):
+        calls = []
+
+        def failing_encode(chunk):
+            calls.append(chunk)
+            if len(calls) == 2:
+                raise RuntimeError('interrupted')
+            return encode_ndjson(chunk)
+
+        with mock.patch('submissions.management.commands.export_submissions.encode_ndjson', failing_encode):
+            with self.assertRaises(RuntimeError):
+                call_command('export_submissions', output_dir=self.directory, checkpoint=self.checkpoint,
+                             batch_size=2, stdout=io.StringIO())
+        with open(self.checkpoint) as checkpoint:
+            run = json.load(checkpoint)['run']
+        self.assertEqual(run['rows'], 2)
+        # bytes of a batch written after the last checkpoint are discarded on resume
+        with open(run['output'], 'ab') as output:
+            output.write(b'partial batch')
+
+        [path] = self.export()
+        self.assertEqual(self.read_ndjson(path), list(Submission.objects.order_by('pk').values_list('pk', flat=True)))
+
+    def test_incremental_export(self):
+        self.export()
+        changed = Submission.objects.order_by('pk').first()
+        changed.notes = 'edited'
+        changed.save()
+        added = Submission.objects.create(
+            user=self.user, category=self.category, image_url='submissions/photo.jpg',
+            latitude='33.51380000', longitude='36.27650000', created_at=timezone.now(),
+        )
+
+        paths = self.export(incremental=True)
+        [incremental] = [path for path in paths if '-incremental-' in path]
+        self.assertEqual(self.read_ndjson(incremental), [changed.pk, added.pk])
+
+
+class ImportCommandTests(TempMediaMixin, TestCase):
+    """import_submissions inserts valid rows in batches and reports the rest"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(phone_number='+963900000001')
+        cls.water = Category.objects.create(name_ar='مياه', name_en='Water')
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        for seed in range(3):
+            with open(os.path.join(self.directory, f'meter{seed}.jpg'), 'wb') as image:
+                image.write(make_meter_photo(seed=seed).read())
+        with open(os.path.join(self.directory, 'broken.jpg'), 'wb') as image:
+            image.write(b'not an image')
+
+    def run_import(self, records, **options):
+        path = os.path.join(self.directory, 'records.ndjson')
+        with open(path, 'w', encoding='utf-8') as output:
+            for record in records:
+                output.write(record if isinstance(record, str) else json.dumps(record, ensure_ascii=False))
+                output.write('\n')
+        errors = os.path.join(self.directory, 'errors.ndjson')
+        options = {'batch_size': 2, 'workers': 2, **options}
+        call_command(
+            'import_submissions', path, images_dir=self.directory,
+            errors=errors, stdout=io.StringIO(), stderr=io.StringIO(), **options,
+        )
+        with open(errors, encoding='utf-8') as rejected:
+            return {item['line']: item['errors'] for item in map(json.loads, rejected)}
+
+    def record(self, **fields):
+        return dict({
+            'phone_number': '+963900000001', 'category': 'مياه', 'image': 'meter0.jpg',
+            'latitude': '33.51380000', 'longitude': '36.27650000', 'created_at': '2020-01-01T10:00:00+03:00',
+        }, **fields)
+
+    def test_import(self):
+        errors = self.run_import([
+            self.record(notes='first', invoice_image='meter1.jpg'),
+            self.record(category='WATER', image='meter2.jpg'),
+            self.record(phone_number='+963900000002', image='meter1.jpg'),
+            '{not json',
+            self.record(category='Gas'),
+            self.record(image='missing.jpg'),
+            self.record(image='broken.jpg'),
+            self.record(image='../records.ndjson'),
+            self.record(latitude='north'),
+            self.record(image='meter0.jpg'),
+        ], create_users=True)
+
+        self.assertEqual(sorted(errors), [4, 5, 6, 7, 8, 9])
+        self.assertIn('category', errors[5])
+        self.assertIn('image', errors[6])
+        self.assertIn('latitude', errors[9])
+
+        submissions = list(Submission.objects.order_by('pk'))
+        self.assertEqual(len(submissions), 4)
+        self.assertEqual(submissions[0].notes, 'first')
+        self.assertTrue(submissions[0].invoice_image.name.startswith('invoices/'))
+        self.assertEqual(submissions[0].created_at.year, 2020)
+        self.assertEqual(submissions[2].user.phone_number, '+963900000002')
+        self.assertIsNotNone(submissions[1].geo_cell)
+        # same photo imported twice: stored once, flagged as a near-duplicate
+        self.assertEqual(submissions[3].image_url.name, submissions[0].image_url.name)
+        self.assertEqual(submissions[3].duplicate_of_id, submissions[0].pk)
+        self.assertEqual(StoredBlob.objects.get(name=submissions[0].image_url.name).ref_count, 2)
+        self.assertEqual(sum(SubmissionTile.objects.filter(zoom=3).values_list('count', flat=True)), 4)
+
+    def test_identical_images_are_copied_once_per_batch(self):
+        store = ContentAddressedStorage.store
+        with mock.patch.object(ContentAddressedStorage, 'store', autospec=True, side_effect=store) as stored:
+            errors = self.run_import([self.record() for _ in range(6)], batch_size=3, workers=4)
+        self.assertEqual(errors, {})
+        self.assertEqual(stored.call_count, 2)
+        self.assertEqual(Submission.objects.count(), 6)
+        name = Submission.objects.first().image_url.name
+        self.assertEqual(StoredBlob.objects.get(name=name).ref_count, 6)
+        # النسخ داخل الدفعة نفسها مُعلَّمة أيضاً
+        first, *copies = Submission.objects.order_by('pk')
+        self.assertIsNone(first.duplicate_of_id)
+        self.assertEqual({copy.duplicate_of_id for copy in copies}, {first.pk})
+
+    def test_database_errors_reject_the_batch_only(self):
+        from django.db import IntegrityError
+        bulk_create = Submission.objects.bulk_create
+        calls = []
+
+        def fail_once(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 1:
+                raise IntegrityError('FOREIGN KEY constraint failed')
+            return bulk_create(*args, **kwargs)
+
+        with mock.patch.object(Submission.objects, 'bulk_create', side_effect=fail_once):
+            errors = self.run_import([self.record(), self.record(image='meter1.jpg'), self.record(image='meter2.jpg')])
+        self.assertEqual(sorted(errors), [1, 2])
+        self.assertIn('database', errors[1])
+        self.assertEqual(Submission.objects.count(), 1)
+        self.assertEqual(sum(SubmissionTile.objects.filter(zoom=3).values_list('count', flat=True)), 1)
+
+    def test_unknown_users_are_rejected_without_create_users(self):
+        errors = self.run_import([self.record(), self.record(phone_number='+963900000009')])
+        self.assertEqual(list(errors), [2])
+        self.assertEqual(Submission.objects.count(), 1)
+
+
+class SyntheticDataTests(TempMediaMixin, TransactionTestCase):
+    """
+    generate_synthetic_data is reproducible and leaves consistent aggregates and
+    indexes (TransactionTestCase: the SQLite schema editor cannot run in atomic())
+    """
+
+    def generate(self, **options):
+        options = {'users': 50, 'submissions': 500, 'days': 30, 'images': 2, 'batch_size': 100, **options}
+        call_command('generate_synthetic_data', stdout=io.StringIO(), **options)
+
+    def rows(self):
+        return sorted(Submission.objects.values_list(
+            'user__phone_number', 'category__name_en', 'latitude', 'longitude', 'image_phash', 'geo_cell',
+        ))
+
+    def aggregates(self):
+        return (
+            sorted(SubmissionTile.objects.filter(count__gt=0).values_list('zoom', 'x', 'y', 'category_id', 'count')),
+            sorted(DailySubmissionStats.objects.values_list('day', 'category_id', 'submissions', 'users')),
+            sorted(DailyUserActivity.objects.values_list('day', 'category_id', 'user_id', 'submissions')),
+        )
+
+    def test_generate(self):
+        with connection.cursor() as cursor:
+            indexes = set(connection.introspection.get_constraints(cursor, Submission._meta.db_table))
+        self.generate()
+
+        self.assertEqual(User.objects.count(), 50)
+        self.assertEqual(OtpCode.objects.count(), 50)
+        self.assertEqual(Submission.objects.count(), 500)
+        with connection.cursor() as cursor:
+            self.assertEqual(set(connection.introspection.get_constraints(cursor, Submission._meta.db_table)), indexes)
+        # المعرّفات تتبع وقت الإنشاء
+        created = list(Submission.objects.order_by('pk').values_list('created_at', flat=True))
+        self.assertEqual(created, sorted(created))
+        submission = Submission.objects.first()
+        self.assertEqual(submission.geo_cell, geo_cell(submission.latitude, submission.longitude))
+
+        inline = self.aggregates()
+        self.assertEqual(sum(count for zoom, *_, count in inline[0] if zoom == 3), 500)
+        call_command('rebuild_aggregates', stdout=io.StringIO())
+        self.assertEqual(self.aggregates(), inline)
+
+        with self.assertRaises(CommandError):
+            self.generate()
+
+        rows = self.rows()
+        Submission.objects.all().delete()
+        User.objects.all().delete()
+        OtpCode.objects.all().delete()
+        for option in ('images', 'days', 'submissions', 'batch_size'):
+            with self.subTest(option=option), self.assertRaisesMessage(CommandError, 'must be at least 1'):
+                self.generate(**{option: 0})
+        self.assertFalse(User.objects.exists())
+
+        self.generate()
+        self.assertEqual(self.rows(), rows)
+
+
+class LoadTestHarnessTests(TempMediaMixin, TransactionTestCase):
+    """load_test replays the client flow and reports per-endpoint statistics"""
+
+    def setUp(self):
+        Category.objects.create(name_ar='مياه', name_en='Water')
+
+    def test_in_process_run(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        output = os.path.join(directory, 'run.json')
+        with mock.patch('sys.stdout', new_callable=io.StringIO):  # MockSMSService يطبع الكود
+            call_command('load_test', users=1, iterations=2, output=output, stdout=io.StringIO())
+
+        with open(output) as report_file:
+            report = json.load(report_file)
+        self.assertEqual(report['scenarios']['completed'], 2)
+        self.assertEqual(set(report['endpoints']), {
+            'POST send_otp', 'POST verify_otp', 'GET category_list', 'POST submission_list',
+            'GET submission_list', 'GET submission_detail', 'POST refresh_token',
+        })
+        create = report['endpoints']['POST submission_list']
+        self.assertEqual((create['requests'], create['errors']), (2, 0))
+        self.assertGreater(create['queries_per_request'], 0)
+        self.assertLessEqual(create['p50_ms'], create['p99_ms'])
+        self.assertEqual(Submission.objects.count(), 2)
+
+        slower = json.loads(json.dumps(report))
+        slower['endpoints']['POST submission_list']['p95_ms'] = create['p95_ms'] * 2
+        slower['endpoints']['POST submission_list']['queries_per_request'] += 1
+        regressed = {(endpoint, metric) for endpoint, metric, *_, bad in compare_reports(report, slower) if bad}
+        self.assertEqual(regressed, {('POST submission_list', 'p95_ms'), ('POST submission_list', 'queries_per_request')})
+
+
+    def test_network_errors_are_recorded(self):
+        import socket
+
+        # يقبل الاتصال ولا يرد: كل طلب ينتهي بمهلة
+        server = socket.socket()
+        server.bind(('127.0.0.1', 0))
+        server.listen(8)
+        self.addCleanup(server.close)
+        base_url = 'http://127.0.0.1:%d' % server.getsockname()[1]
+
+        samples, completed, failed, _ = run_load(lambda: HTTPTransport(base_url, timeout=0.2), users=1, iterations=2)
+        self.assertEqual((completed, failed), (0, 2))
+        self.assertEqual([(sample.endpoint, sample.status) for sample in samples], [('POST send_otp', None)] * 2)
+        report = build_report(samples, completed, failed, 1)
+        self.assertEqual(report['endpoints']['POST send_otp']['errors'], 2)
+
+class RequestMetricsTests(TestCase):
+    """Requests are timed per phase, sent in Server-Timing and aggregated on /metrics"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(phone_number='+963900000001')
+        cls.water = Category.objects.create(name_ar='مياه', name_en='Water')
+
+    def setUp(self):
+        registry.reset()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def timings(self, response):
+        return {entry.split(';')[0]: entry for entry in response['Server-Timing'].split(', ')}
+
+    @override_settings(SUBMISSIONS_SERVER_TIMING=True)
+    def test_server_timing(self):
+        Submission.objects.create(
+            user=self.user, category=self.water, image_url='submissions/x.jpg',
+            latitude='33.51380000', longitude='36.27650000', created_at=timezone.now(),
+        )
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('submissions:submission_list'))
+        timings = self.timings(response)
+        self.assertEqual(set(timings), {'total', 'db', 'auth', 'serializer', 'render'})
+        self.assertIn(f'desc="{len(queries)} queries"', timings['db'])
+
+        response = self.client.get(reverse('submissions:submission_detail', args=[Submission.objects.get().pk]))
+        self.assertIn('serializer', self.timings(response))
+
+    @override_settings(SUBMISSIONS_SERVER_TIMING=False)
+    def test_metrics_endpoint(self):
+        response = self.client.get(reverse('submissions:submission_list'))
+        self.assertNotIn('Server-Timing', response)
+        self.client.get(reverse('submissions:submission_list'))
+        self.client.post(reverse('submissions:submission_list'), {})
+
+        metrics = self.client.get('/metrics')
+        self.assertEqual(metrics.status_code, 200)
+        text = metrics.content.decode()
+        labels = 'view="submissions:submission_list",method="GET"'
+        self.assertIn(f'sm_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2', text)
+        self.assertIn(f'sm_http_request_duration_seconds_count{{{labels}}} 2', text)
+        self.assertIn(f'sm_http_request_phase_seconds_total{{{labels},phase="auth"}}', text)
+        self.assertIn('view="submissions:submission_list",method="POST",status="4xx"} 1', text)
+
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='203.0.113.9').status_code, 403)
+
+
+class SlowQuerySamplerTests(TestCase):
+    """Slow queries are recorded with their view and plan, and grouped by fingerprint"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(phone_number='+963900000001')
+
+    def setUp(self):
+        slow_query_log.clear()
+        self.addCleanup(slow_query_log.clear)
+        slowqueries._explained.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def test_normalize(self):
+        first = normalize_sql('SELECT "a" FROM "t" WHERE "id" IN (%s, %s, %s) AND "name" = \'x\'\n  LIMIT 21')
+        self.assertEqual(first, 'SELECT "a" FROM "t" WHERE "id" IN (...) AND "name" = ? LIMIT ?')
+        self.assertEqual(first, normalize_sql('SELECT "a" FROM "t" WHERE "id" IN (%s) AND "name" = \'y\' LIMIT 5'))
+        self.assertEqual(normalize_sql('INSERT INTO "t" ("a", "b") VALUES (%s, %s), (%s, %s)'), 'INSERT INTO "t" ("a", "b") VALUES (...), ...')
+        self.assertEqual(normalize_sql('SELECT "phash_segment_0" FROM "t"'), 'SELECT "phash_segment_0" FROM "t"')
+
+    @override_settings(SUBMISSIONS_SLOW_QUERY_MS=0)
+    def test_sampling(self):
+        with self.assertLogs('submissions.slowqueries', 'WARNING'):
+            self.client.get(reverse('submissions:submission_list'))
+            self.client.get(reverse('submissions:submission_list'))
+
+        records = slow_query_log.records()
+        listing = [record for record in records if 'FROM "Submissions"' in record['sql']]
+        self.assertEqual(len(listing), 2)
+        self.assertEqual({record['view'] for record in listing}, {'submissions:submission_list'})
+        self.assertEqual(listing[0]['fingerprint'], listing[1]['fingerprint'])
+        # EXPLAIN مرة واحدة لكل بصمة خلال الفترة
+        self.assertTrue(listing[0]['plan'])
+        self.assertNotIn('EXPLAIN failed', listing[0]['plan'])
+        self.assertIsNone(listing[1]['plan'])
+
+        output, warnings = io.StringIO(), io.StringIO()
+        call_command('slow_queries', plans=True, stdout=output, stderr=warnings)
+        self.assertIn('local to this process', warnings.getvalue())
+        self.assertIn(f'{listing[0]["fingerprint"]}  2x', output.getvalue())
+        self.assertIn('submissions:submission_list (2)', output.getvalue())
+
+    @override_settings(SUBMISSIONS_SLOW_QUERY_MS=None)
+    def test_disabled(self):
+        self.client.get(reverse('submissions:submission_list'))
+        self.assertEqual(slow_query_log.records(), [])
+
+
+class UserCacheTests(TestCase):
+    """Authenticated requests resolve the user from the cache and see updates and deletions"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(phone_number='+963900000001')
+
+    def setUp(self):
+        user_cache.invalidate()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        self.url = reverse('submissions:user_profile')
+
+    def test_hits_skip_the_database(self):
+        before = dict(user_cache.stats)
+        with self.assertNumQueries(1):
+            self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['phone_number'], '+963900000001')
+        self.assertEqual(user_cache.stats['miss'] - before['miss'], 1)
+        self.assertEqual(user_cache.stats['local_hit'] - before['local_hit'], 1)
+        self.assertIn('sm_user_cache_lookups_total{result="local_hit"}', self.client.get('/metrics').content.decode())
+
+    @override_settings(SUBMISSIONS_USER_CACHE_SIZE=0, SUBMISSIONS_USER_CACHE_SHARED=True)
+    def test_shared_tier(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+
+    def test_update_and_delete_invalidate(self):
+        self.client.get(self.url)
+        self.user.phone_number = '+963900000009'
+        self.user.save()
+        self.assertEqual(self.client.get(self.url).data['phone_number'], '+963900000009')
+
+        self.user.delete()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    @override_settings(SUBMISSIONS_USER_CACHE_SIZE=1)
+    def test_lru_is_bounded(self):
+        other = User.objects.create(phone_number='+963900000002')
+        user_cache.get(self.user.pk)
+        user_cache.get(other.pk)
+        self.assertEqual(list(user_cache._entries), [other.pk])
+
+
+class OTPStoreTests(TestCase):
+    """send_otp / verify_otp against both OTP stores: single use, attempt limit, expiry"""
+
+    phone_number = '+963900000001'
+
+    def setUp(self):
+        cache.clear()
+
+    def send(self):
+        return self.client.post(reverse('submissions:send_otp'), {'phone_number': self.phone_number})
+
+    def verify(self, code='000000'):
+        return self.client.post(reverse('submissions:verify_otp'),
+                                {'phone_number': self.phone_number, 'otp_code': code})
+
+    def check_flow(self):
+        self.assertEqual(self.send().status_code, 200)
+        self.assertEqual(self.verify('123456').status_code, 400)
+        self.assertEqual(self.verify().status_code, 200)
+        # الكود يُستخدم مرة واحدة
+        self.assertEqual(self.verify().status_code, 400)
+
+        self.send()
+        for _ in range(5):
+            self.assertEqual(self.verify('123456').status_code, 400)
+        self.assertEqual(self.verify().status_code, 400)
+        # كود جديد يعيد المحاولات
+        self.send()
+        self.assertEqual(self.verify().status_code, 200)
+
+    def test_database_store(self):
+        self.check_flow()
+        self.send()
+        self.send()
+        self.assertEqual(OtpCode.objects.filter(phone_number=self.phone_number).count(), 1)
+
+    def test_upsert_without_conflict_target(self):
+        # MySQL: ON DUPLICATE KEY UPDATE دون تحديد الأعمدة (sqlite يُنفّذه INSERT عادياً)
+        with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', False):
+            self.assertEqual(self.send().status_code, 200)
+        self.assertEqual(self.verify().status_code, 200)
+
+    @override_settings(SUBMISSIONS_OTP_STORE='cache')
+    def test_cache_store(self):
+        self.check_flow()
+        self.assertFalse(OtpCode.objects.exists())
+        with self.assertNumQueries(0):
+            self.send()
+
+    @override_settings(SUBMISSIONS_OTP_TTL=-1)
+    def test_expired_codes_are_rejected_and_purged(self):
+        self.send()
+        self.assertEqual(self.verify().status_code, 400)
+        out = io.StringIO()
+        call_command('purge_expired_otps', stdout=out)
+        self.assertIn('Purged 1 expired OTP codes', out.getvalue())
+        self.assertFalse(OtpCode.objects.exists())
@@ -0,0 +1,137 @@
+"""
+Resumable chunked uploads.
+
+Protocol:
+    POST  /api/uploads/                   start: {filename, total_size}
+    PATCH /api/uploads/<id>/              append a chunk (raw body, Upload-Offset header)
+    GET   /api/uploads/<id>/              current offset, to resume after a dropped connection
+    POST  /api/uploads/<id>/finalize/     verify the image and mark the upload complete
+
+A finalized upload is attached to a submission with `image_upload_id` /
+`invoice_upload_id`, so the create request itself carries no file.
+Chunks are streamed to a staging file in small pieces before the upload
+row is locked; partial files live outside MEDIA_ROOT until they are attached.
+"""
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from PIL import Image
+
+READ_SIZE = 64 * 1024
+
+
+class UploadError(Exception):
+    """Raised when a chunk or finalize request can't be applied"""
+
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def get_upload_dir():
+    return Path(getattr(settings, 'SUBMISSIONS_UPLOAD_DIR', settings.BASE_DIR / 'upload_chunks'))
+
+
+def get_upload_path(upload):
+    return get_upload_dir() / f'{upload.upload_id}.part'
+
+
+def receive_chunk(upload, stream, length):
+    """
+    Read up to `length` bytes from `stream` into a new staging file.
+
+    Returns (path, bytes received). This runs outside any transaction so a
+    slow client holds no database lock; append_chunk moves the bytes into
+    the partial file once the offset is claimed. If the client disconnects
+    mid-chunk, the bytes already received are kept.
+    """
+    directory = get_upload_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    handle, path = tempfile.mkstemp(dir=directory, prefix=f'{upload.upload_id}.', suffix='.chunk')
+
+    received = 0
+    try:
+        with os.fdopen(handle, 'wb') as destination:
+            while received < length:
+                data = stream.read(min(READ_SIZE, length - received))
+                if not data:
+                    break
+                destination.write(data)
+                received += len(data)
+    except BaseException:
+        discard_chunk(path)
+        raise
+    return Path(path), received
+
+
+def append_chunk(upload, offset, chunk_path):
+    """
+    Copy a received chunk into the partial file at `offset`.
+
+    Anything past `offset` from an earlier interrupted chunk is discarded
+    first. Call it while holding the upload row lock.
+    """
+    path = get_upload_path(upload)
+    with open(path, 'r+b' if path.exists() else 'w+b') as destination, open(chunk_path, 'rb') as chunk:
+        destination.truncate(offset)
+        destination.seek(offset)
+        shutil.copyfileobj(chunk, destination, READ_SIZE)
+
+
+def discard_chunk(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def verify_image(upload):
+    """Raise UploadError unless the finished upload is a readable image"""
+    path = get_upload_path(upload)
+    if not path.exists() or path.stat().st_size != upload.total_size:
+        raise UploadError('الملف غير مكتمل', 409)
+    try:
+        with Image.open(path) as image:
+            image.verify()
+    except Exception:
+        raise UploadError('الملف ليس صورة صالحة', 400)
+
+
+def open_upload(upload):
+    """
+    Return a django File for a finalized upload, ready to be assigned to an ImageField.
+
+    The caller owns the open handle and must close it (see close_uploads),
+    whether or not the submission is saved.
+    """
+    return File(open(get_upload_path(upload), 'rb'), name=upload.filename)
+
+
+def close_uploads(files_and_uploads):
+    for file, upload in files_and_uploads:
+        file.close()
+
+
+def discard_upload(upload):
+    """Remove the partial file, any staged chunks and the Upload row"""
+    discard_chunk(get_upload_path(upload))
+    # جزء بقي من عملية توقفت أثناء الاستلام
+    for chunk_path in get_upload_dir().glob(f'{upload.upload_id}.*.chunk'):
+        discard_chunk(chunk_path)
+    upload.delete()
+
+
+def release_uploads(files_and_uploads):
+    """Close attached files and discard their uploads once the transaction commits"""
+    def release():
+        close_uploads(files_and_uploads)
+        for file, upload in files_and_uploads:
+            discard_upload(upload)
+
+    transaction.on_commit(release)
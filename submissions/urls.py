@@ -15,5 +15,15 @@ urlpatterns = [
     # API endpoints
     path('categories/', views.CategoryListView.as_view(), name='category_list'),
     path('submissions/', views.SubmissionListView.as_view(), name='submission_list'),
+    path('submissions/batch/', views.SubmissionBatchCreateView.as_view(), name='submission_batch_create'),
+    path('submissions/export/', views.SubmissionExportView.as_view(), name='submission_export'),
+    path('submissions/nearby/', views.SubmissionNearbyView.as_view(), name='submission_nearby'),
+    path('submissions/tiles/', views.SubmissionTileView.as_view(), name='submission_tiles'),
+    path('submissions/stats/', views.SubmissionStatsView.as_view(), name='submission_stats'),
     path('submissions/<int:pk>/', views.SubmissionDetailView.as_view(), name='submission_detail'),
+
+    # Resumable chunked uploads
+    path('uploads/', views.UploadStartView.as_view(), name='upload_start'),
+    path('uploads/<uuid:upload_id>/', views.UploadDetailView.as_view(), name='upload_detail'),
+    path('uploads/<uuid:upload_id>/finalize/', views.UploadFinalizeView.as_view(), name='upload_finalize'),
 ]
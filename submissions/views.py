@@ -1,69 +1,565 @@
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.shortcuts import render
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.dateparse import parse_date
+from django.utils.http import http_date
 from django.contrib.auth import authenticate
+from django.db import connections, transaction
+from django.db.models import Count
 from rest_framework import status, generics, permissions
 from rest_framework.decorators import api_view, permission_classes, parser_classes
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.parsers import FormParser, MultiPartParser
 from datetime import timedelta
-import hashlib
+import json
 import secrets
 import random
 import string
 
-from .models import User, OtpCode, Category, Submission
+from .models import (
+    User, Category, Submission, SubmissionTile, Upload, DailySubmissionStats, DailyUserActivity,
+)
 from .serializers import (
     UserSerializer, CategorySerializer, SubmissionSerializer,
-    SubmissionCreateSerializer, OTPSendSerializer, OTPVerifySerializer,
-    JWTTokenSerializer
+    SubmissionCreateSerializer, SubmissionUpdateSerializer, OTPSendSerializer, OTPVerifySerializer,
+    JWTTokenSerializer, UploadStartSerializer, UploadSerializer
 )
 from .services import sms_service
+from .pagination import SubmissionCursorPagination
+from .filters import _parse_bbox, _parse_int_list, filter_submissions
+from .caching import category_cache, submission_versions, make_etag
+from .fastpath import FastJSONRenderer, SUBMISSION_VALUE_FIELDS, serialize_submission_rows
+from .export import EXPORT_FORMATS, stream_export
+from .idempotency import idempotent
+from .images import DERIVATIVE_FIELDS, derivative_pipeline
+from .otp import get_otp_store, get_otp_ttl, hash_code
+from .uploads import UploadError, append_chunk, discard_chunk, receive_chunk, verify_image
+from .aggregates import apply_changes, get_tile_zooms, submission_point, tile_for
+from .geo import assign_geo_cell, nearest
+from .phash import hash_submission_images, insert_indexed_batch
+from .storage import retain_instance_files
 
 
 # API Views
 
 class CategoryListView(generics.ListAPIView):
-    """List all categories"""
+    """List all categories (served from the category cache, with ETag support)"""
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [permissions.AllowAny]
 
-
-class SubmissionListView(generics.ListCreateAPIView):
+    def list(self, request, *args, **kwargs):
+        snapshot = category_cache.get()
+        response = get_conditional_response(request, etag=snapshot.etag)
+        if response is None:
+            response = Response(snapshot.data)
+        response['ETag'] = snapshot.etag
+        return response
+
+
+class SubmissionConditionalGetMixin:
+    """
+    Answer conditional GETs (If-None-Match / If-Modified-Since) from the
+    per-user change marker and the categories marker (responses embed
+    category names), before any submission query runs.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_get(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_get(request, super().retrieve, *args, **kwargs)
+
+    def conditional_get(self, request, handler, *args, **kwargs):
+        marker = submission_versions.get(request.user.user_id)
+        categories = category_cache.get_marker()
+        etag = make_etag(marker.version, categories.version, request.get_full_path())
+        modified_at = max(marker.modified_at, categories.modified_at)
+        response = get_conditional_response(request, etag=etag, last_modified=modified_at)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(modified_at)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+
+class SubmissionListView(SubmissionConditionalGetMixin, generics.ListCreateAPIView):
     """List and create submissions"""
     serializer_class = SubmissionSerializer
     permission_classes = [permissions.IsAuthenticated]
     parser_classes = [FormParser, MultiPartParser]
+    renderer_classes = [FastJSONRenderer]
+    pagination_class = SubmissionCursorPagination
 
     def get_queryset(self):
-        """Return submissions for current user, optionally filtered by category."""
-        queryset = Submission.objects.filter(user=self.request.user)
-        category_id = self.request.query_params.get('category_id')
-
-        if category_id:
-            try:
-                queryset = queryset.filter(category__category_id=int(category_id))
-            except (ValueError, TypeError):
-                # إذا كان المعرف غير صالح نعيد نتيجة فارغة
-                queryset = queryset.none()
-
-        return queryset
+        """Return submissions for current user, narrowed by the list filters."""
+        queryset = Submission.objects.filter(user=self.request.user).select_related('user', 'category')
+        return filter_submissions(queryset, self.request.query_params)
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return SubmissionCreateSerializer
         return SubmissionSerializer
 
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
 
-class SubmissionDetailView(generics.RetrieveUpdateDestroyAPIView):
+    def perform_create(self, serializer):
+        instance = serializer.save()
+        derivative_pipeline.schedule(instance)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_get(request, self.list_rows, *args, **kwargs)
+
+    def list_rows(self, request, *args, **kwargs):
+        """Fast read path: .values() rows rendered without SubmissionSerializer"""
+        queryset = self.filter_queryset(self.get_queryset()).values(*SUBMISSION_VALUE_FIELDS)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serialize_submission_rows(page))
+        return Response(serialize_submission_rows(queryset))
+
+
+class SubmissionDetailView(SubmissionConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     """Retrieve, update, delete submission"""
     serializer_class = SubmissionSerializer
     permission_classes = [permissions.IsAuthenticated]
     parser_classes = [FormParser, MultiPartParser]
 
     def get_queryset(self):
-        return Submission.objects.filter(user=self.request.user)
+        return Submission.objects.filter(user=self.request.user).select_related('user', 'category')
+
+    def get_serializer_class(self):
+        if self.request.method in ('PUT', 'PATCH'):
+            return SubmissionUpdateSerializer
+        return SubmissionSerializer
+
+    def perform_update(self, serializer):
+        instance = serializer.save()
+        replaced = [field for field in DERIVATIVE_FIELDS if field in serializer.validated_data]
+        if replaced:
+            derivative_pipeline.schedule(instance, replaced)
+
+
+def save_rows(instances):
+    for instance in instances:
+        instance.save(force_insert=True)
+
+
+class SubmissionBatchCreateView(generics.GenericAPIView):
+    """
+    Create many submissions (e.g. captured offline) in one request.
+
+    Multipart body:
+        items                       JSON array of submission objects
+        items[<i>].image_url        image file of item i
+        items[<i>].invoice_image    optional invoice file of item i
+
+    Every item is validated first, then all valid items are inserted in a
+    single transaction with bulk_create (one INSERT per row on backends
+    that don't return the ids of bulk inserts, such as MySQL, so every
+    created item gets its submission_id). The response reports the result
+    of each item.
+    """
+    serializer_class = SubmissionCreateSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [FormParser, MultiPartParser]
+    file_fields = ('image_url', 'invoice_image')
+
+    def get_items(self, request):
+        items = request.data.get('items')
+        if isinstance(items, str):
+            try:
+                items = json.loads(items)
+            except ValueError:
+                items = None
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            return None
+        return items
+
+    @idempotent
+    def post(self, request, *args, **kwargs):
+        items = self.get_items(request)
+        if not items:
+            return Response({
+                'error': 'items يجب أن يكون مصفوفة JSON غير فارغة'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        max_items = getattr(settings, 'SUBMISSIONS_BATCH_MAX_ITEMS', 50)
+        if len(items) > max_items:
+            return Response({
+                'error': f'الحد الأقصى لعدد العناصر هو {max_items}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        results = []
+        instances = []
+        serializers_with_uploads = []
+        for index, item in enumerate(items):
+            data = {key: value for key, value in item.items() if key not in self.file_fields}
+            for field in self.file_fields:
+                upload = request.FILES.get(f'items[{index}].{field}')
+                if upload is not None:
+                    data[field] = upload
+
+            serializer = self.get_serializer(data=data)
+            if serializer.is_valid():
+                instance = serializer.build_instance(serializer.validated_data, find_duplicates=False)
+                # bulk_create لا يرسل pre_save
+                assign_geo_cell(instance)
+                instances.append(instance)
+                serializers_with_uploads.append(serializer)
+                results.append({'index': index, 'status': 'created', 'instance': instance})
+            else:
+                results.append({'index': index, 'status': 'error', 'errors': serializer.errors})
+
+        try:
+            if instances:
+                hashed = hash_submission_images(instances)
+                with transaction.atomic():
+                    if connections[Submission.objects.db].features.can_return_rows_from_bulk_insert:
+                        insert_indexed_batch(instances, hashed, Submission.objects.bulk_create)
+                        # bulk_create لا يرسل post_save
+                        retain_instance_files(instances)
+                        apply_changes(added=[submission_point(instance) for instance in instances])
+                        submission_versions.invalidate(request.user.user_id)
+                    else:
+                        # MySQL لا يعيد مفاتيح bulk_create: إدراج صف صف، والإشارات تأخذ المراجع وتحدّث التجميعات
+                        insert_indexed_batch(instances, hashed, save_rows)
+                    for instance in instances:
+                        derivative_pipeline.schedule(instance)
+                    for serializer in serializers_with_uploads:
+                        serializer.release_uploads()
+        finally:
+            # الملفات المرفوعة تُغلق حتى لو فشل الحفظ
+            for serializer in serializers_with_uploads:
+                serializer.close_uploads()
+
+        for result in results:
+            instance = result.pop('instance', None)
+            if instance is not None:
+                result['submission_id'] = instance.submission_id
+                result['duplicate_of'] = instance.duplicate_of_id
+
+        if not instances:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif len(instances) < len(items):
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_201_CREATED
+
+        return Response({
+            'created': len(instances),
+            'failed': len(items) - len(instances),
+            'results': results,
+        }, status=response_status)
+
+
+class UploadStartView(generics.GenericAPIView):
+    """Start a resumable chunked upload"""
+    serializer_class = UploadStartSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    @idempotent
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ttl = getattr(settings, 'SUBMISSIONS_UPLOAD_TTL', 60 * 60 * 24)
+        upload = Upload.objects.create(
+            user=request.user,
+            expires_at=timezone.now() + timedelta(seconds=ttl),
+            **serializer.validated_data
+        )
+        data = UploadSerializer(upload).data
+        data['chunk_size'] = getattr(settings, 'SUBMISSIONS_UPLOAD_CHUNK_SIZE', 1024 * 1024)
+        return Response(data, status=status.HTTP_201_CREATED)
+
+
+class UploadDetailView(generics.GenericAPIView):
+    """
+    GET returns the current offset (to resume), PATCH appends a chunk.
+
+    PATCH body is the raw chunk; the `Upload-Offset` header must equal the
+    current offset, otherwise 409 is returned with the offset to resume from.
+    """
+    serializer_class = UploadSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    lookup_field = 'upload_id'
+
+    def get_queryset(self):
+        return Upload.objects.filter(user=self.request.user, expires_at__gt=timezone.now())
+
+    def get(self, request, *args, **kwargs):
+        return Response(self.get_serializer(self.get_object()).data)
+
+    def check_chunk(self, upload, offset, length):
+        """Return an error response unless a chunk of `length` bytes can be appended at `offset`"""
+        if upload is None:
+            return Response({'error': 'الرفع غير موجود'}, status=status.HTTP_404_NOT_FOUND)
+        if upload.is_completed:
+            return Response({'error': 'الرفع مكتمل مسبقاً'}, status=status.HTTP_409_CONFLICT)
+        if offset != upload.received_size:
+            return Response({
+                'error': 'Upload-Offset لا يطابق الحجم المستلم',
+                'offset': upload.received_size,
+            }, status=status.HTTP_409_CONFLICT)
+        if offset + length > upload.total_size:
+            return Response({
+                'error': 'الجزء يتجاوز الحجم الكلي للملف'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        return None
+
+    def patch(self, request, *args, **kwargs):
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers['Content-Length'])
+        except (KeyError, ValueError):
+            return Response({
+                'error': 'الترويستان Upload-Offset و Content-Length مطلوبتان'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        max_chunk = getattr(settings, 'SUBMISSIONS_UPLOAD_CHUNK_SIZE', 1024 * 1024)
+        if length > max_chunk:
+            return Response({
+                'error': f'الحجم الأقصى للجزء هو {max_chunk} بايت'
+            }, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        upload = self.get_queryset().filter(upload_id=kwargs['upload_id']).first()
+        response = self.check_chunk(upload, offset, length)
+        if response is not None:
+            return response
+
+        # قراءة الجزء من الشبكة تتم خارج المعاملة، فلا يبقى الصف مقفلاً أثناء انتظار عميل بطيء
+        chunk_path, received = receive_chunk(upload, request.stream, length) if length else (None, 0)
+        try:
+            with transaction.atomic():
+                upload = self.get_queryset().select_for_update().filter(upload_id=kwargs['upload_id']).first()
+                response = self.check_chunk(upload, offset, length)
+                if response is not None:
+                    return response
+                if chunk_path is not None:
+                    append_chunk(upload, offset, chunk_path)
+                upload.received_size = offset + received
+                upload.save(update_fields=['received_size'])
+        finally:
+            if chunk_path is not None:
+                discard_chunk(chunk_path)
+
+        return Response(self.get_serializer(upload).data)
+
+
+class UploadFinalizeView(UploadDetailView):
+    """Verify a fully received upload and mark it as completed"""
+    http_method_names = ['post', 'options']
+
+    def post(self, request, *args, **kwargs):
+        upload = self.get_object()
+        if not upload.is_completed:
+            try:
+                verify_image(upload)
+            except UploadError as e:
+                return Response({'error': e.message, 'offset': upload.received_size}, status=e.status_code)
+            upload.completed_at = timezone.now()
+            upload.save(update_fields=['completed_at'])
+        return Response(self.get_serializer(upload).data)
+
+
+class SubmissionExportView(generics.GenericAPIView):
+    """Stream all of the current user's submissions as NDJSON or CSV"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = Submission.objects.filter(user=self.request.user)
+        return filter_submissions(queryset, self.request.query_params)
+
+    def get(self, request, *args, **kwargs):
+        export_format = request.query_params.get('output', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            return Response({
+                'error': f'صيغة غير مدعومة، الصيغ المتاحة: {", ".join(EXPORT_FORMATS)}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        chunk_size = getattr(settings, 'SUBMISSIONS_EXPORT_CHUNK_SIZE', 1000)
+        response = StreamingHttpResponse(
+            stream_export(self.get_queryset(), export_format, chunk_size),
+            content_type=EXPORT_FORMATS[export_format],
+        )
+        response['Content-Disposition'] = f'attachment; filename="submissions.{export_format}"'
+        response['Cache-Control'] = 'no-cache'
+        # تعطيل التخزين المؤقت في nginx حتى تصل الصفوف للعميل فوراً
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class SubmissionNearbyView(generics.GenericAPIView):
+    """
+    Submissions from all users within `radius` metres of a point, nearest first.
+
+    Query params: lat, lng, radius (metres), limit, plus the list filters
+    (category_id, category_ids, created_after, created_before).
+    Only public fields are returned (no notes, phone numbers or original images).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        params = request.query_params
+        max_radius = getattr(settings, 'SUBMISSIONS_NEARBY_MAX_RADIUS', 10000)
+        max_limit = getattr(settings, 'SUBMISSIONS_NEARBY_MAX_RESULTS', 200)
+        try:
+            latitude = float(params['lat'])
+            longitude = float(params['lng'])
+            radius = float(params.get('radius', 1000))
+            limit = int(params.get('limit', 50))
+        except (KeyError, ValueError):
+            return Response({
+                'error': 'يجب إرسال lat و lng بشكل صحيح'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            return Response({'error': 'إحداثيات غير صالحة'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 0 < radius <= max_radius:
+            return Response({
+                'error': f'radius يجب أن يكون بين 0 و {max_radius} متر'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, max_limit))
+
+        queryset = filter_submissions(Submission.objects.all(), params)
+        rows = nearest(queryset, latitude, longitude, radius, limit, [
+            'submission_id', 'category_id', 'image_thumbnail', 'created_at',
+        ])
+
+        categories = category_cache.get().by_id
+        thumbnail_storage = Submission._meta.get_field('image_thumbnail').storage
+        results = []
+        for row, distance in rows:
+            results.append({
+                'submission_id': row['submission_id'],
+                'category': categories.get(row['category_id']),
+                'latitude': f"{row['latitude']:f}",
+                'longitude': f"{row['longitude']:f}",
+                'distance': round(distance, 1),
+                'image_thumbnail': thumbnail_storage.url(row['image_thumbnail']) if row['image_thumbnail'] else None,
+                'created_at': row['created_at'],
+            })
+        return Response({'count': len(results), 'results': results})
+
+
+class SubmissionTileView(generics.GenericAPIView):
+    """
+    Submission counts per map tile and category, for heatmaps and clusters.
+
+    Query params: zoom, bbox=min_lat,min_lng,max_lat,max_lng and optional
+    category_ids. Counts come from SubmissionTile (pre-aggregated at
+    SUBMISSIONS_TILE_ZOOMS), so the cost depends on the number of tiles
+    in the box, not on the number of submissions. The deepest stored
+    zoom level not above the requested one is used.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        params = request.query_params
+        try:
+            zoom = int(params['zoom'])
+            min_lat, min_lng, max_lat, max_lng = _parse_bbox(params['bbox'])
+            category_ids = _parse_int_list(params['category_ids']) if params.get('category_ids') else None
+        except (KeyError, ValueError):
+            return Response({
+                'error': 'يجب إرسال zoom و bbox=min_lat,min_lng,max_lat,max_lng بشكل صحيح'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        # _parse_bbox يرفض nan و inf، ويبقى التحقق من حدود الإحداثيات قبل الإسقاط
+        if not (-90 <= min_lat and max_lat <= 90 and -180 <= min_lng and max_lng <= 180):
+            return Response({'error': 'إحداثيات غير صالحة'}, status=status.HTTP_400_BAD_REQUEST)
+
+        zooms = sorted(get_tile_zooms())
+        level = max((level for level in zooms if level <= zoom), default=zooms[0])
+        # y يزداد نحو الجنوب
+        min_x, min_y = tile_for(max_lat, min_lng, level)
+        max_x, max_y = tile_for(min_lat, max_lng, level)
+        max_tiles = getattr(settings, 'SUBMISSIONS_TILE_MAX_TILES', 4096)
+        if (max_x - min_x + 1) * (max_y - min_y + 1) > max_tiles:
+            return Response({
+                'error': 'المنطقة كبيرة جداً لمستوى التكبير المطلوب'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = SubmissionTile.objects.filter(
+            zoom=level, x__range=(min_x, max_x), y__range=(min_y, max_y), count__gt=0,
+        )
+        if category_ids is not None:
+            rows = rows.filter(category_id__in=category_ids)
+
+        tiles = {}
+        for x, y, category_id, count, latitude_sum, longitude_sum in rows.values_list(
+            'x', 'y', 'category_id', 'count', 'latitude_sum', 'longitude_sum'
+        ):
+            tile = tiles.setdefault((x, y), {'x': x, 'y': y, 'count': 0, 'latitude': 0.0, 'longitude': 0.0, 'categories': {}})
+            tile['count'] += count
+            tile['latitude'] += latitude_sum
+            tile['longitude'] += longitude_sum
+            tile['categories'][str(category_id)] = count
+        for tile in tiles.values():
+            # مركز التجمع
+            tile['latitude'] = round(tile['latitude'] / tile['count'], 6)
+            tile['longitude'] = round(tile['longitude'] / tile['count'], 6)
+
+        return Response({'zoom': level, 'tiles': list(tiles.values())})
+
+
+class SubmissionStatsView(generics.GenericAPIView):
+    """
+    Daily submission statistics, read only from the rollup tables.
+
+    Query params: start, end (inclusive dates, default the last 30 days)
+    and optional category_ids. Returns totals for the range plus per-day
+    counts broken down by category, each with its distinct users.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        params = request.query_params
+        today = timezone.localdate(timezone=timezone.get_default_timezone())
+        try:
+            end = parse_date(params['end']) if params.get('end') else today
+            start = parse_date(params['start']) if params.get('start') else end and end - timedelta(days=29)
+            category_ids = _parse_int_list(params['category_ids']) if params.get('category_ids') else None
+        except ValueError:
+            start = end = None
+        max_days = getattr(settings, 'SUBMISSIONS_STATS_MAX_DAYS', 366)
+        if start is None or end is None or start > end:
+            return Response({'error': 'start و end يجب أن يكونا تاريخين صحيحين (YYYY-MM-DD)'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if (end - start).days >= max_days:
+            return Response({'error': f'الحد الأقصى للفترة هو {max_days} يوماً'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        stats = DailySubmissionStats.objects.filter(day__range=(start, end), submissions__gt=0)
+        activity = DailyUserActivity.objects.filter(day__range=(start, end), submissions__gt=0)
+        if category_ids is not None:
+            stats = stats.filter(category_id__in=category_ids)
+            activity = activity.filter(category_id__in=category_ids)
+
+        days = {}
+        for day, category_id, submissions, users in stats.order_by('day', 'category_id').values_list(
+            'day', 'category_id', 'submissions', 'users'
+        ):
+            entry = days.setdefault(day, {'day': day, 'submissions': 0, 'users': 0, 'categories': []})
+            entry['submissions'] += submissions
+            entry['categories'].append({'category_id': category_id, 'submissions': submissions, 'users': users})
+        # مستخدم واحد قد يرسل في عدة فئات في نفس اليوم
+        for day, users in activity.values('day').annotate(users=Count('user_id', distinct=True)).values_list('day', 'users'):
+            if day in days:
+                days[day]['users'] = users
+
+        return Response({
+            'start': start,
+            'end': end,
+            'submissions': sum(entry['submissions'] for entry in days.values()),
+            'users': activity.aggregate(users=Count('user_id', distinct=True))['users'],
+            'days': list(days.values()),
+        })
 
 
 # Authentication Views
@@ -80,20 +576,9 @@ def send_otp(request):
         # Use fixed OTP code '000000' for development (6 digits)
         otp_code = '000000'
 
-        # Hash the OTP code
-        hashed_code = hashlib.sha256(otp_code.encode()).hexdigest()
-
-        # Set expiration time (5 minutes from now)
-        expires_at = timezone.now() + timedelta(minutes=5)
-
-        # Create or update OTP record
-        OtpCode.objects.update_or_create(
-            phone_number=phone_number,
-            defaults={
-                'hashed_code': hashed_code,
-                'expires_at': expires_at
-            }
-        )
+        # Store the hashed code (replaces any previous code of this number)
+        ttl = get_otp_ttl()
+        get_otp_store().save(phone_number, hash_code(otp_code), ttl)
 
         # Send OTP via SMS service
         sms_sent = sms_service.send_otp(phone_number, otp_code)
@@ -102,7 +587,7 @@ def send_otp(request):
             return Response({
                 'message': 'تم إرسال كود OTP بنجاح',
                 'otp_code': otp_code,  # Remove this line in production
-                'expires_in': '5 دقائق'
+                'expires_in': f'{ttl // 60} دقائق' if ttl % 60 == 0 else f'{ttl} ثانية'
             }, status=status.HTTP_200_OK)
         else:
             return Response({
@@ -127,9 +612,6 @@ def verify_otp(request):
             defaults={}
         )
 
-        # Delete used OTP
-        serializer.validated_data['otp_obj'].delete()
-
         # Generate JWT tokens
         refresh = RefreshToken.for_user(user)
         access_token = str(refresh.access_token)